@@ -0,0 +1,281 @@
+"""benchmarks the stages of a djesrf search against a stand-in elasticsearch client, with no cluster involved
+
+    $ python -m benchmarks --output baseline.json
+    $ python -m benchmarks --compare baseline.json
+
+Every benchmark reports the time of a single operation in seconds. Results are written as JSON so runs of different
+releases can be compared with `--compare`, which exits non-zero when a benchmark got slower than `--threshold`.
+"""
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from timeit import default_timer
+
+
+def setup_django():
+    """configures django with the example project and an in-memory database
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "example.settings")
+
+    from django.conf import settings
+    settings.DATABASES["default"]["NAME"] = ":memory:"
+
+    import django
+    django.setup()
+
+    from django.core import management
+    management.call_command("migrate", verbosity=0, interactive=False)
+
+
+def _median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2.0
+
+
+def measure(func, setup=None, rounds=20, number=10):
+    """times an operation
+
+    :param func: the operation -- called with the result of `setup` if one is given
+    :type func: callable
+
+    :param setup: builds a fresh argument for each call, outside of the timing
+    :type setup: callable
+
+    :param rounds: the number of rounds to time
+    :type rounds: int
+
+    :param number: the number of calls per round
+    :type number: int
+
+    :return: the min, median and mean time of a single call, in seconds
+    :rtype: dict
+    """
+    # warm up caches, lazy imports and the like
+    func(setup()) if setup else func()
+
+    timings = []
+    for _ in range(rounds):
+        elapsed = 0.0
+        for _ in range(number):
+            if setup:
+                arg = setup()
+                start = default_timer()
+                func(arg)
+            else:
+                start = default_timer()
+                func()
+            elapsed += default_timer() - start
+        timings.append(elapsed / number)
+
+    return {
+        "min": min(timings),
+        "median": _median(timings),
+        "mean": sum(timings) / len(timings),
+        "rounds": rounds,
+        "number": number,
+    }
+
+
+def get_benchmarks(es, page_size=20):
+    """builds the benchmarks of every stage of a search, for the example `Video` model
+
+    :param es: the stand-in client the searches go to
+    :type es: benchmarks.transport.StandInElasticsearch
+
+    :param page_size: the number of hits in a page of results
+    :type page_size: int
+
+    :return: benchmark name, operation and setup tuples
+    :rtype: list
+    """
+    from djes.search import ShallowResponse
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.test import APIRequestFactory
+
+    from djesrf.serializers import SourceSerializer
+    from example.app.models import Video
+    from example.app.serializers import VideoSerializer
+    from example.app.views import VideoViewSet
+
+    query = "video"
+    filters = {
+        "channel__name__raw": ["The Onion", "The A.V. Club"],
+        "published__gte": "2015-01-01",
+        "status": "published",
+    }
+    ordering = ["-published"]
+
+    # a search to take apart stage by stage
+    qs = Video.search(query, filters, ordering)[0:page_size]
+    agg_qs, buckets, fields = Video._build_aggregates(Video.search(query).extra(size=0), filters)
+    body = qs.to_dict()
+    serializer = es.transport.serializer
+    page_text = serializer.dumps(es.respond(body))
+    agg_text = serializer.dumps(es.respond(agg_qs.to_dict()))
+    renderer = JSONRenderer()
+
+    def hydrate(raw):
+        return list(ShallowResponse(raw, callbacks=qs._doc_type_map))
+
+    def render_models(proxies):
+        return renderer.render(VideoSerializer(proxies, many=True).data)
+
+    def render_hits(raw):
+        return renderer.render(SourceSerializer(raw["hits"]["hits"], many=True).data)
+
+    factory = APIRequestFactory()
+    list_view = VideoViewSet.as_view({"get": "list"})
+
+    def get(url):
+        def view():
+            response = list_view(factory.get(url))
+            response.render()
+            return response
+        return view
+
+    return [
+        ("compile.search", lambda: Video.search(query, filters, ordering), None),
+        ("compile.aggregates", lambda: Video._build_aggregates(Video.search(query), filters), None),
+        ("serialize.request", lambda: serializer.dumps(qs.to_dict()), None),
+        ("parse.response", lambda: serializer.loads(page_text), None),
+        ("parse.aggregates", lambda raw: Video._parse_aggregates(raw, buckets, fields, filters),
+            lambda: serializer.loads(agg_text)["aggregations"]),
+        ("hydrate.proxies", hydrate, lambda: serializer.loads(page_text)),
+        ("render.model_serializer", render_models, lambda: hydrate(serializer.loads(page_text))),
+        ("render.source_serializer", render_hits, lambda: serializer.loads(page_text)),
+        ("viewset.list", get("/api/videos/?search=video&ordering=-published"), None),
+        ("viewset.list_fields", get("/api/videos/?search=video&fields=id,name,channel__name"), None),
+        ("viewset.list_aggregates",
+            get("/api/videos/?search=video&channel__name__raw=The+Onion&include_aggregates=1"), None),
+    ]
+
+
+def run_benchmarks(rounds=20, number=10, total=5000, page_size=20, only=None):
+    """runs the benchmarks with the stand-in client in place of the default elasticsearch connection
+
+    :param rounds: the number of rounds to time each benchmark
+    :type rounds: int
+
+    :param number: the number of calls per round
+    :type number: int
+
+    :param total: the number of documents the stand-in client pretends to have
+    :type total: int
+
+    :param page_size: the number of hits in a page of results
+    :type page_size: int
+
+    :param only: prefixes of the benchmarks to run
+    :type only: list
+
+    :return: the baseline -- the environment and the timings of every benchmark
+    :rtype: dict
+    """
+    import django
+    import rest_framework
+    from elasticsearch_dsl.connections import connections
+
+    import djesrf
+    from benchmarks.transport import StandInElasticsearch
+    from example.app.models import Video
+
+    es = StandInElasticsearch(Video, total=total)
+    previous = connections.get_connection("default")
+    connections.add_connection("default", es)
+    try:
+        results = {}
+        for name, func, setup in get_benchmarks(es, page_size):
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            results[name] = measure(func, setup, rounds=rounds, number=number)
+    finally:
+        connections.add_connection("default", previous)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "djangorestframework": rest_framework.VERSION,
+            "djesrf": djesrf.__version__,
+            "timestamp": int(time.time()),
+            "total": total,
+            "page_size": page_size,
+        },
+        "benchmarks": results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """compares the median timings of two runs
+
+    :param baseline: the results of the earlier run
+    :type baseline: dict
+
+    :param current: the results of this run
+    :type current: dict
+
+    :param threshold: the relative slow down that counts as a regression (`0.2` is 20% slower)
+    :type threshold: float
+
+    :return: benchmark name, baseline median, current median and relative change tuples, and the regressed names
+    :rtype: tuple
+    """
+    rows = []
+    regressions = []
+    for name, timing in sorted(current["benchmarks"].items()):
+        before = baseline["benchmarks"].get(name)
+        if before is None:
+            continue
+        change = (timing["median"] - before["median"]) / before["median"]
+        rows.append((name, before["median"], timing["median"], change))
+        if change > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the stages of a djesrf search.")
+    parser.add_argument("--rounds", type=int, default=20, help="rounds to time each benchmark (default: 20)")
+    parser.add_argument("--number", type=int, default=10, help="calls per round (default: 10)")
+    parser.add_argument("--total", type=int, default=5000, help="documents in the stand-in index (default: 5000)")
+    parser.add_argument("--page-size", type=int, default=20, help="hits per page of results (default: 20)")
+    parser.add_argument("--only", action="append", help="only run benchmarks starting with this prefix")
+    parser.add_argument("--output", help="write the results to this file")
+    parser.add_argument("--compare", help="compare the results against a baseline file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slow down that fails --compare (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    setup_django()
+    results = run_benchmarks(args.rounds, args.number, args.total, args.page_size, args.only)
+
+    for name, timing in sorted(results["benchmarks"].items()):
+        print("{:<28} {:>10.1f}us median {:>10.1f}us min".format(name, timing["median"] * 1e6, timing["min"] * 1e6))
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        rows, regressions = compare(baseline, results, args.threshold)
+        print()
+        for name, before, after, change in rows:
+            print("{:<28} {:>10.1f}us -> {:>10.1f}us {:>+7.1%}".format(name, before * 1e6, after * 1e6, change))
+        if regressions:
+            print("\nSlower than the baseline: {}".format(", ".join(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
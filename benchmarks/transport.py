@@ -0,0 +1,163 @@
+import hashlib
+
+from elasticsearch import Elasticsearch
+
+
+def _fake_value(definition, index):
+    """makes up a value for a field of the mapping
+
+    :param definition: the mapping of the field
+    :type definition: dict
+
+    :param index: the position of the document, to vary the values
+    :type index: int
+
+    :return: a value for the field
+    :rtype: object
+    """
+    if "properties" in definition:
+        return fake_source(definition["properties"], index)
+
+    field_type = definition.get("type", "string")
+    if field_type in ("long", "integer", "short", "byte"):
+        return index + 1
+    if field_type in ("double", "float"):
+        return index + 0.5
+    if field_type == "boolean":
+        return index % 2 == 0
+    if field_type == "date":
+        return "2015-{:0>2}-{:0>2}T12:00:00+00:00".format(index % 12 + 1, index % 28 + 1)
+    return "value {}".format(index)
+
+
+def fake_source(properties, index):
+    """makes up a document matching a level of the mapping
+
+    :param properties: the properties of the level
+    :type properties: dict
+
+    :param index: the position of the document, to vary the values
+    :type index: int
+
+    :return: the document
+    :rtype: dict
+    """
+    return dict((name, _fake_value(definition, index)) for name, definition in properties.items())
+
+
+_BUCKET_AGGREGATES = ("terms", "histogram", "date_histogram", "range", "date_range", "significant_terms")
+_SINGLE_BUCKET_AGGREGATES = ("filter", "nested", "reverse_nested", "global", "missing", "children")
+
+
+def fake_aggregations(aggs, total, buckets=10):
+    """makes up the response to the aggregations of a request body
+
+    :param aggs: the `aggs` of the request body
+    :type aggs: dict
+
+    :param total: the number of documents the aggregations run over
+    :type total: int
+
+    :param buckets: the number of buckets in each bucket aggregation
+    :type buckets: int
+
+    :return: the `aggregations` of the response
+    :rtype: dict
+    """
+    results = {}
+    for name, agg in aggs.items():
+        agg_type = [key for key in agg if key != "aggs"][0]
+        children = agg.get("aggs", {})
+
+        if agg_type in _SINGLE_BUCKET_AGGREGATES:
+            result = {"doc_count": total}
+            result.update(fake_aggregations(children, total, buckets))
+
+        elif agg_type in _BUCKET_AGGREGATES:
+            result = {"buckets": []}
+            for index in range(buckets):
+                count = max(total // (index + 2), 1)
+                bucket = {"key": "value {}".format(index), "doc_count": count}
+                if agg_type == "date_histogram":
+                    bucket["key"] = 1420070400000 + index * 86400000
+                    bucket["key_as_string"] = "2015-01-{:0>2}T00:00:00.000Z".format(index + 1)
+                bucket.update(fake_aggregations(children, count, buckets))
+                result["buckets"].append(bucket)
+
+        else:
+            result = {"value": total}
+
+        results[name] = result
+    return results
+
+
+class StandInElasticsearch(Elasticsearch):
+    """an elasticsearch client that answers searches with made up responses instead of going to a cluster
+
+    Request bodies are serialized and responses deserialized with the client's own serializer, just like on the
+    wire, so both costs show up in measurements. Responses are generated from the model's mapping and the request's
+    size and aggregations, then kept as serialized text keyed on the request body.
+    """
+
+    def __init__(self, model, total=5000, buckets=10):
+        super(StandInElasticsearch, self).__init__(hosts=[{"host": "localhost", "port": 9200}])
+        self.model = model
+        self.total = total
+        self.buckets = buckets
+        self.requests = 0
+        self._responses = {}
+
+        mapping = model.search_objects.mapping
+        self.index = mapping.index
+        self.doc_type = mapping.doc_type
+        self.properties = mapping.to_dict()[self.doc_type].get("properties", {})
+
+    def respond(self, body):
+        """makes up the response to a search
+
+        :param body: the request body
+        :type body: dict
+
+        :return: the response
+        :rtype: dict
+        """
+        body = body or {}
+        start = body.get("from", 0)
+        size = max(min(body.get("size", 10), self.total - start), 0)
+
+        hits = []
+        for index in range(start, start + size):
+            hit = {
+                "_index": self.index,
+                "_type": self.doc_type,
+                "_id": str(index + 1),
+                "_score": 1.0,
+                "_source": fake_source(self.properties, index),
+            }
+            if "sort" in body:
+                hit["sort"] = [index + 1]
+            hits.append(hit)
+
+        response = {
+            "took": 1,
+            "timed_out": False,
+            "_shards": {"total": 5, "successful": 5, "failed": 0},
+            "hits": {"total": self.total, "max_score": 1.0, "hits": hits},
+        }
+        if "aggs" in body:
+            response["aggregations"] = fake_aggregations(body["aggs"], self.total, self.buckets)
+        return response
+
+    def search(self, index=None, doc_type=None, body=None, **params):
+        self.requests += 1
+        serializer = self.transport.serializer
+        request = serializer.dumps(body or {})
+
+        key = hashlib.md5(request.encode("utf8")).hexdigest()
+        if key not in self._responses:
+            self._responses[key] = serializer.dumps(self.respond(body))
+        return serializer.loads(self._responses[key])
+
+    def count(self, index=None, doc_type=None, body=None, **params):
+        self.requests += 1
+        return {"count": self.total, "_shards": {"total": 5, "successful": 5, "failed": 0}}
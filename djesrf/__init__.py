@@ -3,3 +3,5 @@
 # clients should install via major-minor tags
 
 __version__ = "1.0.8"
+
+default_app_config = "djesrf.apps.DjesrfConfig"
@@ -0,0 +1,14 @@
+from django.apps import AppConfig, apps
+
+
+class DjesrfConfig(AppConfig):
+    name = "djesrf"
+    verbose_name = "DJ E.S. REST Framework"
+
+    def ready(self):
+        from .models import Searchable
+
+        # compile the search plans up front so requests never have to
+        for model in apps.get_models():
+            if issubclass(model, Searchable):
+                model.get_search_plan()
@@ -0,0 +1,220 @@
+import logging
+import threading
+import time
+
+from elasticsearch.exceptions import ConnectionError, TransportError
+
+from djesrf.conf import settings
+from djesrf.exceptions import CircuitOpen
+from djesrf.signals import breaker_state_changed
+
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+def is_failure(exc):
+    """checks whether an error means elasticsearch is in trouble, rather than the search being bad
+
+    :param exc: the error raised by the search
+    :type exc: Exception
+
+    :rtype: bool
+    """
+    if isinstance(exc, ConnectionError):
+        return True
+    if isinstance(exc, TransportError):
+        return not isinstance(exc.status_code, int) or exc.status_code >= 500
+    return False
+
+
+class CircuitBreaker(object):
+    """stops sending searches to a connection that keeps failing, so requests fail fast instead of tying up workers
+
+    The breaker trips open after `failure_threshold` failures in a row -- searches slower than `latency_threshold`
+    seconds count as failures too. While it's open every search is rejected with `CircuitOpen`. After `reset_timeout`
+    seconds it goes half-open and lets a single probe search through: the breaker closes again if the probe succeeds
+    and reopens if it fails.
+    """
+
+    def __init__(self, name, failure_threshold=5, latency_threshold=None, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.latency_threshold = latency_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.metrics = {
+            "calls": 0,
+            "failures": 0,
+            "slow_calls": 0,
+            "rejected": 0,
+            "fallbacks": 0,
+            "trips": 0,
+        }
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        """moves the breaker to another state -- must be called with the lock held
+
+        :return: the state the breaker was in
+        :rtype: str
+        """
+        previous, self.state = self.state, state
+        if state == OPEN:
+            self.opened_at = time.time()
+            self.metrics["trips"] += 1
+        self.probing = False
+        return previous
+
+    def _changed(self, previous, state):
+        if previous != state:
+            logger.warning("Circuit breaker for %s went from %s to %s", self.name, previous, state)
+            breaker_state_changed.send(sender=self.__class__, breaker=self, previous=previous, state=state)
+
+    def allow(self):
+        """checks whether a search can be sent, letting a single probe through once the breaker has been open for
+        `reset_timeout` seconds
+
+        :rtype: bool
+        """
+        with self._lock:
+            previous = self.state
+            if self.state == OPEN and time.time() - self.opened_at >= self.reset_timeout:
+                self._set_state(HALF_OPEN)
+
+            if self.state == CLOSED:
+                allowed = True
+            elif self.state == HALF_OPEN and not self.probing:
+                self.probing = allowed = True
+            else:
+                allowed = False
+
+            if allowed:
+                self.metrics["calls"] += 1
+            else:
+                self.metrics["rejected"] += 1
+            state = self.state
+
+        self._changed(previous, state)
+        return allowed
+
+    def record_success(self, duration):
+        """records a search that answered, tripping the breaker if it was too slow
+
+        :param duration: how long the search took, in seconds
+        :type duration: float
+        """
+        if self.latency_threshold is not None and duration > self.latency_threshold:
+            with self._lock:
+                self.metrics["slow_calls"] += 1
+            self._record_failure()
+            return
+
+        with self._lock:
+            self.failures = 0
+            previous = self.state
+            if self.state == HALF_OPEN:
+                self._set_state(CLOSED)
+            state = self.state
+        self._changed(previous, state)
+
+    def record_failure(self):
+        """records a search that failed, tripping the breaker once there have been too many in a row
+        """
+        with self._lock:
+            self.metrics["failures"] += 1
+        self._record_failure()
+
+    def _record_failure(self):
+        with self._lock:
+            self.failures += 1
+            previous = self.state
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self._set_state(OPEN)
+            state = self.state
+        self._changed(previous, state)
+
+    def record_fallback(self):
+        """records a request served without elasticsearch while the breaker was open
+        """
+        with self._lock:
+            self.metrics["fallbacks"] += 1
+
+    def call(self, func, *args, **kwargs):
+        """calls a search function through the breaker
+
+        :param func: the function sending the search
+        :type func: callable
+
+        :return: whatever the function returns
+        :rtype: object
+        """
+        if not self.allow():
+            raise CircuitOpen("Elasticsearch is unavailable ({} circuit breaker is open)".format(self.name))
+
+        start = time.time()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as exc:
+            if is_failure(exc):
+                self.record_failure()
+            else:
+                # the search was bad, not elasticsearch -- but a half-open probe has to let go of its slot
+                self.record_success(0)
+            raise
+        self.record_success(time.time() - start)
+        return result
+
+    def get_metrics(self):
+        """gets the state of the breaker and its counters
+
+        :rtype: dict
+        """
+        with self._lock:
+            metrics = dict(self.metrics, name=self.name, state=self.state, consecutive_failures=self.failures)
+        return metrics
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(alias="default"):
+    """gets the circuit breaker of an elasticsearch connection
+
+    :param alias: the alias of the connection
+    :type alias: str
+
+    :return: the breaker, or `None` when `DJESRF_CIRCUIT_BREAKER` is off
+    :rtype: djesrf.breaker.CircuitBreaker
+    """
+    if not settings.DJESRF_CIRCUIT_BREAKER:
+        return None
+
+    breaker = _breakers.get(alias)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(alias)
+            if breaker is None:
+                breaker = _breakers[alias] = CircuitBreaker(
+                    alias,
+                    failure_threshold=settings.DJESRF_BREAKER_FAILURE_THRESHOLD,
+                    latency_threshold=settings.DJESRF_BREAKER_LATENCY_THRESHOLD,
+                    reset_timeout=settings.DJESRF_BREAKER_RESET_TIMEOUT)
+    return breaker
+
+
+def get_breaker_metrics():
+    """gets the metrics of every circuit breaker in use
+
+    :return: the metrics, keyed on connection alias
+    :rtype: dict
+    """
+    return dict((alias, breaker.get_metrics()) for alias, breaker in list(_breakers.items()))
@@ -0,0 +1,191 @@
+import threading
+import time
+
+from elasticsearch_dsl.connections import connections
+
+from djesrf.conf import settings
+
+
+_local = threading.local()
+
+
+def get_active_indexer():
+    """gets the bulk indexer buffering operations for the current thread
+
+    :return: the innermost active indexer, or `None` outside of a bulk block
+    :rtype: djesrf.bulk.BulkIndexer
+    """
+    stack = getattr(_local, "stack", None)
+    if stack:
+        return stack[-1]
+    return None
+
+
+class BulkResult(object):
+    """tallies the outcome of bulk operations
+    """
+
+    def __init__(self):
+        self.indexed = 0
+        self.deleted = 0
+        self.failed = 0
+        self.errors = []
+        self.requests = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+
+    @property
+    def total(self):
+        return self.indexed + self.deleted + self.failed
+
+    @property
+    def docs_per_second(self):
+        if not self.elapsed:
+            return 0.0
+        return self.total / self.elapsed
+
+    def update(self, other):
+        """folds the tallies of another result into this one
+
+        :param other: the result to add
+        :type other: djesrf.bulk.BulkResult
+        """
+        self.indexed += other.indexed
+        self.deleted += other.deleted
+        self.failed += other.failed
+        self.errors.extend(other.errors)
+        self.requests += other.requests
+        self.bytes += other.bytes
+        self.elapsed += other.elapsed
+
+    def __repr__(self):
+        return "<BulkResult: {} indexed, {} deleted, {} failed, {:.1f} docs/sec>".format(
+            self.indexed, self.deleted, self.failed, self.docs_per_second)
+
+
+class BulkIndexer(object):
+    """buffers index and delete operations and flushes them through the elasticsearch `_bulk` api
+
+    Chunks are flushed as soon as they hit either `chunk_size` operations or `max_chunk_bytes` of request body. Used
+    as a context manager, every `Searchable.index` and `Searchable.delete_index` call made in the block (including
+    the ones made by `save` and `delete`) is buffered and the remainder is flushed on the way out. Pass `index` to
+    send the documents somewhere other than the models' index alias::
+
+        with BulkIndexer() as indexer:
+            for video in videos:
+                video.save()
+        print(indexer.result.docs_per_second)
+    """
+
+    def __init__(self, chunk_size=None, max_chunk_bytes=None, refresh=False, index=None, using="default"):
+        self.index_name = index
+        self.chunk_size = chunk_size or settings.DJESRF_BULK_CHUNK_SIZE
+        self.max_chunk_bytes = max_chunk_bytes or settings.DJESRF_BULK_MAX_CHUNK_BYTES
+        self.refresh = refresh
+        self.es = connections.get_connection(using)
+        self.result = BulkResult()
+        self._lines = []
+        self._bytes = 0
+        self._count = 0
+        self._models = set()
+        self._started = time.time()
+
+    def __enter__(self):
+        if not hasattr(_local, "stack"):
+            _local.stack = []
+        _local.stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _local.stack.remove(self)
+        self.flush()
+
+    def _add(self, model, action, source=None):
+        """serializes an operation onto the buffer, flushing first if it would overflow the chunk
+
+        :param model: the model class the document belongs to
+        :type model: djesrf.models.Searchable
+
+        :param action: the bulk action and metadata
+        :type action: dict
+
+        :param source: the document body, for index operations
+        :type source: dict
+        """
+        lines = [self.es.transport.serializer.dumps(action)]
+        if source is not None:
+            lines.append(self.es.transport.serializer.dumps(source))
+        size = sum(len(line) + 1 for line in lines)
+
+        if self._lines and self._bytes + size > self.max_chunk_bytes:
+            self.flush()
+
+        self._lines.extend(lines)
+        self._bytes += size
+        self._count += 1
+        self._models.add(model)
+
+        if self._count >= self.chunk_size:
+            self.flush()
+
+    def index(self, obj):
+        """buffers an index operation for an instance
+
+        :param obj: the instance to index
+        :type obj: djesrf.models.Searchable
+        """
+        mapping = obj.__class__.search_objects.mapping
+        action = {"index": {"_index": self.index_name or mapping.index, "_type": mapping.doc_type, "_id": obj.pk}}
+        self._add(obj.__class__, action, obj.to_dict())
+
+    def delete(self, model, pk):
+        """buffers a delete operation for a document
+
+        :param model: the model class the document belongs to
+        :type model: djesrf.models.Searchable
+
+        :param pk: the primary key of the document
+        :type pk: int
+        """
+        mapping = model.search_objects.mapping
+        action = {"delete": {"_index": self.index_name or mapping.index, "_type": mapping.doc_type, "_id": pk}}
+        self._add(model, action)
+
+    def flush(self):
+        """sends the buffered operations in a single `_bulk` request and tallies the outcome
+
+        :return: the result of this flush
+        :rtype: djesrf.bulk.BulkResult
+        """
+        flushed = BulkResult()
+        if not self._lines:
+            return flushed
+
+        body = "\n".join(self._lines) + "\n"
+        models = self._models
+        flushed.bytes = self._bytes
+        self._lines, self._bytes, self._count, self._models = [], 0, 0, set()
+
+        start = time.time()
+        response = self.es.bulk(body=body, refresh=self.refresh)
+        flushed.elapsed = time.time() - start
+        flushed.requests = 1
+
+        for item in response["items"]:
+            op_type, info = list(item.items())[0]
+            if "error" in info:
+                flushed.failed += 1
+                flushed.errors.append(item)
+            elif op_type == "delete":
+                flushed.deleted += 1
+            else:
+                flushed.indexed += 1
+
+        # anything derived from these models' search results is out of date now
+        for model in models:
+            model._bump_search_generation()
+
+        # throughput is measured against the wall clock, serialization included
+        self.result.update(flushed)
+        self.result.elapsed = time.time() - self._started
+        return flushed
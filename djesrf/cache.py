@@ -0,0 +1,213 @@
+from datetime import datetime
+import hashlib
+import json
+import time
+
+from django.core.cache import caches
+from django.utils import six
+from django.utils.module_loading import import_string
+from djes.search import FullResponse, ShallowResponse
+
+from djesrf.conf import settings
+
+
+def _generation_key(model):
+    """builds the cache key holding a model's index generation
+
+    :param model: the model class
+    :type model: djesrf.models.Searchable
+
+    :return: the cache key
+    :rtype: str
+    """
+    return "djesrf:generation:{}.{}".format(model._meta.app_label, model._meta.model_name)
+
+
+def _seed_generation(cache, key):
+    """starts a missing generation counter off at the current time in milliseconds, so a counter that was evicted (or
+    whose cache restarted) never goes back to a generation that entries are still cached under
+
+    :param cache: the cache holding the counter
+    :type cache: django.core.cache.backends.base.BaseCache
+
+    :param key: the cache key of the counter
+    :type key: str
+    """
+    cache.add(key, int(time.time() * 1000), None)
+
+
+def get_generation(model):
+    """gets the current index generation of a model
+
+    The generation advances every time an instance of the model is indexed or deleted from the index, so anything
+    derived from the model's search results can be versioned on it.
+
+    :param model: the model class
+    :type model: djesrf.models.Searchable
+
+    :return: the current generation
+    :rtype: int
+    """
+    cache = caches[settings.DJESRF_GENERATION_CACHE]
+    key = _generation_key(model)
+    generation = cache.get(key)
+    if generation is None:
+        _seed_generation(cache, key)
+        generation = cache.get(key, 0)
+    return generation
+
+
+def bump_generation(model):
+    """advances the index generation of a model
+
+    :param model: the model class
+    :type model: djesrf.models.Searchable
+
+    :return: the new generation
+    :rtype: int
+    """
+    cache = caches[settings.DJESRF_GENERATION_CACHE]
+    key = _generation_key(model)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # the counter was never set or has been evicted
+        _seed_generation(cache, key)
+        return cache.incr(key)
+
+
+def get_search_key(qs):
+    """hashes everything that makes up a search request -- connection, indexes, doc types, body and params
+
+    :param qs: the search to be executed
+    :type qs: djes.search.LazySearch
+
+    :return: the digest of the normalized request
+    :rtype: str
+    """
+    normalized = json.dumps({
+        "using": qs._using if isinstance(qs._using, six.string_types) else repr(qs._using),
+        "index": sorted(qs._index or []),
+        "doc_type": sorted(qs._doc_type),
+        "body": qs.to_dict(),
+        "params": qs._params,
+        "full": getattr(qs, "_full", False),
+    }, sort_keys=True, default=str)
+    return hashlib.md5(normalized.encode("utf8")).hexdigest()
+
+
+def _has_timestamps(value):
+    """checks a search body for exact timestamps, such as the current time of a `status` filter without
+    `DJESRF_STATUS_ROUNDING`
+
+    :param value: the search body, or a part of it
+    :type value: dict
+
+    :rtype: bool
+    """
+    if isinstance(value, dict):
+        return any(_has_timestamps(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(_has_timestamps(item) for item in value)
+    return isinstance(value, datetime)
+
+
+def make_response(qs, raw):
+    """wraps a raw elasticsearch response for a search the way `LazySearch.execute` does, and hands it to the search
+    so executing it again returns the same response
+
+    :param qs: the search the response is for
+    :type qs: djes.search.LazySearch
+
+    :param raw: the raw response
+    :type raw: dict
+
+    :return: the response
+    :rtype: elasticsearch_dsl.result.Response
+    """
+    if getattr(qs, "_full", False):
+        response = FullResponse(raw)
+    else:
+        response = ShallowResponse(raw, callbacks=qs._doc_type_map)
+    qs._executed = response
+    return response
+
+
+class SearchResultCache(object):
+    """caches raw elasticsearch responses in a django cache
+
+    Entries are keyed on the normalized search request (indexes, doc types, body and params) and the model's index
+    generation, so writes to the model invalidate every cached result on every node sharing the cache backend.
+    """
+
+    def __init__(self, alias, timeout=None):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def make_key(self, model, qs):
+        """builds the cache key for a search
+
+        :param model: the model class being searched
+        :type model: djesrf.models.Searchable
+
+        :param qs: the search to be executed
+        :type qs: djes.search.LazySearch
+
+        :return: the cache key
+        :rtype: str
+        """
+        return "djesrf:results:{}.{}:{}:{}".format(
+            model._meta.app_label, model._meta.model_name, get_generation(model), get_search_key(qs))
+
+    def is_cacheable(self, qs):
+        """checks whether a search is worth caching -- one with the exact current time in it is never sent again, so
+        its entry would never be read
+
+        :param qs: the search to be executed
+        :type qs: djes.search.LazySearch
+
+        :rtype: bool
+        """
+        return not _has_timestamps(qs.to_dict())
+
+    def get(self, key, qs):
+        """gets the cached response for a search
+
+        :param key: the cache key built by `make_key`
+        :type key: str
+
+        :param qs: the search to be executed
+        :type qs: djes.search.LazySearch
+
+        :return: the response, or `None` on a cache miss
+        :rtype: elasticsearch_dsl.result.Response
+        """
+        raw = self.cache.get(key)
+        if raw is None:
+            return None
+        return make_response(qs, raw)
+
+    def set(self, key, response):
+        """caches the response of a search
+
+        This has to happen before the hits of the response are accessed, as hydrating them alters the raw response.
+
+        :param key: the cache key built by `make_key`
+        :type key: str
+
+        :param response: the response of the executed search
+        :type response: elasticsearch_dsl.result.Response
+        """
+        self.cache.set(key, response.to_dict(), self.timeout)
+
+
+def get_result_cache():
+    """gets the configured search result cache
+
+    :return: the result cache, or `None` when result caching is disabled
+    :rtype: djesrf.cache.SearchResultCache
+    """
+    if settings.DJESRF_RESULT_CACHE is None:
+        return None
+    cache_class = import_string(settings.DJESRF_RESULT_CACHE_CLASS)
+    return cache_class(settings.DJESRF_RESULT_CACHE, timeout=settings.DJESRF_RESULT_CACHE_TIMEOUT)
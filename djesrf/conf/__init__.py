@@ -0,0 +1,16 @@
+from django.conf import settings as user_settings
+
+from djesrf.conf import defaults
+
+
+class Settings(object):
+    """reads djesrf settings from the project settings, falling back on `djesrf.conf.defaults`
+    """
+
+    def __getattr__(self, name):
+        if name != name.upper() or not hasattr(defaults, name):
+            raise AttributeError(name)
+        return getattr(user_settings, name, getattr(defaults, name))
+
+
+settings = Settings()
@@ -0,0 +1,60 @@
+# the django cache used to hold the per-model index generation counters
+DJESRF_GENERATION_CACHE = "default"
+
+# the django cache used to hold search results -- `None` disables result caching
+DJESRF_RESULT_CACHE = None
+DJESRF_RESULT_CACHE_CLASS = "djesrf.cache.SearchResultCache"
+DJESRF_RESULT_CACHE_TIMEOUT = 60 * 60
+
+# status filters round `now` down to this date math unit ("m", "h", "d"...) so identical status searches send
+# identical, cacheable filters -- `None` filters on the exact time
+DJESRF_STATUS_ROUNDING = None
+
+# send searches with `query_cache=true` so the shards cache their results
+DJESRF_QUERY_CACHE = False
+
+# page number pagination stops each shard after this many matching documents -- `None` counts every match
+DJESRF_TERMINATE_AFTER = None
+
+# time the stages of view set requests and report them in a `Server-Timing` header and the `search_timed` signal --
+# with `DJESRF_TIMINGS_DEBUG` they're added to the response body as well
+DJESRF_TIMINGS = False
+DJESRF_TIMINGS_DEBUG = False
+
+# exports scroll through searches in batches of this many hits, keeping each scroll open this long between batches
+DJESRF_EXPORT_BATCH_SIZE = 500
+DJESRF_EXPORT_SCROLL = "1m"
+
+# stop sending searches to a connection after `FAILURE_THRESHOLD` failures (or searches slower than `LATENCY_THRESHOLD`
+# seconds) in a row, and let a probe through again after `RESET_TIMEOUT` seconds
+DJESRF_CIRCUIT_BREAKER = False
+DJESRF_BREAKER_FAILURE_THRESHOLD = 5
+DJESRF_BREAKER_LATENCY_THRESHOLD = None
+DJESRF_BREAKER_RESET_TIMEOUT = 30
+
+# give list and aggregates responses etags built from the request and the model's index generation, and answer
+# matching `If-None-Match` headers with a `304` without searching
+DJESRF_ETAGS = False
+
+# the django cache holding precomputed aggregates of each model's `facet_combinations` -- `None` disables the facet
+# cache. entries are revalidated in the background once they're `REFRESH_AFTER` seconds old or the index has changed,
+# and never served once they're `MAX_STALE` seconds old
+DJESRF_FACET_CACHE = None
+DJESRF_FACET_CACHE_REFRESH_AFTER = 60
+DJESRF_FACET_CACHE_MAX_STALE = 10 * 60
+DJESRF_FACET_REFRESH_ON_WRITE = False
+
+# coalesce identical searches made at the same time within a process, so only the first one goes to elasticsearch
+# and the others wait on it and share its response
+DJESRF_SINGLE_FLIGHT = False
+
+# bulk indexing chunks are flushed at whichever of these limits is hit first
+DJESRF_BULK_CHUNK_SIZE = 500
+DJESRF_BULK_MAX_CHUNK_BYTES = 10 * 1024 * 1024
+
+# deferred indexing queues index and delete operations and writes them from the backend in batches
+DJESRF_INDEXING_BACKEND = "djesrf.deferred.ThreadBackend"
+DJESRF_INDEXING_QUEUE_SIZE = 10000
+DJESRF_INDEXING_BATCH_SIZE = 500
+DJESRF_INDEXING_FLUSH_INTERVAL = 1.0
+DJESRF_INDEXING_ENQUEUE_TIMEOUT = 5.0
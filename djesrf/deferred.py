@@ -0,0 +1,192 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.db import close_old_connections
+from django.utils.module_loading import import_string
+from django.utils.six.moves import queue
+
+from djesrf.bulk import BulkIndexer
+from djesrf.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+INDEX = "index"
+DELETE = "delete"
+
+# tells the worker to write out whatever it has pending right away
+_FLUSH = object()
+
+# tells the worker to write out whatever it has pending and exit
+_STOP = object()
+
+
+class IndexingBackend(object):
+    """base class for backends that take index and delete operations off of the request path
+    """
+
+    def enqueue(self, model, pk, op):
+        """queues up an operation for a document
+
+        :param model: the model class the document belongs to
+        :type model: djesrf.models.Searchable
+
+        :param pk: the primary key of the document
+        :type pk: int
+
+        :param op: `djesrf.deferred.INDEX` or `djesrf.deferred.DELETE`
+        :type op: str
+        """
+        raise NotImplementedError("enqueue() must be implemented")
+
+    def flush(self):
+        """blocks until every operation queued so far has been written to elasticsearch
+        """
+        raise NotImplementedError("flush() must be implemented")
+
+    def shutdown(self):
+        """writes out everything that's pending and stops the backend
+        """
+        self.flush()
+
+    @staticmethod
+    def write(pending, batch_size=None):
+        """writes coalesced operations to elasticsearch in bulk
+
+        Documents queued for indexing are loaded fresh from the database, so they go out as they are at flush time.
+        Documents that can't be found are skipped rather than deleted -- their delete is queued on its own.
+
+        :param pending: model classes mapped to dictionaries of primary keys and their latest operation
+        :type pending: dict
+
+        :param batch_size: the most operations to send in a single `_bulk` request
+        :type batch_size: int
+
+        :return: the outcome of the operations
+        :rtype: djesrf.bulk.BulkResult
+        """
+        indexer = BulkIndexer(chunk_size=batch_size)
+        for model, operations in pending.items():
+            index_pks = [pk for pk, op in operations.items() if op == INDEX]
+            objects = model.objects.in_bulk(index_pks) if index_pks else {}
+
+            for pk, op in operations.items():
+                if op == DELETE:
+                    indexer.delete(model, pk)
+                elif pk in objects:
+                    indexer.index(objects[pk])
+                else:
+                    logger.debug("Skipped indexing %s %s, which no longer exists", model.__name__, pk)
+
+        indexer.flush()
+        return indexer.result
+
+
+class ThreadBackend(IndexingBackend):
+    """queues operations in memory and writes them from a background thread in the same process
+
+    Operations on the same document are coalesced while they wait, so an object saved ten times between flushes is
+    only indexed once. The worker flushes whenever `batch_size` documents are pending or `flush_interval` seconds have
+    passed. The queue holds at most `max_size` operations -- once it's full, callers wait up to `enqueue_timeout`
+    seconds for room and then write their operation themselves. Anything still pending is flushed at exit.
+    """
+
+    def __init__(self, max_size=None, batch_size=None, flush_interval=None, enqueue_timeout=None):
+        self.max_size = max_size or settings.DJESRF_INDEXING_QUEUE_SIZE
+        self.batch_size = batch_size or settings.DJESRF_INDEXING_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.DJESRF_INDEXING_FLUSH_INTERVAL
+        self.enqueue_timeout = enqueue_timeout or settings.DJESRF_INDEXING_ENQUEUE_TIMEOUT
+        self._queue = queue.Queue(maxsize=self.max_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        atexit.register(self.shutdown)
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="djesrf-indexing")
+                self._thread.daemon = True
+                self._thread.start()
+
+    def enqueue(self, model, pk, op):
+        self._ensure_worker()
+        try:
+            self._queue.put((model, pk, op), timeout=self.enqueue_timeout)
+        except queue.Full:
+            # apply back pressure by doing the work on the caller's thread
+            self.write({model: {pk: op}}, self.batch_size)
+
+    def flush(self):
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(_FLUSH)
+        self._queue.join()
+
+    def shutdown(self):
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        pending = {}
+        pending_count = 0
+        received = 0
+        deadline = time.time() + self.flush_interval
+
+        while True:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.time(), 0))
+            except queue.Empty:
+                item = None
+            else:
+                received += 1
+
+            if item is not None and item is not _FLUSH and item is not _STOP:
+                model, pk, op = item
+                operations = pending.setdefault(model, {})
+                if pk not in operations:
+                    pending_count += 1
+                operations[pk] = op
+
+            should_flush = (
+                item is _FLUSH or item is _STOP or pending_count >= self.batch_size or time.time() >= deadline
+            )
+            if should_flush:
+                if pending:
+                    try:
+                        self.write(pending, self.batch_size)
+                    except Exception:
+                        # a bad batch shouldn't take the worker down with it
+                        logger.exception("Deferred indexing flush failed")
+                    finally:
+                        close_old_connections()
+                pending, pending_count = {}, 0
+                deadline = time.time() + self.flush_interval
+
+                # everything received so far has been written, so it's done
+                for _ in range(received):
+                    self._queue.task_done()
+                received = 0
+
+            if item is _STOP:
+                return
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_indexing_backend():
+    """gets the process wide deferred indexing backend
+
+    :return: an instance of `DJESRF_INDEXING_BACKEND`
+    :rtype: djesrf.deferred.IndexingBackend
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = import_string(settings.DJESRF_INDEXING_BACKEND)()
+        return _backend
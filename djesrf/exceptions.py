@@ -0,0 +1,28 @@
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class InvalidSearch(Exception):
+    """raised when a search is built with fields, filters or ordering the model's mapping can't satisfy
+    """
+    pass
+
+
+class CircuitOpen(Exception):
+    """raised instead of sending a search while the circuit breaker of its connection is open
+    """
+    pass
+
+
+class UntranslatableSearch(Exception):
+    """raised when a search has no database equivalent to fall back on
+    """
+    pass
+
+
+class SearchUnavailable(APIException):
+    """returned to clients when a search can't be sent to elasticsearch and can't be served from the database either
+    """
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _("Search is temporarily unavailable.")
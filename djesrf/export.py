@@ -0,0 +1,102 @@
+import csv
+import json
+
+from django.utils import six
+from rest_framework.compat import OrderedDict
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# export formats and their content types
+EXPORT_FORMATS = OrderedDict([
+    ("ndjson", "application/x-ndjson"),
+    ("csv", "text/csv"),
+])
+
+
+def flatten(data, prefix=""):
+    """flattens nested objects of a serialized result into dotted keys, for formats without nesting
+
+    :param data: the serialized result
+    :type data: dict
+
+    :param prefix: the dotted path of `data`
+    :type prefix: str
+
+    :return: the flattened result -- lists are kept as they are
+    :rtype: dict
+    """
+    flattened = OrderedDict()
+    for key, value in data.items():
+        path = "{}{}".format(prefix, key)
+        if isinstance(value, dict):
+            flattened.update(flatten(value, "{}.".format(path)))
+        else:
+            flattened[path] = value
+    return flattened
+
+
+def iter_ndjson(batches):
+    """encodes batches of serialized results as newline delimited json, one chunk per batch
+
+    :param batches: lists of serialized results
+    :type batches: iterable
+
+    :return: an iterator of chunks
+    :rtype: generator
+    """
+    # compact separators, like drf's `JSONRenderer`
+    encoder = JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    for rows in batches:
+        yield "".join(encoder.encode(row) + "\n" for row in rows).encode("utf8")
+
+
+class _Echo(object):
+    """a file-like object that hands back whatever is written to it, so the csv writer can format a row at a time
+    """
+
+    def write(self, value):
+        return value
+
+
+def _format_csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        value = json.dumps(value, cls=JSONEncoder, ensure_ascii=False)
+    value = six.text_type(value)
+    # the python 2 csv module only deals in bytes
+    return value.encode("utf8") if six.PY2 else value
+
+
+def iter_csv(batches, columns=None):
+    """encodes batches of serialized results as csv with a header row, one chunk per batch
+
+    Nested objects are flattened into dotted columns and lists are written as json.
+
+    :param batches: lists of serialized results
+    :type batches: iterable
+
+    :param columns: the dotted paths of the columns -- by default, the keys of the first result
+    :type columns: list
+
+    :return: an iterator of chunks
+    :rtype: generator
+    """
+    writer = csv.writer(_Echo())
+    header = True
+    for rows in batches:
+        rows = [flatten(row) for row in rows]
+        if not rows:
+            continue
+
+        lines = []
+        if header:
+            header = False
+            if columns is None:
+                columns = list(rows[0])
+            lines.append(writer.writerow([_format_csv_value(column) for column in columns]))
+        for row in rows:
+            lines.append(writer.writerow([_format_csv_value(row.get(column)) for column in columns]))
+
+        chunk = "".join(lines) if six.PY3 else b"".join(lines)
+        yield chunk.encode("utf8") if six.PY3 else chunk
@@ -0,0 +1,227 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from django.core.cache import caches
+from django.utils import six
+from django.utils.six.moves import queue
+
+from djesrf.cache import get_generation
+from djesrf.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_filters(filters):
+    """converts filters into a plain dictionary of lists of values, so a `QueryDict` and a dictionary compare equal
+
+    :param filters: key-value pairs of field name keys and filter term values
+    :type filters: dict
+
+    :return: the filter keys mapped to lists of values
+    :rtype: dict
+    """
+    normalized = {}
+    for key in filters or {}:
+        if hasattr(filters, "getlist"):
+            values = filters.getlist(key)
+        elif isinstance(filters[key], (list, tuple)):
+            values = list(filters[key])
+        else:
+            values = [filters[key]]
+        normalized[key] = [six.text_type(value) for value in values]
+    return normalized
+
+
+class FacetCache(object):
+    """serves precomputed aggregates of the common facet combinations (the model's `facet_combinations`), revalidating
+    them in the background
+
+    Entries are fresh for `refresh_after` seconds and as long as the model's index generation hasn't moved. Stale
+    entries are still served -- for up to `max_stale` seconds after they were computed -- while a worker thread
+    recomputes them, so only the very first request for a combination (or one after a long quiet spell) waits for
+    elasticsearch.
+    """
+
+    def __init__(self, alias, refresh_after=60, max_stale=600):
+        self.cache = caches[alias]
+        self.refresh_after = refresh_after
+        self.max_stale = max_stale
+
+        self.metrics = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "refresh_errors": 0}
+        self._metrics_lock = threading.Lock()
+
+        self._queue = queue.Queue()
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._thread = None
+
+    def _count(self, metric):
+        with self._metrics_lock:
+            self.metrics[metric] += 1
+
+    def get_metrics(self):
+        """gets the hit, stale hit, miss and refresh counts of the cache
+
+        :rtype: dict
+        """
+        with self._metrics_lock:
+            return dict(self.metrics)
+
+    def is_cacheable(self, model, query, filters):
+        """checks whether a request is one of the model's precomputed facet combinations
+
+        :rtype: bool
+        """
+        if query:
+            return False
+        normalized = normalize_filters(filters)
+        return any(normalize_filters(combination) == normalized for combination in model.facet_combinations)
+
+    def make_key(self, model, filters):
+        """builds the cache key of a facet combination
+
+        :param model: the model class
+        :type model: djesrf.models.Aggregateable
+
+        :param filters: the filters of the combination
+        :type filters: dict
+
+        :return: the cache key
+        :rtype: str
+        """
+        normalized = json.dumps(normalize_filters(filters), sort_keys=True)
+        return "djesrf:facets:{}.{}:{}".format(
+            model._meta.app_label, model._meta.model_name, hashlib.md5(normalized.encode("utf8")).hexdigest())
+
+    def get(self, model, filters):
+        """gets the aggregates of a facet combination, computing them if there's nothing fresh enough to serve
+
+        :param model: the model class
+        :type model: djesrf.models.Aggregateable
+
+        :param filters: the filters of the combination
+        :type filters: dict
+
+        :return: the aggregates, as returned by `get_aggregates`
+        :rtype: dict
+        """
+        key = self.make_key(model, filters)
+        entry = self.cache.get(key)
+        now = time.time()
+
+        if entry is None or now - entry["computed_at"] >= self.max_stale:
+            self._count("misses")
+            return self.refresh(model, filters)
+
+        if now - entry["computed_at"] < self.refresh_after and entry["generation"] == get_generation(model):
+            self._count("hits")
+        else:
+            self._count("stale_hits")
+            self.schedule_refresh(model, filters)
+        return entry["aggregates"]
+
+    def is_current(self, model, filters):
+        """checks whether `get` answers a facet combination as of the model's current index generation -- a stale
+        entry served while it's recomputed describes an older one
+
+        :param model: the model class
+        :type model: djesrf.models.Aggregateable
+
+        :param filters: the filters of the combination
+        :type filters: dict
+
+        :rtype: bool
+        """
+        entry = self.cache.get(self.make_key(model, filters))
+        if entry is None or time.time() - entry["computed_at"] >= self.max_stale:
+            return True
+        return entry["generation"] == get_generation(model)
+
+    def refresh(self, model, filters):
+        """computes the aggregates of a facet combination and caches them
+
+        :return: the aggregates
+        :rtype: dict
+        """
+        # read the generation first, so writes made while computing leave the entry stale
+        generation = get_generation(model)
+        aggregates = model.compute_aggregates(None, filters)
+        entry = {"aggregates": aggregates, "generation": generation, "computed_at": time.time()}
+        self.cache.set(self.make_key(model, filters), entry, self.max_stale)
+        self._count("refreshes")
+        return aggregates
+
+    def schedule_refresh(self, model, filters):
+        """queues a facet combination to be recomputed by the worker thread, unless it already is
+
+        :param model: the model class
+        :type model: djesrf.models.Aggregateable
+
+        :param filters: the filters of the combination
+        :type filters: dict
+        """
+        key = self.make_key(model, filters)
+        with self._pending_lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="djesrf-facets")
+                self._thread.daemon = True
+                self._thread.start()
+        self._queue.put((key, model, filters))
+
+    def precompute(self, model):
+        """recomputes every facet combination of a model right away
+
+        :param model: the model class
+        :type model: djesrf.models.Aggregateable
+        """
+        for combination in model.facet_combinations:
+            self.refresh(model, combination)
+
+    def join(self):
+        """blocks until every scheduled refresh has finished
+        """
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            key, model, filters = self._queue.get()
+            try:
+                # let go of the key first, so writes during the refresh can schedule another one
+                with self._pending_lock:
+                    self._pending.discard(key)
+                self.refresh(model, filters)
+            except Exception:
+                # keep serving the stale entry until a refresh goes through
+                self._count("refresh_errors")
+                logger.exception("Refreshing facets of %s failed", model.__name__)
+            finally:
+                self._queue.task_done()
+
+
+_facet_cache = None
+_facet_cache_lock = threading.Lock()
+
+
+def get_facet_cache():
+    """gets the process wide facet cache
+
+    :return: the facet cache, or `None` when `DJESRF_FACET_CACHE` is off
+    :rtype: djesrf.facets.FacetCache
+    """
+    global _facet_cache
+    if settings.DJESRF_FACET_CACHE is None:
+        return None
+    with _facet_cache_lock:
+        if _facet_cache is None:
+            _facet_cache = FacetCache(
+                settings.DJESRF_FACET_CACHE,
+                refresh_after=settings.DJESRF_FACET_CACHE_REFRESH_AFTER,
+                max_stale=settings.DJESRF_FACET_CACHE_MAX_STALE)
+        return _facet_cache
@@ -0,0 +1,102 @@
+import logging
+import sys
+import threading
+
+from django.utils import six
+from django.utils.six.moves import queue
+from elasticsearch_dsl.connections import connections
+
+from djesrf.cache import make_response
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_hedge_params(params):
+    """gets the params of the hedged copy of a search
+
+    A search with a custom `preference` string always goes to the same shard copies, which is what made it slow, so
+    the hedged copy gets a preference of its own. Searches without one (or with one of elasticsearch's `_primary`,
+    `_local`... values) are sent as they are, and the coordinating node picks copies again.
+
+    :param params: the params of the original search
+    :type params: dict
+
+    :return: the params of the hedged search
+    :rtype: dict
+    """
+    params = dict(params)
+    preference = params.get("preference")
+    if preference and not preference.startswith("_"):
+        params["preference"] = "{}-hedge".format(preference)
+    return params
+
+
+def hedged_search(es, request, params, delay):
+    """sends a search, and sends it again if it hasn't answered after `delay` seconds -- whichever answers first wins
+
+    Errors aren't retried: the search only fails once every copy that was sent has failed, with the error of whichever
+    failed first. The copy that loses is left to finish in the background.
+
+    :param es: the elasticsearch client
+    :type es: elasticsearch.Elasticsearch
+
+    :param request: the `index`, `doc_type` and `body` of the search
+    :type request: dict
+
+    :param params: the query params of the search
+    :type params: dict
+
+    :param delay: how long to wait for the first search before hedging, in seconds
+    :type delay: float
+
+    :return: the raw response
+    :rtype: dict
+    """
+    results = queue.Queue()
+
+    def send(send_params):
+        try:
+            results.put((True, es.search(**dict(request, **send_params))))
+        except Exception:
+            results.put((False, sys.exc_info()))
+
+    def start(send_params):
+        thread = threading.Thread(target=send, args=(send_params, ))
+        thread.daemon = True
+        thread.start()
+
+    start(params)
+    try:
+        outcomes = [results.get(timeout=delay)]
+    except queue.Empty:
+        logger.debug("Hedging a search of %s after %ss", request.get("index"), delay)
+        start(get_hedge_params(params))
+        outcomes = [results.get()]
+        if not outcomes[0][0]:
+            outcomes.append(results.get())
+
+    for ok, value in outcomes:
+        if ok:
+            return value
+    six.reraise(*outcomes[0][1])
+
+
+def hedged_execute(qs, delay):
+    """executes a search like `LazySearch.execute`, but hedged
+
+    :param qs: elasticsearch search results mapped to django model proxies
+    :type qs: djes.search.LazySearch
+
+    :param delay: how long to wait for the first search before hedging, in seconds
+    :type delay: float
+
+    :return: the elasticsearch response
+    :rtype: elasticsearch_dsl.result.Response
+    """
+    if hasattr(qs, "_executed"):
+        return qs._executed
+
+    es = connections.get_connection(qs._using)
+    request = {"index": qs._index, "doc_type": qs._doc_type, "body": qs.to_dict()}
+    return make_response(qs, hedged_search(es, request, qs._params, delay))
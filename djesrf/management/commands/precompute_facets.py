@@ -0,0 +1,50 @@
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from djesrf.facets import get_facet_cache
+from djesrf.models import Aggregateable
+
+
+class Command(BaseCommand):
+    help = ("Recomputes the facet cache entries of every `facet_combinations` entry of the given Aggregateable "
+            "models (all of them if none are given). Run it on a schedule to keep the facet cache warm.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("models", nargs="*", metavar="app_label.ModelName",
+                            help="models to precompute; every Aggregateable model if none are given")
+
+    def get_models(self, labels):
+        """resolves model labels into Aggregateable models
+
+        :param labels: `app_label.ModelName` labels
+        :type labels: list
+
+        :return: the models
+        :rtype: list
+        """
+        if not labels:
+            return [model for model in apps.get_models() if issubclass(model, Aggregateable)]
+
+        models = []
+        for label in labels:
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError):
+                raise CommandError("Unknown model: {}".format(label))
+            if not issubclass(model, Aggregateable):
+                raise CommandError("{} is not Aggregateable".format(label))
+            models.append(model)
+        return models
+
+    def handle(self, *args, **options):
+        facet_cache = get_facet_cache()
+        if facet_cache is None:
+            raise CommandError("The facet cache is off -- set DJESRF_FACET_CACHE to a cache alias")
+
+        for model in self.get_models(options["models"]):
+            start = time.time()
+            facet_cache.precompute(model)
+            self.stdout.write("Precomputed {} facet combinations of {} in {:.2f}s".format(
+                len(model.facet_combinations), model.__name__, time.time() - start))
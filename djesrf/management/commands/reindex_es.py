@@ -0,0 +1,182 @@
+from multiprocessing import Pool, cpu_count
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections as db_connections
+from django.db.models import Max, Min
+from djes.apps import indexable_registry
+from djes.conf import settings as djes_settings
+from djes.management.commands.sync_es import get_indexes
+from elasticsearch_dsl.connections import connections
+
+from djesrf.bulk import BulkIndexer, BulkResult
+
+
+def _init_worker():
+    """drops the database and elasticsearch connections inherited from the parent process
+    """
+    db_connections.close_all()
+    connections.configure()
+    connections.configure(**djes_settings.ES_CONNECTIONS)
+
+
+def _reindex_chunk(task):
+    """indexes one primary key range of a model into the new index
+
+    :param task: the model label, the pk range, the new index name and the bulk chunk size
+    :type task: tuple
+
+    :return: the outcome of the chunk
+    :rtype: djesrf.bulk.BulkResult
+    """
+    label, start, end, index, bulk_size = task
+    model = apps.get_model(label)
+
+    indexer = BulkIndexer(chunk_size=bulk_size, index=index)
+    for obj in model.objects.filter(pk__gte=start, pk__lt=end).order_by("pk").iterator():
+        indexer.index(obj)
+    indexer.flush()
+    return indexer.result
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds Elasticsearch indexes into fresh versioned indexes with a pool of worker processes and "
+            "swaps the aliases over once they're done. Every model sharing an index with the given models is "
+            "reindexed, as the alias swap replaces the whole index.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("models", nargs="*", metavar="app_label.ModelName",
+                            help="models to reindex; all indexes are rebuilt if none are given")
+        parser.add_argument("--workers", type=int, default=cpu_count(),
+                            help="number of worker processes (default: number of cpus)")
+        parser.add_argument("--chunk-size", type=int, default=10000,
+                            help="size of the primary key range each worker streams from the database")
+        parser.add_argument("--bulk-size", type=int, default=None,
+                            help="number of documents per `_bulk` request")
+        parser.add_argument("--refresh-interval", default="1s",
+                            help="refresh interval to set on the new index once it's built")
+
+    def get_index_names(self, labels):
+        """resolves model labels into the names of the indexes they live in
+
+        :param labels: `app_label.ModelName` labels
+        :type labels: list
+
+        :return: index names
+        :rtype: list
+        """
+        if not labels:
+            return list(indexable_registry.indexes)
+
+        names = []
+        for label in labels:
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError):
+                raise CommandError("Unknown model: {}".format(label))
+            name = model.search_objects.mapping.index
+            if name not in indexable_registry.indexes:
+                raise CommandError("{} is not indexed".format(label))
+            if name not in names:
+                names.append(name)
+        return names
+
+    def get_tasks(self, name, index, chunk_size, bulk_size):
+        """splits every model of an index into primary key range chunks
+
+        :return: worker tasks
+        :rtype: list
+        """
+        tasks = []
+        for model in indexable_registry.indexes[name]:
+            label = "{}.{}".format(model._meta.app_label, model._meta.object_name)
+            if label in djes_settings.DJES_EXCLUDED_MODELS:
+                continue
+
+            bounds = model.objects.aggregate(low=Min("pk"), high=Max("pk"))
+            if bounds["low"] is None:
+                continue
+
+            start = bounds["low"]
+            while start <= bounds["high"]:
+                tasks.append((label, start, start + chunk_size, index, bulk_size))
+                start += chunk_size
+        return tasks
+
+    def reindex(self, name, body, options):
+        """builds a new version of an index and points the alias at it
+
+        :param name: the index alias
+        :type name: str
+
+        :param body: the settings and mappings of the index
+        :type body: dict
+
+        :param options: the command options
+        :type options: dict
+        """
+        es = connections.get_connection("default")
+
+        # find the current version behind the alias
+        old_index = None
+        version = 0
+        if es.indices.exists_alias(name=name):
+            old_index = list(es.indices.get_alias(name=name))[0]
+            version = int(old_index.split("_")[-1])
+        new_index = "{0}_{1:0>4}".format(name, version + 1)
+
+        # build the new index without refreshes while it's being loaded
+        self.stdout.write("Creating index \"{}\"".format(new_index))
+        es.indices.create(index=new_index, body=body)
+        es.indices.put_settings(index=new_index, body={"index": {"refresh_interval": "-1"}})
+
+        tasks = self.get_tasks(name, new_index, options["chunk_size"], options["bulk_size"])
+        self.stdout.write("Reindexing \"{}\" in {} chunks with {} workers".format(
+            name, len(tasks), options["workers"]))
+
+        # the workers fork off of this process, so they can't share its database connections
+        db_connections.close_all()
+        result = BulkResult()
+        started = time.time()
+        pool = Pool(processes=options["workers"], initializer=_init_worker)
+        try:
+            for chunk in pool.imap_unordered(_reindex_chunk, tasks):
+                result.update(chunk)
+                result.elapsed = time.time() - started
+                self.stdout.write("{} docs indexed, {} failed ({:.1f} docs/sec)".format(
+                    result.indexed, result.failed, result.docs_per_second))
+        finally:
+            pool.close()
+            pool.join()
+
+        es.indices.put_settings(index=new_index, body={"index": {"refresh_interval": options["refresh_interval"]}})
+        es.indices.refresh(index=new_index)
+
+        if result.failed:
+            for error in result.errors[:10]:
+                self.stderr.write(str(error))
+            raise CommandError("{} documents failed to index; \"{}\" is still pointing at \"{}\"".format(
+                result.failed, name, old_index))
+
+        # swap the alias over in a single atomic update
+        actions = [{"add": {"index": new_index, "alias": name}}]
+        if old_index is not None:
+            actions.insert(0, {"remove": {"index": old_index, "alias": name}})
+        es.indices.update_aliases(body={"actions": actions})
+
+        # results cached against the old index are out of date now
+        for model in indexable_registry.indexes[name]:
+            if hasattr(model, "_bump_search_generation"):
+                model._bump_search_generation()
+
+        self.stdout.write("Pointed alias \"{}\" at \"{}\": {} docs in {:.1f}s ({:.1f} docs/sec)".format(
+            name, new_index, result.indexed, result.elapsed, result.docs_per_second))
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1 or options["chunk_size"] < 1:
+            raise CommandError("--workers and --chunk-size must be positive")
+
+        indexes = get_indexes()
+        for name in self.get_index_names(options["models"]):
+            self.reindex(name, indexes[name], options)
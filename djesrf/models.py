@@ -1,17 +1,188 @@
-from django.utils import timezone
+from functools import partial
+from timeit import default_timer
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import six, timezone
 from djes.models import Indexable
 
 from elasticsearch_dsl import aggs
-from elasticsearch_dsl.filter import Term, Range, MatchAll, Nested, Missing
+from elasticsearch_dsl.connections import connections
+from elasticsearch_dsl.filter import Term, Terms, Range, MatchAll, Missing, Exists
+
+from djesrf.breaker import get_breaker
+from djesrf.bulk import BulkIndexer, get_active_indexer
+from djesrf.cache import bump_generation, get_result_cache
+from djesrf.conf import settings
+from djesrf.deferred import DELETE, INDEX, get_indexing_backend
+from djesrf.exceptions import UntranslatableSearch
+from djesrf.facets import get_facet_cache
+from djesrf.hedging import hedged_execute
+from djesrf.plans import SearchPlan, is_truthy
+from djesrf.profiling import get_active_profiler, supports_profile_api
+from djesrf.singleflight import get_single_flight
+from djesrf.timing import get_active_timer, stage
+
+
+# the datetime fields zeroed to round the current time down to each date math unit
+ROUNDED_FIELDS = {
+    "s": ("microsecond", ),
+    "m": ("second", "microsecond"),
+    "h": ("minute", "second", "microsecond"),
+    "H": ("minute", "second", "microsecond"),
+    "d": ("hour", "minute", "second", "microsecond"),
+}
+
+
+def _get_filter_values(filters, key):
+    """gets every value of a filter key, whether the filters are a `QueryDict` or a plain dictionary
+
+    :param filters: key-value pairs of field name keys and filter term values
+    :type filters: dict
+
+    :param key: the filter key
+    :type key: str
+
+    :return: the values of the key
+    :rtype: list
+    """
+    if hasattr(filters, "getlist"):
+        return filters.getlist(key)
+    value = filters[key]
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
 
 
 class Searchable(Indexable):
     """adds a `.search` class method to the model
     """
 
+    # queue index and delete operations for the indexing backend instead of writing them on save
+    deferred_indexing = False
+
+    # the edge n-gram field matched by `suggest` and the `_source` field returned as each suggestion's label
+    suggest_field = "name.autocomplete"
+    suggest_label_field = "name"
+
     class Meta(object):
         abstract = True
 
+    def _should_defer(self, kwargs):
+        """checks whether an index operation goes to the deferred indexing backend -- callers asking for a refresh
+        expect to see the document right away, so those are always written immediately
+
+        Without commit hooks (django < 1.9) operations made inside a transaction are written immediately as well, as
+        the worker can't see the row until the transaction commits.
+
+        :rtype: bool
+        """
+        if not self.deferred_indexing or kwargs.get("refresh"):
+            return False
+        return hasattr(transaction, "on_commit") or not transaction.get_connection(self._state.db).in_atomic_block
+
+    def _defer(self, op):
+        """queues an operation for the indexing backend once the current transaction (if any) commits, so the worker
+        finds the row as it was committed -- operations of a transaction that's rolled back are never queued
+
+        :param op: `djesrf.deferred.INDEX` or `djesrf.deferred.DELETE`
+        :type op: str
+        """
+        backend = get_indexing_backend()
+        model, pk = self.__class__, self.pk
+        if not hasattr(transaction, "on_commit"):
+            # `_should_defer` only lets this happen outside of a transaction, where there's nothing to wait for
+            backend.enqueue(model, pk, op)
+            return
+        transaction.on_commit(lambda: backend.enqueue(model, pk, op), using=self._state.db)
+
+    def index(self, *args, **kwargs):
+        # inside of a bulk block the operation is buffered and the generation is bumped when it's flushed
+        indexer = get_active_indexer()
+        if indexer is not None:
+            indexer.index(self)
+            return
+
+        if self._should_defer(kwargs):
+            self._defer(INDEX)
+            return
+
+        super(Searchable, self).index(*args, **kwargs)
+        self._bump_search_generation()
+
+    def delete_index(self, *args, **kwargs):
+        indexer = get_active_indexer()
+        if indexer is not None:
+            indexer.delete(self.__class__, self.pk)
+            return
+
+        if self._should_defer(kwargs):
+            self._defer(DELETE)
+            return
+
+        super(Searchable, self).delete_index(*args, **kwargs)
+        self._bump_search_generation()
+
+    @classmethod
+    def bulk_index(cls, objects, chunk_size=None, max_chunk_bytes=None, refresh=False):
+        """indexes many instances through the elasticsearch `_bulk` api
+
+        :param objects: the instances to index
+        :type objects: django.db.models.QuerySet
+
+        :param chunk_size: the most operations to send in a single request
+        :type chunk_size: int
+
+        :param max_chunk_bytes: the largest request body to send in a single request
+        :type max_chunk_bytes: int
+
+        :param refresh: whether or not to refresh the index after each request
+        :type refresh: bool
+
+        :return: counts of indexed and failed documents, per-item errors and throughput
+        :rtype: djesrf.bulk.BulkResult
+        """
+        # stream querysets instead of caching them
+        if hasattr(objects, "iterator"):
+            objects = objects.iterator()
+
+        indexer = BulkIndexer(chunk_size=chunk_size, max_chunk_bytes=max_chunk_bytes, refresh=refresh)
+        for obj in objects:
+            indexer.index(obj)
+        indexer.flush()
+
+        # done
+        return indexer.result
+
+    @classmethod
+    def _bump_search_generation(cls):
+        """advances the index generation of the model and every concrete searchable model it inherits from, as
+        their searches include this model's documents
+        """
+        facet_cache = get_facet_cache() if settings.DJESRF_FACET_REFRESH_ON_WRITE else None
+        for klass in cls.__mro__:
+            if issubclass(klass, Searchable) and not klass._meta.abstract:
+                bump_generation(klass)
+
+                # recompute the model's facets now rather than on the next request
+                if facet_cache is not None:
+                    for combination in getattr(klass, "facet_combinations", ()):
+                        facet_cache.schedule_refresh(klass, combination)
+
+    @classmethod
+    def get_search_plan(cls):
+        """gets the model's compiled search plan, compiling it on first use
+
+        :return: the search plan
+        :rtype: djesrf.plans.SearchPlan
+        """
+        # look in the class' own namespace so subclasses don't pick up their parent's plan
+        plan = cls.__dict__.get("_search_plan")
+        if plan is None:
+            plan = SearchPlan(cls)
+            cls._search_plan = plan
+        return plan
+
     @staticmethod
     def _handle_status_filter(status):
         """builds a filter around the `published` field based on a given status
@@ -24,15 +195,26 @@ class Searchable(Indexable):
         """
         # build empty filter; set epoch
         f = MatchAll()
-        now = timezone.now()
+        rounding = settings.DJESRF_STATUS_ROUNDING
+
+        # round `now` with date math so the filter is the same for every request in the window and can be cached --
+        # anything published within the current window counts as scheduled until the window is over
+        if rounding:
+            now = "now/{}".format(rounding)
+            published, scheduled = {"lt": now}, {"gte": now}
+            options = {"_cache": True}
+        else:
+            now = timezone.now()
+            published, scheduled = {"lte": now}, {"gte": now}
+            options = {}
 
         # match published
         if status.lower() == "published":
-            f &= Range(published={"lte": now})
+            f &= Range(published=published, **options)
 
         # match scheduled
         elif status.lower() == "scheduled":
-            f &= Range(published={"gte": now})
+            f &= Range(published=scheduled, **options)
 
         # match draft
         elif status.lower() == "draft":
@@ -51,28 +233,85 @@ class Searchable(Indexable):
         :return: a compounded filter
         :rtype: elasticsearch_dsl.filter.F
         """
-        # build empty filter; iterate filters dict
+        # build empty filter; compound the filter of every key
         f = MatchAll()
-        for key, value in filters.items():
+        for _, key_filter in cls._build_filter_clauses(filters):
+            f &= key_filter
+
+        # done
+        return f
+
+    @classmethod
+    def _build_filter_clauses(cls, filters):
+        """builds the filter of every passed key-value separately
+
+        :param filters: key-value pairs of field name keys and filter term values
+        :type filters: dict
+
+        :return: a list of field path (`None` for meta filters) and filter tuples
+        :rtype: list
+        """
+        # init container; iterate filters dict
+        plan = cls.get_search_plan()
+        clauses = []
+        # sorted, so the same filters always compile to the same search whatever order they came in
+        for key in sorted(filters):
+            values = _get_filter_values(filters, key)
 
             # handle status meta filtering
             if key.lower() == "status":
-                status_filter = cls._handle_status_filter(value)
-                f &= status_filter
-
-            # handle nested filtering -- convert dunders to dots
-            elif "__" in key or "." in key:
-                nested_key = key.lower().replace("__", ".")
-                path = nested_key.split(".")[0]
-                f &= Nested(path=path, filter=Term(**{nested_key: value}))
+                clauses.append((None, cls._handle_status_filter(values[-1])))
 
-            # regular term filter
+            # field filter, nested under the field's nested paths
             else:
-                key = key.lower()
-                f &= Term(**{key: value})
+                field, lookup = plan.parse_filter_key(key)
+                clauses.append((field, cls._build_lookup_filter(plan, field, lookup, values)))
 
         # done
-        return f
+        return clauses
+
+    @staticmethod
+    def _build_lookup_filter(plan, field, lookup, values):
+        """builds the filter for a field lookup
+
+        :param plan: the model's search plan
+        :type plan: djesrf.plans.SearchPlan
+
+        :param field: the field path
+        :type field: str
+
+        :param lookup: gt|gte|lt|lte|in|exists, or `None` for exact matches
+        :type lookup: str
+
+        :param values: the values given for the filter key
+        :type values: list
+
+        :return: the filter, wrapped in nested filters when needed
+        :rtype: elasticsearch_dsl.filter.F
+        """
+        # ranges take the last value given
+        if lookup in ("gt", "gte", "lt", "lte"):
+            return plan.nest(field, Range(**{field: {lookup: values[-1]}}))
+
+        # a missing nested field means no nested document has it, so negate the nested exists filter
+        if lookup == "exists":
+            f = plan.nest(field, Exists(field=field))
+            return f if is_truthy(values[-1]) else ~f
+
+        # `__in` takes comma separated values
+        if lookup == "in":
+            split = []
+            for value in values:
+                if isinstance(value, six.string_types):
+                    split.extend(item.strip() for item in value.split(",") if item.strip())
+                else:
+                    split.append(value)
+            values = split
+
+        # repeated keys match any of their values
+        if lookup is None and len(values) == 1:
+            return plan.nest(field, Term(**{field: values[0]}))
+        return plan.nest(field, Terms(**{field: values}))
 
     @classmethod
     def _build_ordering(cls, ordering):
@@ -87,15 +326,71 @@ class Searchable(Indexable):
         if isinstance(ordering, str):
             ordering = [ordering, ]
 
-        formatted = []
-        for key in ordering:
-            nested_key = key.lower().replace("__", ".")
-            formatted.append(nested_key)
+        plan = cls.get_search_plan()
+        return [plan.get_sort_field(key) for key in ordering]
 
-        return formatted
+    @classmethod
+    def _get_source_fields(cls):
+        """gets the paths of every field stored in a document's `_source`
+
+        :return: dotted field paths, including the inner fields of object and nested fields
+        :rtype: set
+        """
+        return cls.get_search_plan().source_fields
 
     @classmethod
-    def search(cls, query=None, filters=None, ordering=None):
+    def _build_source_fields(cls, fields):
+        """validates fields against the mapping and converts dunders to dots
+
+        :param fields: field names to limit each document's `_source` to
+        :type fields: list
+
+        :return: a proper list of field paths
+        :rtype: list
+        """
+        if isinstance(fields, str):
+            fields = [fields, ]
+
+        return cls.get_search_plan().get_source_fields(fields)
+
+    @staticmethod
+    def _apply_read_options(qs, using=None, timeout=None, preference=None, routing=None):
+        """points a search at a connection and sets how it's read
+
+        :param qs: elasticsearch search results mapped to django model proxies
+        :type qs: djes.search.LazySearch
+
+        :param using: the alias of the elasticsearch connection to search with
+        :type using: str
+
+        :param timeout: how long to wait for elasticsearch to answer, in seconds
+        :type timeout: float
+
+        :param preference: the shard copies to search -- a custom string sticks the search to the same copies
+        :type preference: str
+
+        :param routing: the routing value(s) of the documents to search, limiting the search to their shards
+        :type routing: str
+
+        :return: the updated search
+        :rtype: djes.search.LazySearch
+        """
+        if using is not None:
+            qs = qs.using(using)
+        if timeout is not None:
+            qs = qs.params(request_timeout=timeout)
+        if preference is not None:
+            qs = qs.params(preference=preference)
+        if routing is not None:
+            qs = qs.params(routing=routing)
+
+        # searches of a profiled request get elasticsearch's breakdown of where their time went, when it has one
+        if get_active_profiler() is not None and supports_profile_api(qs._using):
+            qs = qs.extra(profile=True)
+        return qs
+
+    @classmethod
+    def search(cls, query=None, filters=None, ordering=None, fields=None, **options):
         """performs a query using the model's `.search_objects` manager
 
         :param query: terms used to perform query
@@ -107,11 +402,17 @@ class Searchable(Indexable):
         :param ordering: field names used to order the results
         :type ordering: list
 
+        :param fields: field names to limit each document's `_source` to
+        :type fields: list
+
+        :param options: read options -- `using`, `timeout`, `preference` and `routing` (see `_apply_read_options`)
+        :type options: dict
+
         :return: elasticsearch search results mapped to django model proxies
         :rtype: django.db.models.QuerySet
         """
         # build initial query set
-        qs = cls.search_objects.search()
+        qs = cls._apply_read_options(cls.search_objects.search(), **options)
 
         # add query if exists
         if query:
@@ -127,9 +428,305 @@ class Searchable(Indexable):
             ordering = cls._build_ordering(ordering)
             qs = qs.sort(*ordering)
 
+        # only fetch the requested fields if limited
+        if fields:
+            fields = cls._build_source_fields(fields)
+            qs = qs.extra(_source={"include": fields})
+
+        # let the shards cache the results of the search
+        if settings.DJESRF_QUERY_CACHE:
+            qs = qs.params(query_cache="true")
+
         # done
         return qs
 
+    @classmethod
+    def search_database(cls, queryset, filters=None, ordering=None):
+        """runs the filters and ordering of a search against the database instead, for when elasticsearch can't be
+        reached -- full text queries and filters on analyzed fields have no database equivalent and raise
+        `UntranslatableSearch`
+
+        :param queryset: the queryset to filter
+        :type queryset: django.db.models.QuerySet
+
+        :param filters: key-value pairs used to build filters to limit search results
+        :type filters: dict
+
+        :param ordering: field names used to order the results
+        :type ordering: list
+
+        :return: the filtered and ordered queryset
+        :rtype: django.db.models.QuerySet
+        """
+        plan = cls.get_search_plan()
+
+        for key in filters or {}:
+            values = _get_filter_values(filters, key)
+            if key.lower() == "status":
+                if "published" not in plan.fields:
+                    raise UntranslatableSearch("Can't filter {} on status in the database".format(cls.__name__))
+                queryset = queryset.filter(cls._build_database_status_filter(values[-1]))
+                continue
+
+            field, lookup = plan.parse_filter_key(key)
+            path = plan.get_database_path(field)
+            if path is None:
+                raise UntranslatableSearch("Can't filter {} on {} in the database".format(cls.__name__, key))
+            queryset = queryset.filter(cls._build_database_lookup_filter(path, lookup, values))
+
+        if ordering:
+            if isinstance(ordering, str):
+                ordering = [ordering, ]
+            order_by = []
+            for key in ordering:
+                sort_field = plan.get_sort_field(key)
+                path = plan.get_database_path(sort_field.lstrip("-"), exact=False)
+                if path is None:
+                    raise UntranslatableSearch("Can't order {} by {} in the database".format(cls.__name__, key))
+                order_by.append("-{}".format(path) if sort_field.startswith("-") else path)
+            queryset = queryset.order_by(*order_by)
+
+        # done
+        return queryset
+
+    @staticmethod
+    def _build_database_status_filter(status):
+        """builds the database equivalent of `_handle_status_filter`
+
+        :param status: published|scheduled|draft indicator
+        :type status: str
+
+        :return: a filter around `published`
+        :rtype: django.db.models.Q
+        """
+        # round `now` down like the date math of `DJESRF_STATUS_ROUNDING`, so both agree on what's published
+        rounding = settings.DJESRF_STATUS_ROUNDING
+        if rounding in ROUNDED_FIELDS:
+            now = timezone.now().replace(**dict((field, 0) for field in ROUNDED_FIELDS[rounding]))
+            published = Q(published__lt=now)
+        else:
+            now = timezone.now()
+            published = Q(published__lte=now)
+
+        if status.lower() == "published":
+            return published
+        if status.lower() == "scheduled":
+            return Q(published__gte=now)
+        if status.lower() == "draft":
+            return Q(published__isnull=True)
+        return Q()
+
+    @staticmethod
+    def _build_database_lookup_filter(path, lookup, values):
+        """builds the database equivalent of `_build_lookup_filter`
+
+        :param path: the ORM lookup path of the field
+        :type path: str
+
+        :param lookup: gt|gte|lt|lte|in|exists, or `None` for exact matches
+        :type lookup: str
+
+        :param values: the values given for the filter key
+        :type values: list
+
+        :return: the filter
+        :rtype: django.db.models.Q
+        """
+        if lookup in ("gt", "gte", "lt", "lte"):
+            return Q(**{"{}__{}".format(path, lookup): values[-1]})
+
+        if lookup == "exists":
+            return Q(**{"{}__isnull".format(path): not is_truthy(values[-1])})
+
+        if lookup == "in":
+            split = []
+            for value in values:
+                if isinstance(value, six.string_types):
+                    split.extend(item.strip() for item in value.split(",") if item.strip())
+                else:
+                    split.append(value)
+            values = split
+
+        if lookup is None and len(values) == 1:
+            return Q(**{path: values[0]})
+        return Q(**{"{}__in".format(path): values})
+
+    @classmethod
+    def suggest(cls, query, filters=None, size=10, hedge_after=None, **options):
+        """looks up typeahead suggestions for a partial query on the `suggest_field` of the model
+
+        The query is analyzed with the standard analyzer, so each of its words has to match the start of a word in the
+        field (which is indexed with an edge n-gram analyzer). Only the label is fetched from the `_source` and no
+        models are built.
+
+        :param query: the partial query typed so far
+        :type query: str
+
+        :param filters: key-value pairs used to build filters to limit suggestions
+        :type filters: dict
+
+        :param size: the most suggestions to return
+        :type size: int
+
+        :param hedge_after: send the search again if it hasn't answered after this many seconds (see `send_search`)
+        :type hedge_after: float
+
+        :param options: read options -- `using`, `timeout`, `preference` and `routing` (see `_apply_read_options`)
+        :type options: dict
+
+        :return: dictionaries of the id and label of each suggestion, best match first
+        :rtype: list
+        """
+        if not query or not query.strip():
+            return []
+
+        plan = cls.get_search_plan()
+        if cls.suggest_field not in plan.fields or cls.suggest_label_field not in plan.source_fields:
+            raise Exception("Misconfigured suggestions for {}: {}, {}".format(
+                cls.__name__, cls.suggest_field, cls.suggest_label_field))
+
+        qs = cls._apply_read_options(cls.search_objects.search(), **options)
+        qs = qs.query("match", **{cls.suggest_field: {"query": query, "operator": "and", "analyzer": "standard"}})
+        if filters:
+            qs = qs.filter(cls._build_filters(filters))
+        qs = qs.extra(size=size, _source={"include": [cls.suggest_label_field]})
+
+        suggestions = []
+        for hit in cls.execute_search(qs, hedge_after=hedge_after).to_dict()["hits"]["hits"]:
+            # follow dotted labels down into objects
+            label = hit.get("_source", {})
+            for part in cls.suggest_label_field.split("."):
+                label = label.get(part) if isinstance(label, dict) else None
+            _id = hit["_id"]
+            suggestions.append({"id": int(_id) if _id.isdigit() else _id, "label": label})
+
+        # done
+        return suggestions
+
+    @classmethod
+    def execute_search(cls, qs, hedge_after=None):
+        """executes a search, serving it from the result cache when one is configured
+
+        :param qs: elasticsearch search results mapped to django model proxies
+        :type qs: djes.search.LazySearch
+
+        :param hedge_after: send the search again if it hasn't answered after this many seconds (see `send_search`)
+        :type hedge_after: float
+
+        :return: the elasticsearch response
+        :rtype: elasticsearch_dsl.result.Response
+        """
+        # profiled searches have to actually run
+        cache = get_result_cache() if get_active_profiler() is None else None
+        if cache is None or not cache.is_cacheable(qs):
+            return cls.send_search(qs, hedge_after)
+
+        key = cache.make_key(cls, qs)
+        with stage("cache"):
+            response = cache.get(key, qs)
+        if response is None:
+            response = cls.send_search(qs, hedge_after)
+            cache.set(key, response)
+
+        # done
+        return response
+
+    @classmethod
+    def send_search(cls, qs, hedge_after=None):
+        """sends a search to elasticsearch through the circuit breaker of its connection, timing the round trip when
+        the request is being timed
+
+        With `DJESRF_SINGLE_FLIGHT` on, a search identical to one already in flight in the process isn't sent again:
+        it waits for that one and shares its response.
+
+        :param qs: elasticsearch search results mapped to django model proxies
+        :type qs: djes.search.LazySearch
+
+        :param hedge_after: send the search again if it hasn't answered after this many seconds and take whichever
+                            answers first, trading a little extra load for shorter tail latencies
+        :type hedge_after: float
+
+        :return: the elasticsearch response
+        :rtype: elasticsearch_dsl.result.Response
+        """
+        def send():
+            return hedged_execute(qs, hedge_after) if hedge_after else qs.execute()
+
+        # searches of a connection whose breaker is open fail fast with `CircuitOpen`
+        breaker = get_breaker(qs._using if isinstance(qs._using, six.string_types) else "default")
+
+        def send_through_breaker():
+            return breaker.call(send) if breaker else send()
+
+        timer = get_active_timer()
+        profiler = get_active_profiler()
+        flight = get_single_flight() if profiler is None else None
+
+        def execute():
+            return flight.execute(qs, send_through_breaker) if flight else send_through_breaker()
+
+        if timer is None and profiler is None:
+            return execute()
+
+        start = default_timer()
+        response = execute()
+        duration = default_timer() - start
+        raw = response.to_dict()
+        if timer is not None:
+            timer.record_search(duration, raw.get("took"))
+        if profiler is not None:
+            profiler.record(qs, raw, duration)
+        return response
+
+    @classmethod
+    def scroll_search(cls, qs, size=None, scroll=None):
+        """walks through every hit of a search with the scroll api, a batch at a time
+
+        Searches without a sort use the `scan` search type, which skips scoring and sorting altogether. The scroll is
+        cleared once the hits run out or the iterator is closed early.
+
+        :param qs: elasticsearch search results mapped to django model proxies
+        :type qs: djes.search.LazySearch
+
+        :param size: the number of hits in each batch (per shard for unsorted searches)
+        :type size: int
+
+        :param scroll: how long elasticsearch keeps the scroll open between batches, as a time value ("1m")
+        :type scroll: str
+
+        :return: an iterator of lists of raw hits
+        :rtype: generator
+        """
+        es = connections.get_connection(qs._using)
+        scroll = scroll or settings.DJESRF_EXPORT_SCROLL
+        body = qs.to_dict()
+        body["size"] = size or settings.DJESRF_EXPORT_BATCH_SIZE
+
+        params = dict(qs._params, scroll=scroll)
+        if "sort" not in body:
+            params["search_type"] = "scan"
+
+        # the first request fails fast with `CircuitOpen` while the breaker of the connection is open, before anything
+        # is streamed
+        breaker = get_breaker(qs._using if isinstance(qs._using, six.string_types) else "default")
+        search = partial(es.search, index=qs._index, doc_type=qs._doc_type, body=body, **params)
+        response = breaker.call(search) if breaker else search()
+        scroll_id = response.get("_scroll_id")
+        try:
+            # scans only open the scroll, the hits come with the following requests
+            if params.get("search_type") != "scan" and response["hits"]["hits"]:
+                yield response["hits"]["hits"]
+
+            while scroll_id:
+                response = es.scroll(scroll_id=scroll_id, scroll=scroll)
+                scroll_id = response.get("_scroll_id")
+                if not response["hits"]["hits"]:
+                    break
+                yield response["hits"]["hits"]
+        finally:
+            if scroll_id:
+                es.clear_scroll(scroll_id=scroll_id, ignore=(404, ))
+
 
 class Aggregateable(Searchable):
     """extends the Searchable model type by adding a `.get_aggregates` class method to the model
@@ -147,73 +744,170 @@ class Aggregateable(Searchable):
         # }
         pass
 
+    # filter combinations whose aggregates are precomputed by the facet cache when `DJESRF_FACET_CACHE` is set
+    facet_combinations = (
+        {},
+        {"status": "published"},
+    )
+
     @classmethod
     def _get_aggregate_declarations(cls):
         """parsed an internal Aggregates subclass to help build aggregate declarations
 
-        :return: a list of bucket names and mapping dictionaries tuples
+        :return: the compiled declarations
         :rtype: list
         """
         # check for an Aggregates subclass
         if not hasattr(cls, "Aggregates"):
             raise Exception("You must explicitly set an `Aggregates` subclass")
 
-        # get fields
-        agg_mapping_fields = [field for field in dir(cls.Aggregates) if not field.startswith("_")]
-
-        # init container; iterate field names; append to container
-        agg_mappings = []
-        for field in agg_mapping_fields:
-            declarations = getattr(cls.Aggregates, field)
-            agg_mappings.append((field, declarations))
-
-        # done
-        return agg_mappings
+        # the declarations are parsed once, when the plan is compiled
+        return cls.get_search_plan().aggregates
 
     @classmethod
-    def _build_aggregates(cls, qs):
+    def _build_aggregates(cls, qs, filters=None):
         """builds aggregates onto a queryset
 
-        :param qs: elasticsearch search results mapped to django model proxies
+        When filters are given they're applied to the hits as a post filter instead, and every aggregate is wrapped in
+        a filter aggregation of all the other filters -- the counts of a facet ignore the facet's own filter, so the
+        other options of a multi-select facet come back from the same request.
+
+        :param qs: elasticsearch search results mapped to django model proxies (without `filters` applied)
         :type qs: django.db.models.QuerySet
 
+        :param filters: key-value pairs used to build filters to limit search results
+        :type filters: dict
+
         :return: the updated query, a list of bucket names, and a list of paths
         :rtype: tuple
         """
         # get declarations; init containers
-        agg_mappings = cls._get_aggregate_declarations()
+        declarations = cls._get_aggregate_declarations()
         names = []
         fields = []
 
-        # iterate declarations
-        for name, mapping in agg_mappings:
-            try:
-                # parse mapping
-                path = mapping["path"]
-                field = mapping["field"]
-
-                # bolt on aggregate to query
-                qs.aggs.bucket(
-                    name,
-                    aggs.Nested(
-                        path=path,
-                        aggs={path: aggs.Terms(field=field)}
-                    )
-                )
-
-                # append values to parse later
-                names.append(name)
-                fields.append(field)
-
-            # they messed up the subclass
-            except KeyError:
-                raise Exception("Misconfigured aggregate declaration: {}, {}".format(name, mapping))
+        # filter the hits after the aggregates are computed
+        clauses = cls._build_filter_clauses(filters) if filters else []
+        if clauses:
+            post_filter = MatchAll()
+            for _, clause in clauses:
+                post_filter &= clause
+            qs = qs.post_filter(post_filter)
+
+        # iterate declarations; bolt on aggregate to query
+        for declaration in declarations:
+            agg = declaration.build()
+            if clauses:
+                others = MatchAll()
+                for field, clause in clauses:
+                    if field != declaration.field.lower():
+                        others &= clause
+                agg = aggs.Filter(filter=others, aggs={declaration.name: agg})
+            qs.aggs.bucket(declaration.name, agg)
+
+            # append values to parse later
+            names.append(declaration.name)
+            fields.append(declaration.field)
 
         # done
         return qs, names, fields
 
     @classmethod
-    def get_aggregates(cls, query=None, filters=None):
+    def _parse_aggregates(cls, raw_aggregates, buckets, fields, filters=None):
+        """parses the raw aggregations of an executed search into value/count dictionaries
+
+        :param raw_aggregates: the `aggregations` block of an elasticsearch response
+        :type raw_aggregates: elasticsearch_dsl.utils.AttrDict
+
+        :param buckets: bucket names returned by `_build_aggregates`
+        :type buckets: list
+
+        :param fields: field paths returned by `_build_aggregates`
+        :type fields: list
+
+        :param filters: the filters passed to `_build_aggregates`
+        :type filters: dict
+
+        :return: a dictionary of field keys and value/count mapped dictionary (or metric) values
+        :rtype: dict
+        """
+        declarations = dict((declaration.name, declaration) for declaration in cls.get_search_plan().aggregates)
+        if hasattr(raw_aggregates, "to_dict"):
+            raw_aggregates = raw_aggregates.to_dict()
+
+        aggregates = {}
+        for bucket in buckets:
+            declaration = declarations[bucket]
+
+            # unwrap the filter aggregation of the other filters
+            raw = raw_aggregates[bucket] if filters else raw_aggregates
+            aggregates[declaration.key] = declaration.parse(raw)
+
+        # done
+        return aggregates
+
+    @classmethod
+    def get_aggregates(cls, query=None, filters=None, hedge_after=None, **options):
+        """gets the aggregates of a search, serving the model's `facet_combinations` from the facet cache when one is
+        configured
+
+        :param query: terms used to perform query
+        :type query: str
+
+        :param filters: key-value pairs used to build filters to limit search results
+        :type filters: dict
+
+        :param hedge_after: send the search again if it hasn't answered after this many seconds (see `send_search`)
+        :type hedge_after: float
+
+        :param options: read options -- `using`, `timeout`, `preference` and `routing` (see `_apply_read_options`)
+        :type options: dict
+
+        :return: a dictionary of field keys and value/count mapped dictionary values
+        :rtype: dict
+        """
+        facet_cache = cls._get_facet_cache(query, filters, options)
+        if facet_cache is not None:
+            return facet_cache.get(cls, filters)
+
+        return cls.compute_aggregates(query, filters, hedge_after, **options)
+
+    @classmethod
+    def _get_facet_cache(cls, query, filters, options):
+        """gets the facet cache the aggregates of a search are served from
+
+        :return: the facet cache, or `None` if the aggregates are computed
+        :rtype: djesrf.facets.FacetCache
+        """
+        # searches of other connections or routings have aggregates of their own
+        facet_cache = get_facet_cache() if get_active_profiler() is None else None
+        if facet_cache is None or options.get("using") or options.get("routing"):
+            return None
+        if not facet_cache.is_cacheable(cls, query, filters):
+            return None
+        return facet_cache
+
+    @classmethod
+    def has_current_aggregates(cls, query=None, filters=None, **options):
+        """checks whether `get_aggregates` answers as of the model's current index generation -- it doesn't while the
+        facet cache serves a stale entry of the search
+
+        :param query: terms used to perform query
+        :type query: str
+
+        :param filters: key-value pairs used to build filters to limit search results
+        :type filters: dict
+
+        :param options: read options -- `using`, `timeout`, `preference` and `routing` (see `_apply_read_options`)
+        :type options: dict
+
+        :rtype: bool
+        """
+        facet_cache = cls._get_facet_cache(query, filters, options)
+        return facet_cache is None or facet_cache.is_current(cls, filters)
+
+    @classmethod
+    def compute_aggregates(cls, query=None, filters=None, hedge_after=None, **options):
         """performs an aggregation query using the model's `.search` class method
 
         :param query: terms used to perform query
@@ -222,28 +916,25 @@ class Aggregateable(Searchable):
         :param filters: key-value pairs used to build filters to limit search results
         :type filters: dict
 
+        :param hedge_after: send the search again if it hasn't answered after this many seconds (see `send_search`)
+        :type hedge_after: float
+
+        :param options: read options -- `using`, `timeout`, `preference` and `routing` (see `_apply_read_options`)
+        :type options: dict
+
         :return: a dictionary of field keys and value/count mapped dictionary values
         :rtype: dict
         """
-        # get initial query set
-        qs = cls.search(query, filters)
+        with stage("compile"):
+            # get initial query set -- only the buckets are used, so don't fetch any hits
+            qs = cls.search(query, **options).extra(size=0)
 
-        # build aggregates
-        qs, buckets, fields = cls._build_aggregates(qs)
+            # build aggregates, filtering each one by every filter but its own
+            qs, buckets, fields = cls._build_aggregates(qs, filters)
 
         # execute
-        raw_aggregates = qs.execute().aggregations
+        raw_aggregates = cls.execute_search(qs, hedge_after).aggregations
 
         # parse
-        aggregates = {}
-        for index, field in enumerate(fields):
-            dunder_field = field.lower().replace(".", "__")
-            if filters:
-                if dunder_field in filters:
-                    continue
-            bucket = buckets[index]
-            parsed_aggregates = dict([(b["key"], b["doc_count"]) for b in raw_aggregates[bucket][bucket]["buckets"]])
-            aggregates[dunder_field] = parsed_aggregates
-
-        # done
-        return aggregates
+        with stage("aggregates"):
+            return cls._parse_aggregates(raw_aggregates, buckets, fields, filters)
@@ -0,0 +1,444 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import namedtuple
+import json
+from math import ceil
+
+from django.core.paginator import Page, Paginator as DjangoPaginator
+from django.utils.translation import ugettext_lazy as _
+from elasticsearch_dsl.filter import Bool, Exists, Range, Term
+from rest_framework.compat import OrderedDict
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from djesrf.conf import settings
+
+
+def _execute(queryset, view):
+    """executes a search through the view (or its model) so result caching and friends apply
+
+    :param queryset: elasticsearch search results mapped to django model proxies
+    :type queryset: djes.search.LazySearch
+
+    :param view: the view being paginated
+    :type view: rest_framework.views.APIView
+
+    :return: the elasticsearch response
+    :rtype: elasticsearch_dsl.result.Response
+    """
+    if hasattr(view, "execute_search"):
+        return view.execute_search(queryset)
+    model = getattr(view, "model", None)
+    if hasattr(model, "execute_search"):
+        return model.execute_search(queryset)
+    return queryset.execute()
+
+
+def _get_results(response, view):
+    """pulls the results out of a response, letting the view decide between model proxies and raw hits
+
+    :param response: the elasticsearch response
+    :type response: elasticsearch_dsl.result.Response
+
+    :param view: the view being paginated
+    :type view: rest_framework.views.APIView
+
+    :return: the results of the response
+    :rtype: list
+    """
+    if hasattr(view, "get_list_results"):
+        return view.get_list_results(response)
+    return list(response)
+
+
+class SearchablePagination(PageNumberPagination):
+    """page number pagination that runs a single sized search per page and takes the total from its `hits.total`
+
+    On very large indexes, where counting every match is expensive, set `terminate_after` (or
+    `DJESRF_TERMINATE_AFTER`) to stop each shard after that many matching documents. The totals of searches that stop
+    early are lower bounds, which the response flags with `count_exact`.
+    """
+
+    terminate_after = None
+    supports_fallback = True
+
+    def __init__(self):
+        self.response = None
+        self.terminated_early = False
+
+    def get_terminate_after(self):
+        """gets the most documents each shard collects before the search stops early
+
+        :return: the limit, or `None` to count every match
+        :rtype: int
+        """
+        return self.terminate_after or settings.DJESRF_TERMINATE_AFTER
+
+    def get_page_number(self, request, queryset, page_size, view=None):
+        """validates the requested page number, looking up the number of the last page if it's asked for
+
+        :return: the page number
+        :rtype: int
+        """
+        page_number = request.query_params.get(self.page_query_param, 1)
+
+        # the last page can't be known without the total, so it takes a request of its own
+        if page_number in self.last_page_strings:
+            total = _execute(queryset.extra(size=0), view).to_dict()["hits"]["total"]
+            return max(int(ceil(total / float(page_size))), 1)
+
+        try:
+            number = int(page_number)
+        except (TypeError, ValueError):
+            message = _("That page number is not an integer")
+        else:
+            if number >= 1:
+                return number
+            message = _("That page number is less than 1")
+        raise NotFound(self.invalid_page_message.format(page_number=page_number, message=message))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """slices the search to the requested page and executes it
+
+        :param queryset: elasticsearch search results mapped to django model proxies
+        :type queryset: djes.search.LazySearch
+
+        :param request: the incoming request
+        :type request: rest_framework.request.Request
+
+        :param view: the view being paginated
+        :type view: rest_framework.views.APIView
+
+        :return: the results for the requested page
+        :rtype: list
+        """
+        self._handle_backwards_compat(view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        terminate_after = self.get_terminate_after()
+        if terminate_after:
+            queryset = queryset.extra(terminate_after=terminate_after)
+
+        # execute the sliced search ourselves so the raw response (total, aggregations, etc) stays reachable
+        number = self.get_page_number(request, queryset, page_size, view)
+        bottom = (number - 1) * page_size
+        self.response = _execute(queryset[bottom:bottom + page_size], view)
+
+        # read the raw response, as hydrating the hits would alter it before the view gets to them
+        raw = self.response.to_dict()
+        self.terminated_early = bool(terminate_after) and bool(raw.get("terminated_early"))
+
+        # the paginator only does the page math, with the total of the response
+        paginator = DjangoPaginator(queryset, page_size)
+        paginator._count = raw["hits"]["total"]
+        if number > paginator.num_pages:
+            message = _("That page contains no results")
+            raise NotFound(self.invalid_page_message.format(page_number=number, message=message))
+        self.page = Page(_get_results(self.response, view), number, paginator)
+
+        if paginator.count > 1 and self.template is not None:
+            self.display_page_controls = True
+
+        self.request = request
+        return self.page.object_list
+
+    def paginate_fallback_queryset(self, queryset, request, view=None):
+        """pages a database queryset like drf's page number pagination, for lists falling back on the database while
+        elasticsearch is unavailable
+
+        :param queryset: the filtered and ordered queryset
+        :type queryset: django.db.models.QuerySet
+
+        :return: the results for the requested page
+        :rtype: list
+        """
+        self.terminated_early = False
+        return super(SearchablePagination, self).paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super(SearchablePagination, self).get_paginated_response(data)
+        if self.get_terminate_after():
+            response.data["count_exact"] = not self.terminated_early
+        return response
+
+
+def _decode_search_cursor(encoded):
+    """decodes an opaque cursor into its position and direction
+
+    :param encoded: the cursor param from the request
+    :type encoded: str
+
+    :return: the cursor, or `None` if it could not be decoded
+    :rtype: SearchCursor
+    """
+    try:
+        decoded = json.loads(urlsafe_b64decode(encoded.encode("ascii")).decode("utf8"))
+        position = decoded["p"]
+        reverse = bool(decoded.get("r", False))
+    except (TypeError, ValueError, KeyError):
+        return None
+
+    if not isinstance(position, list):
+        return None
+
+    return SearchCursor(position=position, reverse=reverse)
+
+
+def _encode_search_cursor(cursor):
+    """encodes a cursor into an opaque, url safe string
+
+    :param cursor: the cursor to encode
+    :type cursor: SearchCursor
+
+    :return: the encoded cursor
+    :rtype: str
+    """
+    tokens = {"p": cursor.position}
+    if cursor.reverse:
+        tokens["r"] = 1
+    return urlsafe_b64encode(json.dumps(tokens).encode("utf8")).decode("ascii")
+
+
+SearchCursor = namedtuple("SearchCursor", ["position", "reverse"])
+
+# the sort values elasticsearch gives hits missing a sort field -- `null` for strings, the extremes of a long for
+# integers and dates and infinity for floating point fields
+MISSING_SORT_VALUES = (None, 2 ** 63 - 1, -2 ** 63, float("inf"), float("-inf"))
+
+
+def _is_missing(value):
+    """checks whether a sort value stands in for a missing field
+
+    :rtype: bool
+    """
+    return any(value is missing or value == missing for missing in MISSING_SORT_VALUES)
+
+
+class SearchableCursorPagination(SearchablePagination):
+    """cursor pagination that seeks past the sort values of the last hit instead of using from+size
+
+    Every page is a plain `size` request filtered to the documents that sort after (or before) the cursor's
+    position, so deep pages cost the same as the first one. The ordering of the search is used as the sort keys
+    and `_uid` is always appended as a tiebreaker, so searches ordered by relevance fall back to `_uid` order.
+    Documents missing a sort field (drafts without a `published` date, say) sort after every other document.
+    """
+
+    cursor_query_param = "cursor"
+    invalid_cursor_message = _("Invalid cursor")
+    tiebreaker = "_uid"
+    template = "rest_framework/pagination/previous_and_next.html"
+    supports_fallback = False
+
+    def __init__(self):
+        super(SearchableCursorPagination, self).__init__()
+        self.plan = None
+
+    def get_sort_keys(self, queryset):
+        """normalizes the sort of a search into field/order pairs and appends the tiebreaker
+
+        :param queryset: elasticsearch search results mapped to django model proxies
+        :type queryset: djes.search.LazySearch
+
+        :return: a list of field name and order tuples
+        :rtype: list
+        """
+        keys = []
+        for key in queryset.to_dict().get("sort", []):
+            if isinstance(key, dict):
+                field, options = list(key.items())[0]
+                order = options.get("order", "asc") if isinstance(options, dict) else options
+            else:
+                field, order = key, "asc"
+
+            # relevance can't be seeked past with a range filter
+            if field in ("_score", self.tiebreaker):
+                continue
+            keys.append((field, order))
+
+        keys.append((self.tiebreaker, "asc"))
+        return keys
+
+    def _nest(self, field, f):
+        """wraps a filter in nested filters for the nested paths of the field in the view's search plan
+
+        :return: the wrapped filter
+        :rtype: elasticsearch_dsl.filter.F
+        """
+        if self.plan is None:
+            return f
+        return self.plan.nest(field, f)
+
+    def _range_filter(self, field, lookup, value):
+        """builds a range filter, wrapping it in nested filters for nested fields
+
+        :return: a range filter around `field`
+        :rtype: elasticsearch_dsl.filter.F
+        """
+        return self._nest(field, Range(**{field: {lookup: value}}))
+
+    def _term_filter(self, field, value):
+        """builds a term filter, wrapping it in nested filters for nested fields
+
+        :return: a term filter around `field`
+        :rtype: elasticsearch_dsl.filter.F
+        """
+        return self._nest(field, Term(**{field: value}))
+
+    def _missing_filter(self, field):
+        """builds a filter matching documents without a value for a field -- a nested field is missing when no nested
+        document has it
+
+        :return: a negated exists filter around `field`
+        :rtype: elasticsearch_dsl.filter.F
+        """
+        return ~self._nest(field, Exists(field=field))
+
+    def _equal_filter(self, field, value):
+        """builds a filter matching documents that sort the same as `value` on a field
+
+        :return: a term filter, or a missing filter for the missing sort value
+        :rtype: elasticsearch_dsl.filter.F
+        """
+        if _is_missing(value):
+            return self._missing_filter(field)
+        return self._term_filter(field, value)
+
+    def _after_filter(self, field, order, value, missing_first=False):
+        """builds a filter matching documents that sort after `value` on a field
+
+        :param missing_first: whether documents missing the field sort first (when walking backwards) or last
+        :type missing_first: bool
+
+        :return: the filter, or `None` if nothing can sort after the value
+        :rtype: elasticsearch_dsl.filter.F
+        """
+        if _is_missing(value):
+            # only a backwards walk has documents with the field after the missing ones
+            return self._nest(field, Exists(field=field)) if missing_first else None
+
+        after = self._range_filter(field, "lt" if order == "desc" else "gt", value)
+        if missing_first or field == self.tiebreaker:
+            return after
+        return Bool(should=[after, self._missing_filter(field)])
+
+    def _build_seek_filter(self, keys, position, missing_first=False):
+        """builds a filter matching every document that sorts after `position`
+
+        :param keys: field name and order tuples
+        :type keys: list
+
+        :param position: sort values of the hit to seek past
+        :type position: list
+
+        :param missing_first: whether documents missing a sort field sort first (when walking backwards) or last
+        :type missing_first: bool
+
+        :return: a compounded filter
+        :rtype: elasticsearch_dsl.filter.F
+        """
+        clauses = []
+        for index, (field, order) in enumerate(keys):
+            after = self._after_filter(field, order, position[index], missing_first)
+            if after is None:
+                continue
+            must = [self._equal_filter(key[0], value) for key, value in zip(keys[:index], position[:index])]
+            must.append(after)
+            clauses.append(Bool(must=must))
+        return Bool(should=clauses)
+
+    def _sort_key(self, field, order, missing_first=False):
+        """builds the sort of a key, placing documents missing the field explicitly
+
+        :rtype: dict
+        """
+        if field == self.tiebreaker:
+            return {field: {"order": order}}
+        return {field: {"order": order, "missing": "_first" if missing_first else "_last"}}
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self._handle_backwards_compat(view)
+
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.request = request
+        self.plan = view.model.get_search_plan() if view is not None else None
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            self.cursor = None
+        else:
+            self.cursor = _decode_search_cursor(encoded)
+            if self.cursor is None:
+                raise NotFound(self.invalid_cursor_message)
+
+        # a reverse cursor walks the sort backwards -- documents missing a sort field included -- and flips the
+        # results afterwards
+        keys = self.get_sort_keys(queryset)
+        reverse = self.cursor is not None and self.cursor.reverse
+        if reverse:
+            keys = [(field, "asc" if order == "desc" else "desc") for field, order in keys]
+
+        qs = queryset.sort(*[self._sort_key(field, order, reverse) for field, order in keys])
+        if self.cursor is not None:
+            if len(self.cursor.position) != len(keys):
+                raise NotFound(self.invalid_cursor_message)
+            # seek with the post filter, so aggregates bolted onto the search still count every match
+            qs = qs.post_filter(self._build_seek_filter(keys, self.cursor.position, reverse))
+
+        # fetch an extra hit to know whether or not there's another page
+        self.response = _execute(qs[0:self.page_size + 1], view)
+        raw_hits = self.response.to_dict()["hits"]["hits"]
+        results = _get_results(self.response, view)
+
+        has_following = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        positions = [hit["sort"] for hit in raw_hits[:self.page_size]]
+
+        if self.cursor is not None and self.cursor.reverse:
+            self.page.reverse()
+            positions.reverse()
+            self.has_next = True
+            self.has_previous = has_following
+        else:
+            self.has_next = has_following
+            self.has_previous = self.cursor is not None
+
+        self.first_position = positions[0] if positions else None
+        self.last_position = positions[-1] if positions else None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("previous", self.get_previous_link()),
+            ("results", data),
+        ]))
+
+    def get_next_link(self):
+        if not self.has_next or self.last_position is None:
+            return None
+        encoded = _encode_search_cursor(SearchCursor(position=self.last_position, reverse=False))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first_position is None:
+            return None
+        encoded = _encode_search_cursor(SearchCursor(position=self.first_position, reverse=True))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_html_context(self):
+        return {
+            "previous_url": self.get_previous_link(),
+            "next_url": self.get_next_link(),
+        }
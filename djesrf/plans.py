@@ -0,0 +1,336 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import six
+from elasticsearch_dsl import aggs
+from elasticsearch_dsl.exceptions import UnknownDslObject
+from elasticsearch_dsl.filter import Nested
+from rest_framework.compat import OrderedDict
+
+from djesrf.exceptions import InvalidSearch
+
+
+# filter key suffixes that pick the kind of filter built for the field
+LOOKUPS = ("gt", "gte", "lt", "lte", "in", "exists")
+
+
+def is_truthy(value):
+    """checks a query param value for a truthy flag
+
+    :param value: the raw query param value
+    :type value: str
+
+    :return: whether or not the flag is set
+    :rtype: bool
+    """
+    return six.text_type(value).lower() in ("1", "true", "yes", "on")
+
+
+# single value metric aggregations -- anything else has to be a bucket aggregation
+METRIC_AGGREGATES = ("avg", "cardinality", "max", "min", "sum", "value_count")
+
+
+def normalize_key(key):
+    """converts a filter, ordering or field key into a dotted field path
+
+    :param key: the key as sent by the client, with dunders or dots
+    :type key: str
+
+    :return: the field path
+    :rtype: str
+    """
+    return key.lower().replace("__", ".")
+
+
+class AggregateDeclaration(object):
+    """a compiled entry of a model's `Aggregates` class
+
+    Declarations are dictionaries with a `field`, an optional aggregation `type` (`terms` by default), optional `aggs`
+    of named sub-declarations, and any other options of the aggregation (`size`, `interval`, `ranges`...), which are
+    passed on to elasticsearch as they are. Fields inside nested objects are wrapped in nested aggregations (and
+    sub-aggregations on fields outside of their parent's nested object in reverse nested ones) automatically.
+    """
+
+    # keys of a declaration that aren't options of the aggregation
+    reserved = ("type", "path", "field", "aggs")
+
+    def __init__(self, plan, name, declaration):
+        try:
+            self.field = declaration["field"]
+            self.type = declaration.get("type", "terms")
+            children = sorted(declaration.get("aggs", {}).items())
+        except (AttributeError, KeyError, TypeError):
+            raise Exception("Misconfigured aggregate declaration: {}, {}".format(name, declaration))
+
+        try:
+            self.is_bucket = issubclass(aggs.Agg.get_dsl_class(self.type), aggs.Bucket)
+        except UnknownDslObject:
+            self.is_bucket = False
+        if not self.is_bucket and (self.type not in METRIC_AGGREGATES or children):
+            raise Exception("Misconfigured aggregate declaration: {}, {}".format(name, declaration))
+
+        self.name = name
+        self.declaration = declaration
+        self.key = self.field.lower().replace(".", "__")
+        self.options = dict((key, value) for key, value in declaration.items() if key not in self.reserved)
+
+        # the mapping knows which nested objects the field is in; fall back on the declared path for anything else
+        if self.field in plan.fields:
+            self.nested = plan.fields[self.field]
+        elif declaration.get("path"):
+            self.nested = (declaration["path"], )
+        else:
+            self.nested = ()
+
+        self.children = [AggregateDeclaration(plan, child_name, child) for child_name, child in children]
+
+    def _wrappers(self, context):
+        """works out the aggregations needed to get from the parent's nested context to the field's
+
+        :param context: the nested paths of the parent aggregation
+        :type context: tuple
+
+        :return: aggregation type and parameter tuples, outermost first
+        :rtype: list
+        """
+        if self.nested[:len(context)] == context:
+            wrappers, inner = [], self.nested[len(context):]
+        else:
+            wrappers, inner = [("reverse_nested", {})], self.nested
+        return wrappers + [("nested", {"path": path}) for path in inner]
+
+    def build(self, context=()):
+        """builds the aggregation
+
+        :param context: the nested paths of the parent aggregation
+        :type context: tuple
+
+        :return: the aggregation, wrapped in nested aggregations when needed
+        :rtype: elasticsearch_dsl.aggs.Agg
+        """
+        params = dict(self.options, field=self.field)
+        if self.children:
+            params["aggs"] = dict((child.name, child.build(self.nested)) for child in self.children)
+        agg = aggs.A(self.type, **params)
+
+        for agg_type, wrapper_params in reversed(self._wrappers(context)):
+            agg = aggs.A(agg_type, aggs={self.name: agg}, **wrapper_params)
+        return agg
+
+    def parse(self, raw, context=()):
+        """parses the response of the aggregation
+
+        :param raw: the raw aggregations block holding the aggregation
+        :type raw: dict
+
+        :param context: the nested paths of the parent aggregation
+        :type context: tuple
+
+        :return: the metric's value, or bucket values mapped to their counts (or to their counts and sub-aggregates
+                 when there are sub-declarations)
+        :rtype: object
+        """
+        raw = raw[self.name]
+        for _ in self._wrappers(context):
+            raw = raw[self.name]
+
+        if not self.is_bucket:
+            return raw["value"]
+
+        results = OrderedDict()
+        for bucket in raw["buckets"]:
+            value = bucket.get("key_as_string", bucket.get("key"))
+            if not self.children:
+                results[value] = bucket["doc_count"]
+                continue
+
+            results[value] = OrderedDict([
+                ("count", bucket["doc_count"]),
+                ("aggregates", OrderedDict((child.key, child.parse(bucket, self.nested)) for child in self.children)),
+            ])
+        return results
+
+
+class SearchPlan(object):
+    """everything about a model's mapping and aggregate declarations needed to build its searches, worked out once
+
+    Requests only have to look their keys up in the plan and bind their values -- keys that don't match a field in
+    the mapping are rejected with `InvalidSearch` instead of being sent off as filters that can never match.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+        # field paths mapped to the nested paths they live under, outermost first
+        self.fields = {}
+
+        # paths of everything stored in a document's `_source`, objects included
+        self.source_fields = set()
+
+        # multi-field paths mapped to the path of the field they index
+        self.multi_fields = {}
+
+        # paths of analyzed string fields, whose terms are tokens rather than whole values
+        self.analyzed_fields = set()
+
+        # compiled `Aggregates` declarations
+        self.aggregates = []
+
+        for doc_type in model.search_objects.mapping.to_dict().values():
+            self._walk(doc_type.get("properties", {}), "", ())
+
+        if hasattr(model, "Aggregates"):
+            self._compile_aggregates(model.Aggregates)
+
+    def _walk(self, properties, prefix, nested):
+        """collects the field paths of a level of the mapping
+
+        :param properties: the properties of the level
+        :type properties: dict
+
+        :param prefix: the dotted path of the level
+        :type prefix: str
+
+        :param nested: the nested paths the level lives under
+        :type nested: tuple
+        """
+        for name, definition in properties.items():
+            path = "{}{}".format(prefix, name)
+            self.source_fields.add(path)
+
+            if "properties" in definition:
+                inner = nested + (path, ) if definition.get("type") == "nested" else nested
+                self._walk(definition["properties"], "{}.".format(path), inner)
+                continue
+
+            self.fields[path] = nested
+            if self._is_analyzed(definition):
+                self.analyzed_fields.add(path)
+
+            # multi-fields are indexed alongside the field, but aren't in the `_source`
+            for sub_field, sub_definition in definition.get("fields", {}).items():
+                sub_path = "{}.{}".format(path, sub_field)
+                self.fields[sub_path] = nested
+                self.multi_fields[sub_path] = path
+                if self._is_analyzed(sub_definition):
+                    self.analyzed_fields.add(sub_path)
+
+    @staticmethod
+    def _is_analyzed(definition):
+        return definition.get("type", "string") == "string" and definition.get("index") != "not_analyzed"
+
+    def _compile_aggregates(self, declarations):
+        """validates and collects the declarations of an `Aggregates` class
+
+        :param declarations: the model's `Aggregates` class
+        :type declarations: type
+        """
+        keys = {}
+        for name in sorted(dir(declarations)):
+            if name.startswith("_"):
+                continue
+
+            declaration = AggregateDeclaration(self, name, getattr(declarations, name))
+
+            # aggregates are returned keyed on their field
+            if declaration.key in keys:
+                raise Exception("Aggregate declarations {} and {} both aggregate {}".format(
+                    keys[declaration.key], name, declaration.field))
+            keys[declaration.key] = name
+
+            self.aggregates.append(declaration)
+
+    def parse_filter_key(self, key):
+        """splits a filter key into the field it applies to and its lookup suffix
+
+        :param key: the filter key, with dunders or dots and an optional lookup suffix (`channel__name__raw__in`)
+        :type key: str
+
+        :return: the field path and the lookup, or `None` for exact matches
+        :rtype: tuple
+        """
+        path = normalize_key(key)
+        if path in self.fields:
+            return path, None
+
+        field, _, lookup = path.rpartition(".")
+        if lookup in LOOKUPS and field in self.fields:
+            return field, lookup
+
+        raise InvalidSearch("Unknown filter for {}: {}".format(self.model.__name__, key))
+
+    def nest(self, field, f):
+        """wraps a filter on a field in nested filters for every nested path the field lives under
+
+        :param field: the field path
+        :type field: str
+
+        :param f: the filter on the field
+        :type f: elasticsearch_dsl.filter.F
+
+        :return: the wrapped filter
+        :rtype: elasticsearch_dsl.filter.F
+        """
+        for path in reversed(self.fields.get(field, ())):
+            f = Nested(path=path, filter=f)
+        return f
+
+    def get_database_path(self, field, exact=True):
+        """looks up the ORM lookup path of a field, for running searches against the database instead
+
+        :param field: the field path
+        :type field: str
+
+        :param exact: whether the field has to hold whole values -- analyzed fields match tokens, which the database
+                      can't do
+        :type exact: bool
+
+        :return: the lookup path (`channel__name`), or `None` if the field can't be searched in the database
+        :rtype: str
+        """
+        if exact and field in self.analyzed_fields:
+            return None
+
+        model = self.model
+        parts = self.multi_fields.get(field, field).split(".")
+        for index, part in enumerate(parts):
+            try:
+                model_field = model._meta.get_field(part)
+            except FieldDoesNotExist:
+                return None
+
+            # follow relations down to the field
+            model = getattr(model_field, "related_model", None)
+            if model is None and index < len(parts) - 1:
+                return None
+        return "__".join(parts)
+
+    def get_sort_field(self, key):
+        """looks up the field an ordering key sorts on
+
+        :param key: the ordering key, with dunders or dots and an optional leading `-`
+        :type key: str
+
+        :return: the sort field, with its leading `-` kept
+        :rtype: str
+        """
+        path = normalize_key(key)
+        field = path.lstrip("-")
+
+        # elasticsearch's meta fields (`_score`, `_uid`...) can always be sorted on
+        if not field.startswith("_") and field not in self.fields:
+            raise InvalidSearch("Unknown ordering for {}: {}".format(self.model.__name__, key))
+        return path
+
+    def get_source_fields(self, fields):
+        """looks up the `_source` paths of requested fields
+
+        :param fields: field names, with dunders or dots
+        :type fields: list
+
+        :return: the field paths
+        :rtype: list
+        """
+        formatted = [normalize_key(field) for field in fields]
+        unknown = [field for field in formatted if field not in self.source_fields]
+        if unknown:
+            raise InvalidSearch("Unknown field(s) for {}: {}".format(self.model.__name__, ", ".join(unknown)))
+        return formatted
@@ -0,0 +1,204 @@
+import logging
+import re
+import threading
+
+from django.utils import six
+from elasticsearch.exceptions import TransportError
+from elasticsearch_dsl.connections import connections
+from rest_framework.compat import OrderedDict
+
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+# the first elasticsearch release with the profile api
+PROFILE_API_VERSION = (2, 2)
+
+# the most query and aggregation nodes listed for each shard, slowest first
+PROFILE_MAX_NODES = 10
+
+_profile_support = {}
+_profile_support_lock = threading.Lock()
+
+
+def get_active_profiler():
+    """gets the profiler recording the searches of the request being handled by the current thread
+
+    :return: the innermost active profiler, or `None` when nothing is being profiled
+    :rtype: djesrf.profiling.SearchProfiler
+    """
+    stack = getattr(_local, "stack", None)
+    if stack:
+        return stack[-1]
+    return None
+
+
+def supports_profile_api(using="default"):
+    """checks whether the cluster behind a connection has the profile api, asking it for its version the first time
+
+    :param using: the alias of the connection (or the client itself)
+    :type using: str
+
+    :rtype: bool
+    """
+    key = using if isinstance(using, six.string_types) else id(using)
+    supported = _profile_support.get(key)
+    if supported is None:
+        try:
+            number = connections.get_connection(using).info()["version"]["number"]
+        except (TransportError, KeyError):
+            logger.warning("Couldn't get the elasticsearch version of %s", using, exc_info=True)
+            return False
+        version = tuple(int(part) for part in re.findall(r"\d+", number)[:2])
+        supported = version >= PROFILE_API_VERSION
+        with _profile_support_lock:
+            _profile_support[key] = supported
+    return supported
+
+
+def _to_ms(node, key="time"):
+    """reads a time out of a profile node -- `time_in_nanos` on newer clusters, a "1.234ms" string on older ones
+
+    :return: the time in milliseconds
+    :rtype: float
+    """
+    if "{}_in_nanos".format(key) in node:
+        return node["{}_in_nanos".format(key)] / 1e6
+    value = node.get(key)
+    if isinstance(value, six.string_types):
+        return float(value.rstrip("ms")) if value.endswith("ms") else 0.0
+    return (value or 0) / 1e6
+
+
+def _flatten_nodes(nodes, depth=0):
+    """walks a tree of profiled query or aggregation nodes, depth first
+
+    :return: an iterator of depth and node tuples
+    :rtype: generator
+    """
+    for node in nodes or []:
+        yield depth, node
+        for child in _flatten_nodes(node.get("children"), depth + 1):
+            yield child
+
+
+def _summarize_nodes(nodes, name_key="type"):
+    """lists the slowest nodes of a profiled tree
+
+    :return: the nodes, slowest first
+    :rtype: list
+    """
+    flattened = [OrderedDict([
+        ("type", node.get(name_key)),
+        ("description", node.get("description")),
+        ("depth", depth),
+        ("time_ms", round(_to_ms(node), 3)),
+    ]) for depth, node in _flatten_nodes(nodes)]
+    flattened.sort(key=lambda node: node["time_ms"], reverse=True)
+    return flattened[:PROFILE_MAX_NODES]
+
+
+def summarize_shard_profile(shard):
+    """boils the profile of a shard down to the time spent querying, collecting and aggregating, and its slowest
+    query and aggregation nodes
+
+    :param shard: a shard of the `profile` block of an elasticsearch response
+    :type shard: dict
+
+    :return: the summary
+    :rtype: dict
+    """
+    searches = shard.get("searches", [])
+    queries = [node for search in searches for node in search.get("query", [])]
+    collectors = [node for search in searches for node in search.get("collector", [])]
+    aggregations = shard.get("aggregations", [])
+
+    return OrderedDict([
+        ("id", shard.get("id")),
+        ("query_ms", round(sum(_to_ms(node) for node in queries), 3)),
+        ("rewrite_ms", round(sum(_to_ms(search, "rewrite_time") for search in searches), 3)),
+        ("collector_ms", round(sum(_to_ms(node) for node in collectors), 3)),
+        ("aggregations_ms", round(sum(_to_ms(node) for node in aggregations), 3)),
+        ("queries", _summarize_nodes(queries)),
+        ("collectors", _summarize_nodes(collectors, name_key="name")),
+        ("aggregations", _summarize_nodes(aggregations)),
+    ])
+
+
+def summarize_search(body, raw, duration):
+    """summarizes a profiled search -- what was sent, how long elasticsearch and the round trip took, how the shards
+    fared and, where the cluster has the profile api, the breakdown of each shard
+
+    :param body: the compiled search body
+    :type body: dict
+
+    :param raw: the raw response
+    :type raw: dict
+
+    :param duration: how long the round trip took, in seconds
+    :type duration: float
+
+    :return: the summary
+    :rtype: dict
+    """
+    shards = raw.get("_shards", {})
+    summary = OrderedDict([
+        ("body", body),
+        ("took_ms", raw.get("took")),
+        ("round_trip_ms", round(duration * 1000, 3)),
+        ("timed_out", raw.get("timed_out", False)),
+        ("hits", raw.get("hits", {}).get("total")),
+        ("shards", OrderedDict([
+            ("total", shards.get("total")),
+            ("successful", shards.get("successful")),
+            ("failed", shards.get("failed")),
+        ])),
+    ])
+    if shards.get("failures"):
+        summary["shards"]["failures"] = shards["failures"]
+    if "profile" in raw:
+        summary["profile"] = [summarize_shard_profile(shard) for shard in raw["profile"].get("shards", [])]
+    return summary
+
+
+class SearchProfiler(object):
+    """collects a summary of every search sent while it's active
+
+    Used as a context manager, the profiler is active for the current thread: searches built meanwhile ask
+    elasticsearch to profile them (where the cluster has the profile api) and skip the result, facet and coalescing
+    caches, so what's summarized is what elasticsearch actually did.
+    """
+
+    def __init__(self):
+        self.searches = []
+
+    def __enter__(self):
+        if not hasattr(_local, "stack"):
+            _local.stack = []
+        _local.stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _local.stack.remove(self)
+
+    def record(self, qs, raw, duration):
+        """records a search that was sent -- before its hits are hydrated, as that alters the raw response
+
+        :param qs: the search
+        :type qs: djes.search.LazySearch
+
+        :param raw: the raw response
+        :type raw: dict
+
+        :param duration: how long the round trip took, in seconds
+        :type duration: float
+        """
+        self.searches.append(summarize_search(qs.to_dict(), raw, duration))
+
+    def to_dict(self):
+        """gets the summaries of the searches recorded, in the order they were sent
+
+        :rtype: list
+        """
+        return list(self.searches)
@@ -0,0 +1,24 @@
+from rest_framework import serializers
+from rest_framework.compat import OrderedDict
+
+
+class SourceSerializer(serializers.BaseSerializer):
+    """serializes raw elasticsearch hits straight from their `_source` -- no models are built and no sql is run
+
+    Nested and related objects are returned just as they were indexed. Declare `Meta.fields` to limit the keys of
+    the output.
+    """
+
+    def to_representation(self, instance):
+        data = OrderedDict(instance.get("_source", {}))
+
+        # documents are indexed under the model's pk
+        if "id" not in data:
+            _id = instance["_id"]
+            data["id"] = int(_id) if _id.isdigit() else _id
+
+        fields = getattr(getattr(self, "Meta", None), "fields", None)
+        if fields:
+            data = OrderedDict((field, data[field]) for field in fields if field in data)
+
+        return data
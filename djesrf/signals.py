@@ -0,0 +1,8 @@
+from django.dispatch import Signal
+
+
+# sent by the view sets once a timed request has been handled -- `timings` maps stage names to milliseconds
+search_timed = Signal(providing_args=["request", "view", "timings"])
+
+# sent when a circuit breaker opens, goes half-open or closes again
+breaker_state_changed = Signal(providing_args=["breaker", "previous", "state"])
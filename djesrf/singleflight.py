@@ -0,0 +1,134 @@
+import copy
+import sys
+import threading
+
+from django.utils import six
+
+from djesrf.cache import get_search_key, make_response
+from djesrf.conf import settings
+
+
+class _Call(object):
+    """a call in flight, which the callers coalesced into it wait on"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.waiters = 0
+        self.value = None
+        self.exc_info = None
+
+
+class SingleFlight(object):
+    """coalesces identical calls made at the same time, so only the first one runs and the rest share its outcome
+
+    Calls are only coalesced while one is in flight -- nothing is kept once it returns, so a call made right after
+    runs again and sees fresh results.
+    """
+
+    def __init__(self):
+        self.metrics = {"executed": 0, "coalesced": 0}
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def get_metrics(self):
+        """gets the number of calls that ran and that were coalesced into another one
+
+        :rtype: dict
+        """
+        with self._lock:
+            return dict(self.metrics)
+
+    def do(self, key, func, share=None):
+        """calls a function, unless a call with the same key is already in flight, in which case it waits for that one
+        and takes its result (or raises its error)
+
+        :param key: identifies identical calls
+        :type key: str
+
+        :param func: the function to call
+        :type func: callable
+
+        :param share: turns the result into the value handed to the callers that waited on it -- only called if any
+                      did
+        :type share: callable
+
+        :return: whether this call ran the function, and its result or the shared value
+        :rtype: tuple
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.metrics["executed"] += 1
+            else:
+                call.waiters += 1
+                self.metrics["coalesced"] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.exc_info is not None:
+                six.reraise(*call.exc_info)
+            return False, call.value
+
+        result = None
+        try:
+            result = func()
+        except Exception:
+            call.exc_info = sys.exc_info()
+            raise
+        finally:
+            # let go of the key before waking anyone up, so calls from here on run again
+            with self._lock:
+                del self._calls[key]
+                waiters = call.waiters
+            try:
+                if waiters and call.exc_info is None:
+                    call.value = share(result) if share else result
+            except Exception:
+                call.exc_info = sys.exc_info()
+            finally:
+                call.event.set()
+        return True, result
+
+    def execute(self, qs, send):
+        """executes a search, coalescing it with identical searches in flight
+
+        The searches waiting on another one each get a response of their own, built from a copy of the raw response,
+        as hydrating hits alters it.
+
+        :param qs: elasticsearch search results mapped to django model proxies
+        :type qs: djes.search.LazySearch
+
+        :param send: sends the search and returns its response
+        :type send: callable
+
+        :return: the elasticsearch response
+        :rtype: elasticsearch_dsl.result.Response
+        """
+        if hasattr(qs, "_executed"):
+            return qs._executed
+
+        leader, value = self.do(get_search_key(qs), send, share=lambda response: copy.deepcopy(response.to_dict()))
+        if leader:
+            return value
+        return make_response(qs, copy.deepcopy(value))
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    """gets the process wide search coalescer
+
+    :return: the coalescer, or `None` when `DJESRF_SINGLE_FLIGHT` is off
+    :rtype: djesrf.singleflight.SingleFlight
+    """
+    global _single_flight
+    if not settings.DJESRF_SINGLE_FLIGHT:
+        return None
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+        return _single_flight
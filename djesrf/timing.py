@@ -0,0 +1,157 @@
+import threading
+from timeit import default_timer
+
+from rest_framework.compat import OrderedDict
+
+
+_local = threading.local()
+
+
+def get_active_timer():
+    """gets the stage timer recording the request being handled by the current thread
+
+    :return: the innermost active timer, or `None` when nothing is being timed
+    :rtype: djesrf.timing.StageTimer
+    """
+    stack = getattr(_local, "stack", None)
+    if stack:
+        return stack[-1]
+    return None
+
+
+class _Stage(object):
+    """times a block of code into a stage of a timer
+    """
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timer.record(self.name, default_timer() - self.start)
+
+
+class _NullStage(object):
+    """stands in for a stage when nothing is being timed
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_null_stage = _NullStage()
+
+
+def stage(name):
+    """times a block of code into a stage of the active timer, if there is one
+
+        with stage("serialize"):
+            data = serializer.data
+
+    :param name: the name of the stage
+    :type name: str
+
+    :return: a context manager timing the block
+    :rtype: object
+    """
+    timer = get_active_timer()
+    if timer is None:
+        return _null_stage
+    return timer.stage(name)
+
+
+class StageTimer(object):
+    """collects how long each stage of a request took
+
+    Time spent in a stage more than once (a page and a count search, for instance) is added up. Used as a context
+    manager, the timer is active for the current thread so code further down (`Searchable.execute_search` and the like)
+    can record into it through `stage` without having it passed around.
+    """
+
+    def __init__(self):
+        self.stages = OrderedDict()
+        self.start = default_timer()
+        self.end = None
+
+    def __enter__(self):
+        if not hasattr(_local, "stack"):
+            _local.stack = []
+        _local.stack.append(self)
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end = default_timer()
+        _local.stack.remove(self)
+
+    def stage(self, name):
+        """times a block of code into a stage
+
+        :param name: the name of the stage
+        :type name: str
+
+        :return: a context manager timing the block
+        :rtype: object
+        """
+        return _Stage(self, name)
+
+    def record(self, name, duration):
+        """adds time to a stage
+
+        :param name: the name of the stage
+        :type name: str
+
+        :param duration: the time spent, in seconds
+        :type duration: float
+        """
+        self.stages[name] = self.stages.get(name, 0.0) + duration
+
+    def record_search(self, duration, took):
+        """records a search round trip, splitting it into the time spent in elasticsearch and everything else (the
+        network, the client, serializing the request and parsing the response)
+
+        :param duration: the time the search took from the caller's side, in seconds
+        :type duration: float
+
+        :param took: the `took` of the response, in milliseconds -- `None` when the response didn't come from
+                     elasticsearch (a cache hit, for instance)
+        :type took: int
+        """
+        self.record("search", duration)
+        if took is not None:
+            es = min(took / 1000.0, duration)
+            self.record("es", es)
+            self.record("network", duration - es)
+
+    def get_total(self):
+        """gets the time since the timer started, or until it stopped
+
+        :return: the time, in seconds
+        :rtype: float
+        """
+        return (self.end or default_timer()) - self.start
+
+    def to_dict(self):
+        """gets the time of every stage and the total, in milliseconds
+
+        :rtype: dict
+        """
+        timings = OrderedDict((name, round(duration * 1000, 2)) for name, duration in self.stages.items())
+        timings["total"] = round(self.get_total() * 1000, 2)
+        return timings
+
+    def get_header(self):
+        """formats the timings as a `Server-Timing` header value
+
+        :return: the header value
+        :rtype: str
+        """
+        return ", ".join("{};dur={}".format(name, duration) for name, duration in self.to_dict().items())
@@ -0,0 +1,233 @@
+import logging
+
+from django.utils import six
+from elasticsearch.exceptions import TransportError
+from elasticsearch_dsl.connections import connections
+from rest_framework import status
+from rest_framework.compat import OrderedDict
+from rest_framework.exceptions import APIException, NotFound, ParseError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from djesrf.breaker import get_breaker
+from djesrf.cache import make_response
+from djesrf.exceptions import CircuitOpen, InvalidSearch, SearchUnavailable
+from djesrf.models import Aggregateable
+from djesrf.plans import is_truthy
+from djesrf.timing import stage
+
+
+logger = logging.getLogger(__name__)
+
+# the search params elasticsearch reads from the header lines of a multi search
+MSEARCH_HEADER_PARAMS = ("search_type", "preference", "routing", "query_cache")
+
+
+class BatchSearch(object):
+    """a search of a batch, along with what's needed to turn its response into a result"""
+
+    def __init__(self, view, qs, filters=None, buckets=None, fields=None):
+        self.view = view
+        self.qs = qs
+        self.filters = filters
+        self.buckets = buckets
+        self.fields = fields
+        self.response = None
+        self.error = None
+
+
+class BatchSearchView(APIView):
+    """runs the searches of several view sets in a single `_msearch` request
+
+    The view takes a list of search specs -- `{"model", "search", "filters", "ordering", "page_size", "aggregates"}`,
+    where `model` is the name a view set is registered under in `viewsets` -- and returns a result for each of them, in
+    order. Each search is built by its view set, with its permissions, read options and serializers, and a search that
+    fails comes back as an `error` without failing the rest of the batch.
+    """
+
+    viewsets = {}
+    max_searches = 25
+    page_size = 10
+    max_page_size = 100
+
+    def post(self, request, *args, **kwargs):
+        specs = request.data
+        if not isinstance(specs, list):
+            raise ParseError("Expected a list of searches")
+        if len(specs) > self.max_searches:
+            raise ParseError("A batch can't have more than {} searches".format(self.max_searches))
+
+        searches = []
+        for spec in specs:
+            try:
+                searches.append(self.get_search(request, spec))
+            except APIException as exc:
+                searches.append(self.get_error(exc.status_code, exc.detail))
+
+        self.send_searches([search for search in searches if isinstance(search, BatchSearch)])
+        return Response({"results": [self.get_result(search) for search in searches]})
+
+    @staticmethod
+    def get_error(status_code, detail):
+        """builds the result of a search that failed
+
+        :rtype: dict
+        """
+        return {"error": OrderedDict([("status", status_code), ("detail", detail)])}
+
+    def get_viewset(self, request, name):
+        """gets the view set registered under a name, set up for its list action, after checking its permissions
+
+        :param request: the incoming request
+        :type request: rest_framework.request.Request
+
+        :param name: the name the view set is registered under
+        :type name: str
+
+        :return: the view set
+        :rtype: djesrf.viewsets.SearchableModelViewSet
+        """
+        viewset_class = self.viewsets.get(name) if isinstance(name, six.string_types) else None
+        if viewset_class is None:
+            raise NotFound("Unknown model: {}".format(name))
+
+        view = viewset_class(request=request, args=(), kwargs={}, format_kwarg=None,
+                             action="list", action_map={"get": "list"})
+        view.check_permissions(request)
+        return view
+
+    def get_page_size(self, view, page_size=None):
+        """gets the number of hits of a search, from the spec or the view set's paginator, capped at the paginator's
+        `max_page_size` (or `max_page_size`)
+
+        :rtype: int
+        """
+        paginator = view.paginator
+        if hasattr(paginator, "_handle_backwards_compat"):
+            # picks up the view's (and the deprecated settings') page sizes, as paginating would
+            paginator._handle_backwards_compat(view)
+        default = getattr(paginator, "page_size", None) or self.page_size
+        limit = getattr(paginator, "max_page_size", None) or self.max_page_size
+        if page_size is None:
+            return min(default, limit)
+
+        try:
+            return min(max(int(page_size), 0), limit)
+        except (TypeError, ValueError):
+            raise ParseError("Invalid page size: {}".format(page_size))
+
+    def get_search(self, request, spec):
+        """builds the search of a spec through its view set
+
+        :param request: the incoming request
+        :type request: rest_framework.request.Request
+
+        :param spec: the search spec
+        :type spec: dict
+
+        :return: the search
+        :rtype: djesrf.views.BatchSearch
+        """
+        if not isinstance(spec, dict):
+            raise ParseError("Expected a search object")
+
+        view = self.get_viewset(request, spec.get("model"))
+        query = spec.get("search") or None
+        filters = spec.get("filters") or {}
+        if not isinstance(filters, dict):
+            raise ParseError("Expected an object of filters")
+        ordering = spec.get("ordering") or None
+        if isinstance(ordering, six.string_types):
+            ordering = [ordering, ]
+        page_size = self.get_page_size(view, spec.get("page_size"))
+
+        if not is_truthy(spec.get("aggregates")):
+            qs = view.get_search_results(query, filters, ordering)
+            return BatchSearch(view, qs[0:page_size])
+
+        if not issubclass(view.model, Aggregateable):
+            raise ParseError("{} has no aggregates".format(view.model.__name__))
+
+        # the filters are applied by the aggregates, like the list route's `include_aggregates`
+        qs = view.get_search_results(query, None, ordering)
+        try:
+            with stage("compile"):
+                qs, buckets, fields = view.model._build_aggregates(qs, filters)
+        except InvalidSearch as exc:
+            raise ParseError(six.text_type(exc))
+        return BatchSearch(view, qs[0:page_size], filters, buckets, fields)
+
+    def send_searches(self, searches):
+        """sends searches to elasticsearch -- one `_msearch` request per connection -- and hands each one its response
+        or error
+
+        :param searches: the searches of the batch
+        :type searches: list
+        """
+        groups = OrderedDict()
+        for search in searches:
+            groups.setdefault(search.qs._using, []).append(search)
+
+        for using, group in groups.items():
+            body = []
+            timeouts = []
+            for search in group:
+                header = {"index": search.qs._index, "type": search.qs._doc_type}
+                for key, value in search.qs._params.items():
+                    if key in MSEARCH_HEADER_PARAMS:
+                        header[key] = value
+                    elif key == "request_timeout":
+                        timeouts.append(value)
+                body.extend([header, search.qs.to_dict()])
+
+            params = {"request_timeout": max(timeouts)} if timeouts else {}
+            es = connections.get_connection(using)
+            breaker = get_breaker(using if isinstance(using, six.string_types) else "default")
+
+            try:
+                with stage("search"):
+                    if breaker is None:
+                        raw = es.msearch(body=body, **params)
+                    else:
+                        raw = breaker.call(es.msearch, body=body, **params)
+            except (CircuitOpen, TransportError):
+                logger.warning("Batch of %s searches failed", len(group), exc_info=True)
+                for search in group:
+                    search.error = self.get_error(SearchUnavailable.status_code, SearchUnavailable.default_detail)
+                continue
+
+            for search, response in zip(group, raw["responses"]):
+                if "error" in response:
+                    search.error = self.get_error(
+                        response.get("status", status.HTTP_400_BAD_REQUEST), six.text_type(response["error"]))
+                else:
+                    search.response = make_response(search.qs, response)
+
+    def get_result(self, search):
+        """serializes the response of a search through its view set
+
+        :param search: a search of the batch, or the error of a spec that couldn't be built
+        :type search: djesrf.views.BatchSearch
+
+        :return: the count, results (and aggregates) of the search, or its error
+        :rtype: dict
+        """
+        if not isinstance(search, BatchSearch):
+            return search
+        if search.error is not None:
+            return search.error
+
+        view = search.view
+        raw = search.response.to_dict()
+        serializer = view.get_list_serializer(view.get_list_results(search.response), many=True)
+        result = OrderedDict([
+            ("count", raw["hits"]["total"]),
+            ("results", view.get_list_data(serializer)),
+        ])
+
+        if search.buckets is not None:
+            with stage("aggregates"):
+                aggregates = view.model._parse_aggregates(
+                    raw.get("aggregations", {}), search.buckets, search.fields, search.filters)
+                result["aggregates"] = view._format_aggregates(aggregates)
+        return result
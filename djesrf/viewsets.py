@@ -1,10 +1,92 @@
 from copy import deepcopy
+import hashlib
+import itertools
+import json
+import re
+import time
 
-from rest_framework import viewsets, status
+from django.core.exceptions import FieldError, ValidationError
+from django.http import StreamingHttpResponse
+from django.utils import six
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import permissions, viewsets, status
+from rest_framework.compat import OrderedDict
 from rest_framework.decorators import list_route
+from rest_framework.exceptions import APIException, ParseError
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
+from djesrf.conf import settings
+from djesrf.breaker import get_breaker
+from djesrf.cache import get_generation
+from djesrf.exceptions import CircuitOpen, InvalidSearch, SearchUnavailable, UntranslatableSearch
+from djesrf.export import EXPORT_FORMATS, iter_csv, iter_ndjson
 from djesrf.models import Searchable, Aggregateable
+from djesrf.pagination import SearchablePagination
+from djesrf.plans import is_truthy
+from djesrf.profiling import SearchProfiler
+from djesrf.serializers import SourceSerializer
+from djesrf.signals import search_timed
+from djesrf.timing import StageTimer, stage
+
+
+# the length of each date math rounding unit (`DJESRF_STATUS_ROUNDING`, or the `/d` of `now-1d/d`), in seconds
+STATUS_WINDOWS = {
+    "s": 1,
+    "m": 60,
+    "h": 60 * 60,
+    "H": 60 * 60,
+    "d": 24 * 60 * 60,
+}
+
+# lookups whose values can be date math relative to `now`
+RANGE_LOOKUPS = ("gt", "gte", "lt", "lte")
+
+
+def _get_date_math_window(value):
+    """gets how long a date math expression relative to `now` holds still -- the length of the unit it's rounded to
+
+    :param value: a range lookup value, such as `now-1d/d`
+    :type value: str
+
+    :return: the length of the window in seconds, or `None` if the expression moves all the time
+    :rtype: int
+    """
+    units = re.findall(r"/([a-zA-Z])", value)
+    if not units:
+        return None
+    return STATUS_WINDOWS.get(units[-1])
+
+
+def _project(data, fields):
+    """trims serialized data down to the given (possibly dotted) field paths
+
+    :param data: a serialized result or list of results
+    :type data: dict
+
+    :param fields: dotted field paths to keep
+    :type fields: list
+
+    :return: the trimmed data
+    :rtype: dict
+    """
+    # build a tree of the paths to keep -- an empty branch keeps everything below it
+    tree = {}
+    for field in fields:
+        branch = tree
+        for part in field.split("."):
+            branch = branch.setdefault(part, {})
+
+    def trim(value, branch):
+        if not branch:
+            return value
+        if isinstance(value, (list, tuple)):
+            return [trim(item, branch) for item in value]
+        if isinstance(value, dict):
+            return OrderedDict((key, trim(item, branch[key])) for key, item in value.items() if key in branch)
+        return value
+
+    return trim(data, tree)
 
 
 class SearchableModelViewSet(viewsets.ModelViewSet):
@@ -12,6 +94,26 @@ class SearchableModelViewSet(viewsets.ModelViewSet):
     """
 
     model = object
+    pagination_class = SearchablePagination
+    hit_serializer_class = None
+    fields_param = "fields"
+    export_format_param = "export_format"
+    profile_param = "profile"
+    profile_permission_classes = (permissions.IsAdminUser, )
+    suggest_size = 10
+    suggest_max_size = 50
+    search_using = None
+    search_timeout = None
+    search_preference = None
+    search_routing = None
+    hedge_after = None
+    fallback_to_database = True
+    use_etags = None
+    requested_fields = None
+    etag = None
+    record_timings = None
+    timer = None
+    profiler = None
 
     def __init__(self, **kwargs):
         if not issubclass(self.model, Searchable):
@@ -19,8 +121,280 @@ class SearchableModelViewSet(viewsets.ModelViewSet):
                             "and it must subclass `djesrf.models.Searchable`")
         super(SearchableModelViewSet, self).__init__(**kwargs)
 
-    def list(self, request, *args, **kwargs):
-        # get params
+    def should_record_timings(self):
+        """checks whether the stages of requests are timed -- `record_timings` on the view, or `DJESRF_TIMINGS`
+
+        :rtype: bool
+        """
+        if self.record_timings is not None:
+            return self.record_timings
+        return settings.DJESRF_TIMINGS
+
+    def dispatch(self, request, *args, **kwargs):
+        record_timings = self.should_record_timings()
+        profiler = SearchProfiler() if is_truthy(request.GET.get(self.profile_param)) else None
+        if not record_timings and profiler is None:
+            return super(SearchableModelViewSet, self).dispatch(request, *args, **kwargs)
+
+        with StageTimer() as timer:
+            self.timer = timer
+            self.profiler = profiler
+            if profiler is None:
+                response = super(SearchableModelViewSet, self).dispatch(request, *args, **kwargs)
+            else:
+                with profiler:
+                    response = super(SearchableModelViewSet, self).dispatch(request, *args, **kwargs)
+
+        if record_timings:
+            self.timings_recorded(request, response, timer)
+        if profiler is not None:
+            self.profile_recorded(request, response, profiler, timer)
+        return response
+
+    def initial(self, request, *args, **kwargs):
+        super(SearchableModelViewSet, self).initial(request, *args, **kwargs)
+        if self.profiler is not None:
+            self.check_profile_permissions(request)
+
+    def check_profile_permissions(self, request):
+        """checks the request against `profile_permission_classes` (staff only by default) before profiling it
+
+        :param request: the incoming request
+        :type request: rest_framework.request.Request
+        """
+        for permission_class in self.profile_permission_classes:
+            if not permission_class().has_permission(request, self):
+                self.permission_denied(request)
+
+    def profile_recorded(self, request, response, profiler, timer):
+        """adds a `profile` block to the response of a profiled request, with the stage timings of the request and a
+        summary of each search it sent
+
+        :param request: the handled request
+        :type request: rest_framework.request.Request
+
+        :param response: the response, not rendered yet
+        :type response: rest_framework.response.Response
+
+        :param profiler: the profiler of the request
+        :type profiler: djesrf.profiling.SearchProfiler
+
+        :param timer: the timer of the request
+        :type timer: djesrf.timing.StageTimer
+        """
+        # denied requests never get this far with anything worth showing
+        if response.status_code >= 400 or not isinstance(getattr(response, "data", None), dict):
+            return
+
+        response.data["profile"] = OrderedDict([
+            ("timings", timer.to_dict()),
+            ("searches", profiler.to_dict()),
+        ])
+        response["Cache-Control"] = "no-store"
+
+    def timings_recorded(self, request, response, timer):
+        """exposes the timings of a handled request -- as a `Server-Timing` header, through the `search_timed` signal
+        and, with `DJESRF_TIMINGS_DEBUG`, in a `timings` block of the response
+
+        :param request: the handled request
+        :type request: rest_framework.request.Request
+
+        :param response: the response, not rendered yet
+        :type response: rest_framework.response.Response
+
+        :param timer: the timer of the request
+        :type timer: djesrf.timing.StageTimer
+        """
+        timings = timer.to_dict()
+        response["Server-Timing"] = timer.get_header()
+        search_timed.send(sender=self.model, request=request, view=self, timings=timings)
+
+        if settings.DJESRF_TIMINGS_DEBUG and isinstance(getattr(response, "data", None), dict):
+            response.data["timings"] = timings
+
+    def handle_exception(self, exc):
+        # while the circuit breaker is open, lists that the database can serve are served from it
+        if isinstance(exc, CircuitOpen):
+            try:
+                response = self.get_fallback_response(self.request)
+            except APIException as fallback_exc:
+                # a page out of range, say -- answered as it would be by elasticsearch
+                return super(SearchableModelViewSet, self).handle_exception(fallback_exc)
+            if response is not None:
+                return response
+            exc = SearchUnavailable()
+        return super(SearchableModelViewSet, self).handle_exception(exc)
+
+    def can_fall_back(self, request):
+        """checks whether a request can be served from the database when elasticsearch is unavailable -- only lists
+        of model serialized results, paged by page number, can be
+
+        :rtype: bool
+        """
+        if not self.fallback_to_database or getattr(self, "action", None) != "list":
+            return False
+        if self.hit_serializer_class is not None:
+            return False
+        paginator = self.paginator
+        return paginator is None or getattr(paginator, "supports_fallback", False)
+
+    def get_fallback_response(self, request):
+        """serves a list from the view's `queryset` instead of elasticsearch, with the same filters and ordering
+
+        :param request: the incoming request
+        :type request: rest_framework.request.Request
+
+        :return: the response, or `None` if the request can't be served from the database
+        :rtype: rest_framework.response.Response
+        """
+        if not self.can_fall_back(request):
+            return None
+
+        query, params, ordering = self.get_search_params(request)
+        if query:
+            return None
+        try:
+            queryset = self.model.search_database(self.get_queryset(), params, ordering)
+        except (InvalidSearch, UntranslatableSearch, FieldError, ValidationError, TypeError, ValueError):
+            # values the database won't take (`?id=abc`) are as good as untranslatable
+            return None
+        if not queryset.ordered:
+            queryset = queryset.order_by("pk")
+
+        breaker = get_breaker(self.search_using or "default")
+        if breaker is not None:
+            breaker.record_fallback()
+
+        fields = self.requested_fields = self.get_search_fields(request)
+        page = None
+        if self.paginator is not None:
+            page = self.paginator.paginate_fallback_queryset(queryset, request, view=self)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            response = self.get_paginated_response(self.get_list_data(serializer, fields))
+        else:
+            serializer = self.get_serializer(queryset, many=True)
+            response = Response(self.get_list_data(serializer, fields))
+        response["X-Search-Fallback"] = "database"
+        return response
+
+    def should_use_etags(self):
+        """checks whether list and aggregates responses get etags -- `use_etags` on the view, or `DJESRF_ETAGS`
+
+        :rtype: bool
+        """
+        if self.use_etags is not None:
+            return self.use_etags
+        return settings.DJESRF_ETAGS
+
+    def get_etag(self, request):
+        """builds the etag of a response out of the request's params and the model's index generation, which advances
+        whenever an instance is indexed or deleted -- so it can be checked without searching
+
+        :param request: the incoming request
+        :type request: rest_framework.request.Request
+
+        :return: the etag, or `None` if the response can't be versioned
+        :rtype: str
+        """
+        params = request.query_params
+        version = {
+            "model": "{}.{}".format(self.model._meta.app_label, self.model._meta.model_name),
+            "generation": get_generation(self.model),
+            "action": getattr(self, "action", None),
+            "format": getattr(getattr(request, "accepted_renderer", None), "format", None),
+            "options": self.get_read_options(),
+            # repeated keys keep the order of their values, which matters for ordering
+            "params": [(key, params.getlist(key)) for key in sorted(params)],
+        }
+
+        # status filters and range lookups on `now` move with time, so the response changes as `now` moves into the
+        # next rounding window -- and can't be versioned at all when `now` isn't rounded
+        windows = []
+        plan = self.model.get_search_plan()
+        for key in params:
+            if key.lower() == "status":
+                windows.append(STATUS_WINDOWS.get(settings.DJESRF_STATUS_ROUNDING))
+                continue
+            try:
+                _, lookup = plan.parse_filter_key(key)
+            except InvalidSearch:
+                # not a filter -- and if it was meant to be, the search turns it down
+                continue
+            if lookup in RANGE_LOOKUPS:
+                windows.extend(_get_date_math_window(value) for value in params.getlist(key) if "now" in value)
+        if windows:
+            if None in windows:
+                return None
+            # every window boundary is also a boundary of the shortest window
+            version["window"] = int(time.time() // min(windows))
+
+        normalized = json.dumps(version, sort_keys=True, default=str)
+        return hashlib.md5(normalized.encode("utf8")).hexdigest()
+
+    def get_not_modified_response(self, request):
+        """checks the request's `If-None-Match` against the etag of the response it's asking for
+
+        :param request: the incoming request
+        :type request: rest_framework.request.Request
+
+        :return: a `304` response if the client's copy is current, otherwise `None`
+        :rtype: rest_framework.response.Response
+        """
+        # a profiled request has to actually search
+        if request.method not in ("GET", "HEAD") or not self.should_use_etags() or self.profiler is not None:
+            return None
+
+        self.etag = self.get_etag(request)
+        if self.etag is None:
+            return None
+
+        if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+        if if_none_match and (if_none_match.strip() == "*" or self.etag in parse_etags(if_none_match)):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return None
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(SearchableModelViewSet, self).finalize_response(request, response, *args, **kwargs)
+        if self.etag is not None and response.status_code in (200, 304):
+            response["ETag"] = quote_etag(self.etag)
+        return response
+
+    def get_read_options(self):
+        """gets the connection alias, timeout, preference and routing the view's searches are read with -- override
+        to pick them per request (a `preference` per user keeps their paging on the same shard copies, for instance)
+
+        :return: the read options passed on to the model's `search`
+        :rtype: dict
+        """
+        options = {
+            "using": self.search_using,
+            "timeout": self.search_timeout,
+            "preference": self.search_preference,
+            "routing": self.search_routing,
+        }
+        return dict((key, value) for key, value in options.items() if value is not None)
+
+    def execute_search(self, qs):
+        """executes one of the view's searches, hedging it after `hedge_after` seconds if set
+
+        :param qs: elasticsearch search results mapped to django model proxies
+        :type qs: djes.search.LazySearch
+
+        :return: the elasticsearch response
+        :rtype: elasticsearch_dsl.result.Response
+        """
+        return self.model.execute_search(qs, hedge_after=self.hedge_after)
+
+    def get_search_params(self, request):
+        """pulls the meta params out of the request's query params
+
+        :param request: the incoming request
+        :type request: rest_framework.request.Request
+
+        :return: the search query, the filter params and the ordering
+        :rtype: tuple
+        """
         params = deepcopy(request.query_params)
 
         if "search" in params:
@@ -41,62 +415,313 @@ class SearchableModelViewSet(viewsets.ModelViewSet):
         if "page_size" in params:
             del params["page_size"]
 
-        results = self.model.search(query, params, ordering)
+        if "cursor" in params:
+            del params["cursor"]
+
+        if self.fields_param in params:
+            del params[self.fields_param]
+
+        if self.export_format_param in params:
+            del params[self.export_format_param]
+
+        if self.profile_param in params:
+            del params[self.profile_param]
+
+        if api_settings.URL_FORMAT_OVERRIDE in params:
+            del params[api_settings.URL_FORMAT_OVERRIDE]
+
+        return query, params, ordering
+
+    def get_search_fields(self, request):
+        """pulls the requested fields out of the request's query params -- repeated and comma separated values are
+        both accepted
+
+        :param request: the incoming request
+        :type request: rest_framework.request.Request
+
+        :return: the requested field names, or `None` for full documents
+        :rtype: list
+        """
+        fields = []
+        for value in request.query_params.getlist(self.fields_param):
+            fields.extend(field.strip() for field in value.split(",") if field.strip())
+        return fields or None
+
+    def get_search_results(self, query, params, ordering, fields=None):
+        """builds the search used by the list endpoint
+
+        :return: elasticsearch search results mapped to django model proxies
+        :rtype: djes.search.LazySearch
+        """
+        try:
+            with stage("compile"):
+                return self.model.search(query, params, ordering, fields=fields, **self.get_read_options())
+        except InvalidSearch as exc:
+            raise ParseError(six.text_type(exc))
+
+    def serializes_hits(self):
+        """checks whether list results are serialized straight from the raw hits -- either because the view has a
+        `hit_serializer_class` or because the client asked for a subset of fields, which partial model proxies can't
+        be trusted to serialize
+
+        :rtype: bool
+        """
+        return self.hit_serializer_class is not None or bool(self.requested_fields)
+
+    def get_list_serializer(self, *args, **kwargs):
+        """gets the serializer for list results -- raw hits go through `hit_serializer_class` (`SourceSerializer` by
+        default), otherwise the usual `serializer_class` is used against model proxies
+
+        :return: the serializer instance
+        :rtype: rest_framework.serializers.BaseSerializer
+        """
+        if not self.serializes_hits():
+            return self.get_serializer(*args, **kwargs)
+        serializer_class = self.hit_serializer_class or SourceSerializer
+        kwargs["context"] = self.get_serializer_context()
+        return serializer_class(*args, **kwargs)
+
+    def get_list_results(self, response):
+        """pulls the results out of an executed search for the list serializer
+
+        :param response: the elasticsearch response
+        :type response: elasticsearch_dsl.result.Response
+
+        :return: raw hits or model proxies, depending on `serializes_hits`
+        :rtype: list
+        """
+        with stage("hydrate"):
+            if not self.serializes_hits():
+                return list(response)
+            return response.to_dict()["hits"]["hits"]
+
+    def get_list_data(self, serializer, fields=None):
+        """gets the serialized data of the list results, trimmed down to the requested fields
+
+        :param serializer: the list serializer
+        :type serializer: rest_framework.serializers.BaseSerializer
+
+        :param fields: field names requested by the client
+        :type fields: list
+
+        :return: the serialized results
+        :rtype: list
+        """
+        with stage("serialize"):
+            if not fields:
+                return serializer.data
+            return _project(serializer.data, [field.lower().replace("__", ".") for field in fields])
+
+    def list(self, request, *args, **kwargs):
+        not_modified = self.get_not_modified_response(request)
+        if not_modified is not None:
+            return not_modified
+
+        query, params, ordering = self.get_search_params(request)
+        fields = self.requested_fields = self.get_search_fields(request)
+        results = self.get_search_results(query, params, ordering, fields)
 
         page = self.paginate_queryset(results)
-        if page:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        serializer = self.get_serializer(results, many=True)
-        return Response(serializer.data)
+        if page is not None:
+            serializer = self.get_list_serializer(page, many=True)
+            return self.get_paginated_response(self.get_list_data(serializer, fields))
+        executed = self.execute_search(results)
+        serializer = self.get_list_serializer(self.get_list_results(executed), many=True)
+        return Response(self.get_list_data(serializer, fields))
+
+    @list_route(methods=["get"])
+    def suggest(self, request):
+        """returns the id and label of the documents whose `suggest_field` starts with the words of `search` -- for
+        typeahead, so only `page_size` (`suggest_size` by default, at most `suggest_max_size`) suggestions are sent back
+        """
+        query, params, _ = self.get_search_params(request)
+
+        try:
+            size = min(max(int(request.query_params.get("page_size", self.suggest_size)), 1), self.suggest_max_size)
+        except ValueError:
+            size = self.suggest_size
+
+        try:
+            results = self.model.suggest(query, params, size=size, hedge_after=self.hedge_after,
+                                         **self.get_read_options())
+        except InvalidSearch as exc:
+            raise ParseError(six.text_type(exc))
+
+        return Response({"results": results})
+
+    def get_export_batches(self, batches, fields=None):
+        """serializes batches of raw hits for an export, straight from their `_source` with `hit_serializer_class`
+        (`SourceSerializer` by default) and trimmed down to the requested fields
+
+        :param batches: lists of raw hits
+        :type batches: iterable
+
+        :param fields: field names requested by the client
+        :type fields: list
+
+        :return: an iterator of lists of serialized results
+        :rtype: generator
+        """
+        serializer_class = self.hit_serializer_class or SourceSerializer
+        serializer = serializer_class(context=self.get_serializer_context())
+        paths = [field.lower().replace("__", ".") for field in fields or []]
+        for hits in batches:
+            rows = [serializer.to_representation(hit) for hit in hits]
+            yield _project(rows, paths) if paths else rows
+
+    @list_route(methods=["get"])
+    def export(self, request):
+        """streams every result of the search as newline delimited json (`export_format=ndjson`, the default) or csv
+        (`export_format=csv`), scrolling through the index a batch at a time
+        """
+        export_format = request.query_params.get(self.export_format_param, "ndjson")
+        if export_format not in EXPORT_FORMATS:
+            raise ParseError("Unknown export format: {}".format(export_format))
+
+        query, params, ordering = self.get_search_params(request)
+        fields = self.requested_fields = self.get_search_fields(request)
+        results = self.get_search_results(query, params, ordering, fields)
+
+        # send the first request before streaming anything, so a failing search still gets an error response
+        hits = self.model.scroll_search(results)
+        first = next(hits, [])
+        batches = self.get_export_batches(itertools.chain([first], hits), fields)
+
+        if export_format == "csv":
+            content = iter_csv(batches)
+        else:
+            content = iter_ndjson(batches)
+
+        response = StreamingHttpResponse(content, content_type=EXPORT_FORMATS[export_format])
+        response["Content-Disposition"] = "attachment; filename=\"{}.{}\"".format(
+            self.model._meta.model_name, export_format)
+        return response
 
 
 class AggregateableModelViewSet(SearchableModelViewSet):
 
+    include_aggregates_param = "include_aggregates"
+
     def __init__(self, **kwargs):
         if not issubclass(self.model, Aggregateable):
             raise Exception("You must explicitly supply a `model` attribute of this viewset "
                             "and it must subclass `djesrf.models.Aggregateable`")
         super(AggregateableModelViewSet, self).__init__(**kwargs)
 
-    @list_route(methods=["get"])
-    def aggregates(self, request):
-        # get params
-        params = deepcopy(request.query_params)
-
-        if "search" in params:
-            query = params["search"]
-            del params["search"]
-        else:
-            query = None
+    def get_search_params(self, request):
+        query, params, ordering = super(AggregateableModelViewSet, self).get_search_params(request)
 
-        if "ordering" in params:
-            del params["ordering"]
+        if self.include_aggregates_param in params:
+            del params[self.include_aggregates_param]
 
-        if "page" in params:
-            del params["page"]
+        return query, params, ordering
 
-        if "page_size" in params:
-            del params["page_size"]
+    def can_fall_back(self, request):
+        # the database can't compute the aggregates
+        if is_truthy(request.query_params.get(self.include_aggregates_param)):
+            return False
+        return super(AggregateableModelViewSet, self).can_fall_back(request)
 
-        results = self.model.get_aggregates(query, params)
+    @staticmethod
+    def _format_aggregates(results):
+        """formats parsed aggregates into the list of groups returned by the api
 
-        response = {
-            "count": len(results),
-            "next": None,
-            "previous": None,
-            "results": [],
-        }
+        :param results: a dictionary of field keys and value/count mapped dictionary (or metric) values
+        :type results: dict
 
+        :return: a list of aggregate groups
+        :rtype: list
+        """
+        formatted = []
         for path, obj in results.items():
             name = path.split("__")[0].title()
             path = path.replace(".", "__")
             result = {
                 "name": name,
                 "path": path,
-                "aggregates": [],
             }
+
+            # metrics have a single value instead of buckets
+            if not isinstance(obj, dict):
+                result["value"] = obj
+                formatted.append(result)
+                continue
+
+            result["aggregates"] = []
             for value, count in obj.items():
-                result["aggregates"].append({"value": value, "count": count})
-            response["results"].append(result)
+                if isinstance(count, dict):
+                    result["aggregates"].append({
+                        "value": value,
+                        "count": count["count"],
+                        "aggregates": AggregateableModelViewSet._format_aggregates(count["aggregates"]),
+                    })
+                else:
+                    result["aggregates"].append({"value": value, "count": count})
+            formatted.append(result)
+        return formatted
+
+    def list(self, request, *args, **kwargs):
+        # plain list unless the client opts in to getting the facets with the hits
+        include_aggregates = request.query_params.get(self.include_aggregates_param)
+        if not is_truthy(include_aggregates):
+            return super(AggregateableModelViewSet, self).list(request, *args, **kwargs)
+
+        not_modified = self.get_not_modified_response(request)
+        if not_modified is not None:
+            return not_modified
+
+        query, params, ordering = self.get_search_params(request)
+        fields = self.requested_fields = self.get_search_fields(request)
+
+        # bolt the aggregates onto the list search so hits and buckets come back in one request -- the filters are
+        # applied by the aggregates so each facet's counts can ignore its own filter
+        results = self.get_search_results(query, None, ordering, fields)
+        try:
+            with stage("compile"):
+                results, buckets, agg_fields = self.model._build_aggregates(results, params)
+        except InvalidSearch as exc:
+            raise ParseError(six.text_type(exc))
+
+        page = self.paginate_queryset(results)
+        if page is not None:
+            raw_aggregates = self.paginator.response.aggregations
+            serializer = self.get_list_serializer(page, many=True)
+            response = self.get_paginated_response(self.get_list_data(serializer, fields))
+        else:
+            executed = self.execute_search(results)
+            raw_aggregates = executed.aggregations
+            serializer = self.get_list_serializer(self.get_list_results(executed), many=True)
+            response = Response({"results": self.get_list_data(serializer, fields)})
+
+        with stage("aggregates"):
+            aggregates = self.model._parse_aggregates(raw_aggregates, buckets, agg_fields, params)
+            response.data["aggregates"] = self._format_aggregates(aggregates)
+        return response
+
+    @list_route(methods=["get"])
+    def aggregates(self, request):
+        not_modified = self.get_not_modified_response(request)
+        if not_modified is not None:
+            return not_modified
+
+        # get params
+        query, params, _ = self.get_search_params(request)
+
+        # a stale entry of the facet cache predates the generation the etag was built from -- its etag would still
+        # match once the entry is recomputed
+        if self.etag is not None and not self.model.has_current_aggregates(query, params, **self.get_read_options()):
+            self.etag = None
+
+        try:
+            results = self.model.get_aggregates(query, params, hedge_after=self.hedge_after,
+                                                **self.get_read_options())
+        except InvalidSearch as exc:
+            raise ParseError(six.text_type(exc))
+
+        response = {
+            "count": len(results),
+            "next": None,
+            "previous": None,
+            "results": self._format_aggregates(results),
+        }
         return Response(response)
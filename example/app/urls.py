@@ -1,9 +1,13 @@
 from django.conf.urls import patterns, url, include
 
+from djesrf.views import BatchSearchView
 from example.app.routers import router
 
 
+batch_viewsets = dict((prefix, viewset) for prefix, viewset, _ in router.registry)
+
 urlpatterns = patterns(
     "",
+    url(r"api/batch/$", BatchSearchView.as_view(viewsets=batch_viewsets), name="batch"),
     url(r"api/", include(router.urls, namespace="api")),
 )
@@ -0,0 +1,75 @@
+import json
+
+from django.core import management
+from model_mommy import mommy
+import pytest
+
+from example.app.models import Channel, Video
+
+
+def post_batch(client, specs):
+    response = client.post("/api/batch/", json.dumps(specs), content_type="application/json")
+    return response.status_code, json.loads(response.content.decode("utf8"))
+
+
+@pytest.mark.django_db
+def test_batch_searches(client):
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    avc = mommy.make(Channel, name="The A.V. Club")
+    mommy.make(Video, channel=onion, _quantity=4)
+    mommy.make(Video, channel=avc, _quantity=2)
+    Channel.search_objects.refresh()
+    Video.search_objects.refresh()
+
+    status, parsed = post_batch(client, [
+        {"model": "videos", "filters": {"channel__name__raw": "The Onion"}, "page_size": 2},
+        {"model": "channels", "search": "Onion"},
+        {"model": "videos", "page_size": 0, "aggregates": True, "filters": {"channel__name__raw": ["The Onion"]}},
+    ])
+    assert status == 200
+    videos, channels, aggregates = parsed["results"]
+
+    assert videos["count"] == 4
+    assert len(videos["results"]) == 2
+    assert all(result["channel"]["name"] == "The Onion" for result in videos["results"])
+
+    assert channels["count"] == 1
+    assert channels["results"][0]["name"] == "The Onion"
+
+    # the aggregates ignore their own filter, like the list route's
+    assert aggregates["count"] == 4
+    assert aggregates["results"] == []
+    counts = dict((agg["value"], agg["count"]) for agg in aggregates["aggregates"][0]["aggregates"])
+    assert counts == {"The Onion": 4, "The A.V. Club": 2}
+
+
+@pytest.mark.django_db
+def test_batch_search_errors(client):
+    management.call_command("sync_es")
+    mommy.make(Video, _quantity=3)
+    Video.search_objects.refresh()
+
+    status, parsed = post_batch(client, [
+        {"model": "barf"},
+        {"model": "videos", "ordering": "barf"},
+        {"model": "channels", "aggregates": True},
+        {"model": "videos", "page_size": "all"},
+        "videos",
+        {"model": "videos"},
+    ])
+    assert status == 200
+    results = parsed["results"]
+    assert len(results) == 6
+    assert results[0]["error"]["status"] == 404
+    assert [result["error"]["status"] for result in results[1:5]] == [400] * 4
+    assert results[5]["count"] == 3
+
+
+@pytest.mark.django_db
+def test_batch_must_be_a_list(client):
+    status, _ = post_batch(client, {"model": "videos"})
+    assert status == 400
+
+    status, _ = post_batch(client, [{"model": "videos"}] * 26)
+    assert status == 400
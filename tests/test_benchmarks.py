@@ -0,0 +1,31 @@
+import pytest
+
+from benchmarks.run import compare, run_benchmarks
+
+
+@pytest.mark.django_db
+def test_benchmarks_cover_every_stage():
+    results = run_benchmarks(rounds=1, number=1, total=50, page_size=5)
+    assert sorted(results["benchmarks"]) == [
+        "compile.aggregates",
+        "compile.search",
+        "hydrate.proxies",
+        "parse.aggregates",
+        "parse.response",
+        "render.model_serializer",
+        "render.source_serializer",
+        "serialize.request",
+        "viewset.list",
+        "viewset.list_aggregates",
+        "viewset.list_fields",
+    ]
+    for timing in results["benchmarks"].values():
+        assert timing["min"] <= timing["median"]
+
+
+def test_benchmark_compare():
+    baseline = {"benchmarks": {"fast": {"median": 1.0}, "slow": {"median": 1.0}}}
+    current = {"benchmarks": {"fast": {"median": 1.1}, "slow": {"median": 1.5}, "new": {"median": 1.0}}}
+    rows, regressions = compare(baseline, current, 0.2)
+    assert [row[0] for row in rows] == ["fast", "slow"]
+    assert regressions == ["slow"]
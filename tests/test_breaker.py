@@ -0,0 +1,125 @@
+import json
+import time
+
+from django.core import management
+from elasticsearch.exceptions import ConnectionError, NotFoundError
+from model_mommy import mommy
+import pytest
+
+from djesrf import breaker as breaker_module
+from djesrf.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, get_breaker
+from djesrf.exceptions import CircuitOpen
+from example.app.models import Channel, Video
+
+
+def fail():
+    raise ConnectionError("N/A", "Connection refused", None)
+
+
+def test_breaker_trips_after_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    with pytest.raises(ConnectionError):
+        breaker.call(fail)
+    assert breaker.state == CLOSED
+    with pytest.raises(ConnectionError):
+        breaker.call(fail)
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpen):
+        breaker.call(lambda: "ok")
+    metrics = breaker.get_metrics()
+    assert metrics["failures"] == 2
+    assert metrics["rejected"] == 1
+    assert metrics["trips"] == 1
+
+
+def test_breaker_ignores_bad_requests():
+    breaker = CircuitBreaker("test", failure_threshold=1)
+
+    def missing():
+        raise NotFoundError(404, "IndexMissingException", {})
+
+    with pytest.raises(NotFoundError):
+        breaker.call(missing)
+    assert breaker.state == CLOSED
+
+
+def test_breaker_trips_on_slow_searches():
+    breaker = CircuitBreaker("test", failure_threshold=1, latency_threshold=0.01)
+    breaker.call(time.sleep, 0.02)
+    assert breaker.state == OPEN
+    assert breaker.get_metrics()["slow_calls"] == 1
+
+
+def test_breaker_half_open_probe():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0)
+    with pytest.raises(ConnectionError):
+        breaker.call(fail)
+    assert breaker.state == OPEN
+
+    # a single probe goes through once the reset timeout is up
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+    # and a failed probe opens the breaker again
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CLOSED
+
+
+@pytest.fixture
+def open_breaker(settings, monkeypatch):
+    settings.DJESRF_CIRCUIT_BREAKER = True
+    settings.DJESRF_BREAKER_FAILURE_THRESHOLD = 1
+    settings.DJESRF_BREAKER_RESET_TIMEOUT = 60
+    monkeypatch.setattr(breaker_module, "_breakers", {})
+    breaker = get_breaker("default")
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    return breaker
+
+
+@pytest.mark.django_db
+def test_list_falls_back_on_the_database(client, open_breaker):
+    onion = mommy.make(Channel, name="The Onion")
+    avc = mommy.make(Channel, name="The A.V. Club")
+    videos = mommy.make(Video, channel=onion, _quantity=3)
+    _ = mommy.make(Video, channel=avc, _quantity=2)
+
+    response = client.get("/api/videos/?channel__name__raw=The+Onion&ordering=-id")
+    assert response.status_code == 200
+    assert response["X-Search-Fallback"] == "database"
+    parsed = json.loads(response.content.decode("utf8"))
+    assert parsed["count"] == 3
+    assert [result["id"] for result in parsed["results"]] == sorted((video.id for video in videos), reverse=True)
+    assert open_breaker.get_metrics()["fallbacks"] == 1
+
+
+@pytest.mark.django_db
+def test_untranslatable_search_fails_fast(client, open_breaker):
+    assert client.get("/api/videos/?search=onion").status_code == 503
+    assert client.get("/api/videos/?name=onion").status_code == 503
+    assert client.get("/api/videos/?include_aggregates=1").status_code == 503
+    assert client.get("/api/videos/aggregates/").status_code == 503
+    assert client.get("/api/videos/export/").status_code == 503
+
+
+@pytest.mark.django_db
+def test_fallback_errors(client, open_breaker):
+    mommy.make(Video, _quantity=3)
+    assert client.get("/api/videos/?page=999").status_code == 404
+    assert client.get("/api/videos/?page=abc").status_code == 404
+    assert client.get("/api/videos/?id=abc").status_code == 503
+
+
+@pytest.mark.django_db
+def test_breaker_closes_after_probe(client, open_breaker):
+    management.call_command("sync_es")
+    open_breaker.reset_timeout = 0
+    response = client.get("/api/videos/")
+    assert response.status_code == 200
+    assert "X-Search-Fallback" not in response
+    assert open_breaker.state == CLOSED
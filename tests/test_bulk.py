@@ -0,0 +1,51 @@
+from django.core import management
+from model_mommy import mommy
+import pytest
+
+from djesrf.bulk import BulkIndexer, get_active_indexer
+from djesrf.cache import get_generation
+from example.app.models import Channel, Video
+
+
+def _make_unindexed(channel, quantity):
+    for video in mommy.prepare(Video, channel=channel, _quantity=quantity):
+        video.save(index=False)
+
+
+@pytest.mark.django_db
+def test_bulk_index_queryset():
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    _make_unindexed(onion, 25)
+
+    result = Video.bulk_index(Video.objects.all(), chunk_size=10)
+    assert result.indexed == 25
+    assert result.failed == 0
+    assert result.requests == 3
+    assert result.docs_per_second > 0
+
+
+@pytest.mark.django_db
+def test_bulk_index_byte_bound():
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    _make_unindexed(onion, 5)
+    result = Video.bulk_index(Video.objects.all(), max_chunk_bytes=1)
+    assert result.indexed == 5
+    assert result.requests == 5
+
+
+@pytest.mark.django_db
+def test_bulk_indexer_buffers_saves_and_deletes():
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    generation = get_generation(Video)
+    with BulkIndexer() as indexer:
+        assert get_active_indexer() is indexer
+        videos = mommy.make(Video, channel=onion, _quantity=10)
+        videos[0].delete()
+        assert get_generation(Video) == generation
+    assert get_active_indexer() is None
+    assert get_generation(Video) > generation
+    assert indexer.result.indexed == 10
+    assert indexer.result.deleted == 1
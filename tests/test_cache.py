@@ -0,0 +1,91 @@
+import time
+
+from django.core import management
+from django.core.cache import caches
+from django.test import override_settings
+from elasticsearch_dsl.connections import connections
+from model_mommy import mommy
+import pytest
+
+from djesrf.cache import SearchResultCache, bump_generation, get_generation, get_result_cache
+from example.app.models import Channel, Video
+
+
+@pytest.mark.django_db
+def test_generation_advances_on_index_and_delete():
+    management.call_command("sync_es")
+    generation = get_generation(Channel)
+    channel = mommy.make(Channel)
+    assert get_generation(Channel) > generation
+    generation = get_generation(Channel)
+    channel.delete()
+    assert get_generation(Channel) > generation
+
+
+def test_generation_bump_without_counter():
+    generation = get_generation(Video)
+    assert bump_generation(Video) == generation + 1
+
+
+def test_generation_is_seeded_from_the_clock():
+    caches["default"].delete("djesrf:generation:app.video")
+    before = int(time.time() * 1000)
+    assert get_generation(Video) >= before
+
+    # an evicted counter never repeats a generation results may be cached under
+    generation = bump_generation(Video)
+    caches["default"].delete("djesrf:generation:app.video")
+    time.sleep(0.01)
+    assert bump_generation(Video) > generation
+
+
+def test_result_cache_disabled_by_default():
+    assert get_result_cache() is None
+
+
+def test_result_cache_key_is_normalized():
+    cache = SearchResultCache("default")
+    first = Video.search(filters={"channel__name__raw": "The Onion", "name": "test"}, ordering=["-name"])
+    second = Video.search(filters={"name": "test", "channel__name__raw": "The Onion"}, ordering=["-name"])
+    assert cache.make_key(Video, first) == cache.make_key(Video, second)
+    assert cache.make_key(Video, first[0:20]) != cache.make_key(Video, first[20:40])
+
+
+def test_result_cache_key_changes_with_generation():
+    cache = SearchResultCache("default")
+    qs = Video.search(query="test")
+    key = cache.make_key(Video, qs)
+    bump_generation(Video)
+    assert cache.make_key(Video, qs) != key
+
+
+@pytest.mark.django_db
+@override_settings(DJESRF_RESULT_CACHE="default")
+def test_searchable_execute_search_is_cached(monkeypatch):
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    Channel.search_objects.refresh()
+    assert Channel.execute_search(Channel.search(query="onion")).hits.total == 1
+
+    es = connections.get_connection("default")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the cached search should not hit elasticsearch")
+
+    monkeypatch.setattr(es, "search", fail)
+    results = list(Channel.execute_search(Channel.search(query="onion")))
+    assert results[0].name == onion.name
+
+
+@pytest.mark.django_db
+@override_settings(DJESRF_RESULT_CACHE="default", DJESRF_STATUS_ROUNDING=None)
+def test_searches_on_the_exact_time_are_not_cached(monkeypatch):
+    management.call_command("sync_es")
+    cache = get_result_cache()
+    assert cache.is_cacheable(Video.search(filters={"published__lte": "now"}))
+    assert not cache.is_cacheable(Video.search(filters={"status": "published"}))
+
+    written = []
+    monkeypatch.setattr(SearchResultCache, "set", lambda self, key, response: written.append(key))
+    Video.execute_search(Video.search(filters={"status": "published"}))
+    assert written == []
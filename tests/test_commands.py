@@ -0,0 +1,34 @@
+from django.core import management
+from django.core.management.base import CommandError
+from django.utils.six import StringIO
+from elasticsearch_dsl.connections import connections
+from model_mommy import mommy
+import pytest
+
+from example.app.models import Channel, Video
+
+
+@pytest.mark.django_db(transaction=True)
+def test_reindex_es_swaps_alias():
+    management.call_command("sync_es")
+    es = connections.get_connection("default")
+    index = Video.search_objects.mapping.index
+    old_index = list(es.indices.get_alias(name=index))[0]
+
+    onion = mommy.make(Channel, name="The Onion")
+    _ = mommy.make(Video, channel=onion, _quantity=15)
+
+    out = StringIO()
+    management.call_command("reindex_es", "app.Video", workers=2, chunk_size=4, bulk_size=3, stdout=out)
+
+    new_index = list(es.indices.get_alias(name=index))[0]
+    assert new_index != old_index
+    assert int(new_index.split("_")[-1]) == int(old_index.split("_")[-1]) + 1
+    assert Video.search().count() == 15
+    assert Channel.search().count() == 1
+    assert "docs/sec" in out.getvalue()
+
+
+def test_reindex_es_unknown_model():
+    with pytest.raises(CommandError):
+        management.call_command("reindex_es", "app.Barf")
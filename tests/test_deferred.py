@@ -0,0 +1,148 @@
+from django.core import management
+from django.db import transaction
+from django.utils.six.moves import queue
+from elasticsearch_dsl.connections import connections
+from model_mommy import mommy
+import pytest
+
+from djesrf import models
+from djesrf.deferred import DELETE, INDEX, ThreadBackend
+from example.app.models import Channel, Video
+
+
+@pytest.fixture
+def backend(request, monkeypatch):
+    backend = ThreadBackend(batch_size=1000, flush_interval=60)
+    monkeypatch.setattr(Video, "deferred_indexing", True)
+    monkeypatch.setattr(models, "get_indexing_backend", lambda: backend)
+    request.addfinalizer(backend.shutdown)
+    return backend
+
+
+def _refresh():
+    connections.get_connection("default").indices.refresh(index=Video.search_objects.mapping.index)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_deferred_saves_are_queued_until_flushed(backend):
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    videos = mommy.make(Video, channel=onion, _quantity=5)
+
+    _refresh()
+    assert Video.search().count() == 0
+
+    backend.flush()
+    _refresh()
+    assert Video.search().count() == len(videos)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_deferred_operations_are_coalesced(backend, monkeypatch):
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    video = mommy.make(Video, channel=onion)
+    for _ in range(10):
+        video.save()
+
+    written = []
+    write = ThreadBackend.write
+
+    def record(pending, batch_size=None):
+        written.append(pending)
+        return write(pending, batch_size)
+
+    monkeypatch.setattr(backend, "write", record)
+    backend.flush()
+    assert written == [{Video: {video.pk: INDEX}}]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_deferred_delete_wins_over_earlier_saves(backend):
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    video = mommy.make(Video, channel=onion)
+    video.save(refresh=True)
+    assert Video.search().count() == 1
+
+    video.save()
+    video.delete()
+    backend.flush()
+    _refresh()
+    assert Video.search().count() == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_full_queue_writes_on_the_caller_thread(monkeypatch):
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    videos = mommy.make(Video, channel=onion, _quantity=2)
+    _refresh()
+    assert Video.search().count() == 2
+
+    def full(*args, **kwargs):
+        raise queue.Full
+
+    backend = ThreadBackend()
+    monkeypatch.setattr(backend._queue, "put", full)
+    backend.enqueue(Video, videos[0].pk, DELETE)
+    monkeypatch.undo()
+    backend.shutdown()
+
+    # nothing was queued, so the delete has already been written
+    _refresh()
+    assert Video.search().count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_deferred_saves_in_a_transaction_survive_a_flush(backend):
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    video = mommy.make(Video, channel=onion, name="before")
+    backend.flush()
+
+    with transaction.atomic():
+        created = mommy.make(Video, channel=onion, name="created")
+        video.name = "after"
+        video.save()
+        # the worker flushes while the transaction is still open
+        backend.flush()
+
+    backend.flush()
+    _refresh()
+    names = sorted(hit["_source"]["name"] for hit in Video.search().execute().to_dict()["hits"]["hits"])
+    assert names == ["after", "created"]
+    assert created.pk in [hit.pk for hit in Video.search()]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_deferred_index_of_a_missing_row_is_skipped():
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    video = mommy.make(Video, channel=onion)
+    video.save(refresh=True)
+
+    result = ThreadBackend.write({Video: {video.pk + 1000: INDEX}})
+    assert result.indexed == 0
+    assert result.deleted == 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_deferred_saves_without_commit_hooks(backend, monkeypatch):
+    # django < 1.9 has no `transaction.on_commit`
+    monkeypatch.delattr(transaction, "on_commit", raising=False)
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    mommy.make(Video, channel=onion, _quantity=2)
+
+    _refresh()
+    assert Video.search().count() == 0
+    backend.flush()
+    _refresh()
+    assert Video.search().count() == 2
+
+    # inside of a transaction the worker couldn't see the row, so it's written right away
+    with transaction.atomic():
+        mommy.make(Video, channel=onion)
+    _refresh()
+    assert Video.search().count() == 3
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from rest_framework.compat import OrderedDict
+
+from djesrf.export import flatten, iter_csv, iter_ndjson
+
+
+def test_flatten():
+    data = OrderedDict([("id", 1), ("channel", OrderedDict([("id", 2), ("name", "The Onion")])), ("tags", [1, 2])])
+    assert list(flatten(data).items()) == [
+        ("id", 1), ("channel.id", 2), ("channel.name", "The Onion"), ("tags", [1, 2]),
+    ]
+
+
+def test_iter_ndjson_chunks_per_batch():
+    chunks = list(iter_ndjson([[{"id": 1}, {"id": 2}], [{"id": 3, "name": u"Café"}]]))
+    assert len(chunks) == 2
+    assert chunks[0] == b'{"id":1}\n{"id":2}\n'
+    assert chunks[1].decode("utf8") == u'{"id":3,"name":"Café"}\n'
+
+
+def test_iter_csv_writes_a_header_once():
+    batches = [
+        [],
+        [OrderedDict([("id", 1), ("channel", {"name": "The Onion"}), ("tags", ["a", "b"])])],
+        [OrderedDict([("id", 2), ("channel", {"name": None}), ("tags", [])])],
+    ]
+    chunks = list(iter_csv(batches))
+    assert len(chunks) == 2
+    lines = b"".join(chunks).decode("utf8").splitlines()
+    assert lines == ["id,channel.name,tags", '1,The Onion,"[""a"", ""b""]"', "2,,[]"]
@@ -0,0 +1,122 @@
+import json
+
+from django.core import management
+from django.http import QueryDict
+from django.utils.six import StringIO
+from model_mommy import mommy
+import pytest
+
+from djesrf import facets
+from djesrf.facets import get_facet_cache, normalize_filters
+from example.app.models import Channel, Video
+
+
+@pytest.fixture
+def facet_cache(settings, monkeypatch):
+    settings.DJESRF_FACET_CACHE = "default"
+    settings.DJESRF_FACET_CACHE_REFRESH_AFTER = 60
+    settings.DJESRF_FACET_CACHE_MAX_STALE = 600
+    monkeypatch.setattr(facets, "_facet_cache", None)
+    cache = get_facet_cache()
+    cache.cache.clear()
+    return cache
+
+
+def test_normalize_filters():
+    assert normalize_filters(QueryDict("channel__name__raw=Caf%C3%A9")) == {"channel__name__raw": [u"Caf\xe9"]}
+    assert normalize_filters({"channel__name__raw": u"Caf\xe9", "id": 1}) == {
+        "channel__name__raw": [u"Caf\xe9"], "id": [u"1"]}
+
+
+def _channel_counts(aggregates):
+    return dict(aggregates["channel__name__raw"])
+
+
+@pytest.mark.django_db
+def test_facet_cache_hits(facet_cache):
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    _ = mommy.make(Video, channel=onion, _quantity=3)
+    Video.search_objects.refresh()
+
+    assert _channel_counts(Video.get_aggregates()) == {"The Onion": 3}
+    assert _channel_counts(Video.get_aggregates(filters=QueryDict(""))) == {"The Onion": 3}
+    metrics = facet_cache.get_metrics()
+    assert metrics["misses"] == 1
+    assert metrics["hits"] == 1
+
+    # anything else isn't cached
+    Video.get_aggregates("onion")
+    Video.get_aggregates(filters={"channel__name__raw": "The Onion"})
+    assert facet_cache.get_metrics()["misses"] == 1
+
+
+@pytest.mark.django_db
+def test_facet_cache_serves_stale_entries_while_revalidating(facet_cache):
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    _ = mommy.make(Video, channel=onion, _quantity=3)
+    Video.search_objects.refresh()
+    assert _channel_counts(Video.get_aggregates()) == {"The Onion": 3}
+
+    mommy.make(Video, channel=onion).save(refresh=True)
+
+    # the write made the entry stale -- it's served as it is while it's recomputed
+    assert _channel_counts(Video.get_aggregates()) == {"The Onion": 3}
+    assert facet_cache.get_metrics()["stale_hits"] == 1
+    facet_cache.join()
+    assert _channel_counts(Video.get_aggregates()) == {"The Onion": 4}
+    assert facet_cache.get_metrics()["hits"] == 1
+
+
+@pytest.mark.django_db
+def test_facet_cache_max_stale(facet_cache):
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    _ = mommy.make(Video, channel=onion, _quantity=3)
+    Video.search_objects.refresh()
+    Video.get_aggregates(filters={"status": "published"})
+
+    key = facet_cache.make_key(Video, {"status": "published"})
+    entry = facet_cache.cache.get(key)
+    entry["computed_at"] -= facet_cache.max_stale
+    facet_cache.cache.set(key, entry)
+
+    Video.get_aggregates(filters={"status": "published"})
+    assert facet_cache.get_metrics()["misses"] == 2
+
+
+@pytest.mark.django_db
+def test_precompute_facets(facet_cache):
+    management.call_command("sync_es")
+    out = StringIO()
+    management.call_command("precompute_facets", "app.Video", stdout=out)
+    assert "Precomputed 2 facet combinations of Video" in out.getvalue()
+    assert facet_cache.get_metrics()["refreshes"] == 2
+
+    Video.get_aggregates()
+    Video.get_aggregates(filters={"status": "published"})
+    assert facet_cache.get_metrics()["hits"] == 2
+
+
+@pytest.mark.django_db
+def test_stale_facets_get_no_etag(facet_cache, client, settings):
+    settings.DJESRF_ETAGS = True
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    _ = mommy.make(Video, channel=onion, _quantity=3)
+    Video.search_objects.refresh()
+    etag = client.get("/api/videos/aggregates/")["ETag"]
+
+    # the stale entry served after a write can't carry the etag of the new generation
+    mommy.make(Video, channel=onion).save(refresh=True)
+    response = client.get("/api/videos/aggregates/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert "ETag" not in response
+    assert facet_cache.get_metrics()["stale_hits"] == 1
+
+    facet_cache.join()
+    response = client.get("/api/videos/aggregates/")
+    assert response["ETag"] != etag
+    groups = dict((group["path"], group) for group in json.loads(response.content.decode("utf8"))["results"])
+    assert groups["channel__name__raw"]["aggregates"] == [{"value": "The Onion", "count": 4}]
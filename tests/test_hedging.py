@@ -0,0 +1,63 @@
+import threading
+import time
+
+import pytest
+
+from djesrf.hedging import get_hedge_params, hedged_search
+
+
+class SlowClient(object):
+    """answers searches after a delay picked by their preference
+    """
+
+    def __init__(self, delays, errors=()):
+        self.delays = delays
+        self.errors = errors
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def search(self, **kwargs):
+        preference = kwargs.get("preference")
+        with self.lock:
+            self.calls.append(preference)
+        time.sleep(self.delays.get(preference, 0))
+        if preference in self.errors:
+            raise ValueError(preference)
+        return {"preference": preference}
+
+
+REQUEST = {"index": "djesrf-example", "doc_type": "app_video", "body": {}}
+
+
+def test_hedge_params():
+    assert get_hedge_params({"preference": "user-1", "routing": "2"}) == {"preference": "user-1-hedge", "routing": "2"}
+    assert get_hedge_params({"preference": "_primary_first"}) == {"preference": "_primary_first"}
+    assert get_hedge_params({}) == {}
+
+
+def test_fast_search_is_not_hedged():
+    es = SlowClient({"user-1": 0})
+    assert hedged_search(es, REQUEST, {"preference": "user-1"}, 0.5) == {"preference": "user-1"}
+    assert es.calls == ["user-1"]
+
+
+def test_slow_search_is_hedged():
+    es = SlowClient({"user-1": 1.0, "user-1-hedge": 0})
+    start = time.time()
+    assert hedged_search(es, REQUEST, {"preference": "user-1"}, 0.05) == {"preference": "user-1-hedge"}
+    assert time.time() - start < 0.5
+    assert es.calls == ["user-1", "user-1-hedge"]
+
+
+def test_failed_search_is_not_retried():
+    es = SlowClient({}, errors=("user-1", ))
+    with pytest.raises(ValueError):
+        hedged_search(es, REQUEST, {"preference": "user-1"}, 0.5)
+    assert es.calls == ["user-1"]
+
+
+def test_hedged_search_fails_when_both_fail():
+    es = SlowClient({"user-1": 0.1}, errors=("user-1", "user-1-hedge"))
+    with pytest.raises(ValueError) as exc:
+        hedged_search(es, REQUEST, {"preference": "user-1"}, 0.05)
+    assert str(exc.value) == "user-1-hedge"
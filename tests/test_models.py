@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 from django.core import management
 from django.utils import timezone
 
@@ -5,6 +7,7 @@ import pytest
 from elasticsearch_dsl.connections import connections
 from model_mommy import mommy
 
+from djesrf.exceptions import InvalidSearch
 from example.app.models import Channel, Video
 
 
@@ -143,8 +146,14 @@ def test_aggregateable_get_aggregates_with_filters():
     _ = mommy.make(Video, channel=onion, name="Another Test Video")
     _ = mommy.make(Video, channel=onion, _quantity=5)
     _ = mommy.make(Video, channel=avc, _quantity=5)
+    Video.search_objects.refresh()
     results = Video.get_aggregates(filters={"channel__name__raw": "barf"})
-    assert results == {}
+    assert results == {
+        "channel__name__raw": {
+            "The Onion": 6,
+            "The A.V. Club": 5,
+        }
+    }
 
 
 @pytest.mark.django_db
@@ -157,11 +166,17 @@ def test_aggregateable_get_aggregates_complete():
     _ = mommy.make(Video, channel=onion, _quantity=5)
     for index in range(10):
         _ = mommy.make(Video, channel=avc, name="Looped Video {}".format(index+100))
+    Video.search_objects.refresh()
     results = Video.get_aggregates(
         query="looped",
         filters={"channel__name__raw": onion.name}
     )
-    assert len(results) == 0
+    assert results == {
+        "channel__name__raw": {
+            "The Onion": 10,
+            "The A.V. Club": 10,
+        }
+    }
 
 
 @pytest.mark.django_db
@@ -188,3 +203,104 @@ def test_aggregateable_delete_object_es(client):
     results = es.search(index=index, doc_type=doc_type, body=video_id_query)
     hits = results['hits']['hits']
     assert len(hits) == 0
+
+
+def test_searchable_source_fields():
+    qs = Video.search(fields=["id", "name", "channel__name"])
+    assert qs.to_dict()["_source"] == {"include": ["id", "name", "channel.name"]}
+
+
+def test_searchable_unknown_source_fields():
+    with pytest.raises(InvalidSearch):
+        Video.search(fields=["id", "barf"])
+
+
+def test_status_filter_rounds_now(settings):
+    settings.DJESRF_STATUS_ROUNDING = "m"
+    first = Video._handle_status_filter("published").to_dict()
+    second = Video._handle_status_filter("published").to_dict()
+    assert first == second
+    assert first["range"] == {"published": {"lt": "now/m"}, "_cache": True}
+    assert Video._handle_status_filter("scheduled").to_dict()["range"]["published"] == {"gte": "now/m"}
+
+
+def test_status_filter_exact_now(settings):
+    settings.DJESRF_STATUS_ROUNDING = None
+    f = Video._handle_status_filter("published").to_dict()
+    assert "_cache" not in f["range"]
+    assert f["range"]["published"]["lte"] <= timezone.now()
+
+
+def test_database_status_filter_rounds_now(settings):
+    settings.DJESRF_STATUS_ROUNDING = "m"
+    (lookup, now), = Video._build_database_status_filter("published").children
+    assert lookup == "published__lt"
+    assert (now.second, now.microsecond) == (0, 0)
+
+    settings.DJESRF_STATUS_ROUNDING = None
+    (lookup, now), = Video._build_database_status_filter("published").children
+    assert lookup == "published__lte"
+
+
+def test_search_query_cache(settings):
+    settings.DJESRF_QUERY_CACHE = True
+    assert Video.search()._params == {"query_cache": "true"}
+    settings.DJESRF_QUERY_CACHE = False
+    assert Video.search()._params == {}
+
+
+@pytest.mark.django_db
+def test_status_filtered_search():
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    mommy.make(Video, channel=onion, published=timezone.now() - timedelta(days=1), _quantity=2)
+    mommy.make(Video, channel=onion, published=timezone.now() + timedelta(days=1), _quantity=3)
+    mommy.make(Video, channel=onion, published=None)
+    Video.search_objects.refresh()
+    assert Video.search(filters={"status": "published"}).count() == 2
+    assert Video.search(filters={"status": "scheduled"}).count() == 3
+    assert Video.search(filters={"status": "draft"}).count() == 1
+
+
+def test_aggregates_exclude_their_own_filter():
+    qs, buckets, fields = Video._build_aggregates(Video.search(), {"channel__name__raw": "The Onion", "name": "a"})
+    body = qs.to_dict()
+    must = body["post_filter"]["bool"]["must"]
+    assert len(must) == 2
+    assert {"term": {"name": "a"}} in must
+    assert body["aggs"]["channel"]["filter"] == {"term": {"name": "a"}}
+    assert "channel" in body["aggs"]["channel"]["aggs"]
+
+
+@pytest.mark.django_db
+def test_suggest():
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    avc = mommy.make(Channel, name="The A.V. Club")
+    mommy.make(Channel, name="Clickhole")
+    Channel.search_objects.refresh()
+
+    assert Channel.suggest("") == []
+    assert Channel.suggest("the on") == [{"id": onion.id, "label": "The Onion"}]
+    assert sorted(suggestion["id"] for suggestion in Channel.suggest("THE")) == sorted([onion.id, avc.id])
+    assert len(Channel.suggest("cl", size=1)) == 1
+
+
+def test_search_read_options():
+    qs = Video.search("onion", timeout=0.5, preference="user-1", routing="2", using="default")
+    assert qs._using == "default"
+    assert qs._params["request_timeout"] == 0.5
+    assert qs._params["preference"] == "user-1"
+    assert qs._params["routing"] == "2"
+    assert "preference" not in Video.search("onion")._params
+
+
+@pytest.mark.django_db
+def test_hedged_execute_search():
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    mommy.make(Video, channel=onion, _quantity=3)
+    Video.search_objects.refresh()
+    response = Video.execute_search(Video.search(preference="user-1"), hedge_after=0.001)
+    assert response.hits.total == 3
+    assert len(list(response)) == 3
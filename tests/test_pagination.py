@@ -0,0 +1,218 @@
+from datetime import timedelta
+import json
+
+from django.core import management
+from django.utils import timezone
+from elasticsearch_dsl.connections import connections
+from model_mommy import mommy
+import pytest
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from djesrf.pagination import (
+    SearchableCursorPagination, SearchCursor, _decode_search_cursor, _encode_search_cursor
+)
+from example.app.models import Channel, Video
+
+
+factory = APIRequestFactory()
+
+
+def _paginate(paginator, url, queryset):
+    request = Request(factory.get(url))
+    page = paginator.paginate_queryset(queryset, request)
+    return page, paginator.get_next_link(), paginator.get_previous_link()
+
+
+def _cursor(link):
+    return link.split("cursor=")[1].split("&")[0]
+
+
+def test_search_cursor_round_trip():
+    cursor = SearchCursor(position=["the onion", "example_app_channel#1"], reverse=True)
+    encoded = _encode_search_cursor(cursor)
+    assert "the onion" not in encoded
+    assert _decode_search_cursor(encoded) == cursor
+
+
+def test_search_cursor_invalid():
+    assert _decode_search_cursor("not a cursor") is None
+
+
+def test_seek_filter_descending():
+    paginator = SearchableCursorPagination()
+    paginator.plan = Channel.get_search_plan()
+    keys = [("name.raw", "desc"), ("_uid", "asc")]
+    seek = paginator._build_seek_filter(keys, ["The Onion", "example_app_channel#1"]).to_dict()
+    should = seek["bool"]["should"]
+    assert len(should) == 2
+    # documents missing the sort field sort after every value
+    after = should[0]["bool"]["must"][0]["bool"]["should"]
+    assert after[0] == {"range": {"name.raw": {"lt": "The Onion"}}}
+    assert "exists" in str(after[1])
+    assert should[1]["bool"]["must"][1] == {"range": {"_uid": {"gt": "example_app_channel#1"}}}
+
+
+def test_seek_filter_past_missing_value():
+    paginator = SearchableCursorPagination()
+    paginator.plan = Video.get_search_plan()
+    keys = [("published", "asc"), ("_uid", "asc")]
+
+    # nothing sorts after a missing value but other documents missing it
+    seek = paginator._build_seek_filter(keys, [2 ** 63 - 1, "example_app_video#1"]).to_dict()
+    should = seek["bool"]["should"]
+    assert len(should) == 1
+    assert "exists" in str(should[0]["bool"]["must"][0])
+    assert should[0]["bool"]["must"][1] == {"range": {"_uid": {"gt": "example_app_video#1"}}}
+
+    # walking backwards, every document with a value comes after the missing ones
+    seek = paginator._build_seek_filter(keys, [-2 ** 63, "example_app_video#1"], missing_first=True).to_dict()
+    assert seek["bool"]["should"][0]["bool"]["must"][0] == {"exists": {"field": "published"}}
+
+
+def test_seek_filter_nested():
+    paginator = SearchableCursorPagination()
+    paginator.plan = Video.get_search_plan()
+    keys = [("channel.name.raw", "asc"), ("_uid", "asc")]
+    seek = paginator._build_seek_filter(keys, ["The Onion", "example_app_video#1"]).to_dict()
+    must = seek["bool"]["should"][0]["bool"]["must"]
+    assert must[0] == {"nested": {"path": "channel", "filter": {"range": {"channel.name.raw": {"gt": "The Onion"}}}}}
+
+
+@pytest.mark.django_db
+def test_cursor_pagination_walks_forward_and_back():
+    management.call_command("sync_es")
+    channels = mommy.make(Channel, _quantity=25)
+    Channel.search_objects.refresh()
+    expected = sorted(channel.pk for channel in channels)
+
+    paginator = SearchableCursorPagination()
+    page, next_link, previous_link = _paginate(paginator, "/api/channels/", Channel.search())
+    seen = [channel.pk for channel in page]
+    assert previous_link is None
+
+    while next_link is not None:
+        paginator = SearchableCursorPagination()
+        url = "/api/channels/?cursor={}".format(_cursor(next_link))
+        page, next_link, previous_link = _paginate(paginator, url, Channel.search())
+        seen.extend(channel.pk for channel in page)
+
+    assert sorted(seen) == expected
+    assert len(seen) == len(set(seen))
+
+    paginator = SearchableCursorPagination()
+    url = "/api/channels/?cursor={}".format(_cursor(previous_link))
+    page, _, _ = _paginate(paginator, url, Channel.search())
+    assert [channel.pk for channel in page] == seen[:20]
+
+
+@pytest.mark.django_db
+def test_cursor_pagination_keeps_documents_missing_the_sort_field():
+    management.call_command("sync_es")
+    published = [mommy.make(Video, published=timezone.now() - timedelta(days=index)) for index in range(15)]
+    drafts = mommy.make(Video, published=None, _quantity=10)
+    Video.search_objects.refresh()
+
+    paginator = SearchableCursorPagination()
+    page, next_link, _ = _paginate(paginator, "/api/videos/", Video.search(ordering=["published"]))
+    seen = [video.pk for video in page]
+    while next_link is not None:
+        paginator = SearchableCursorPagination()
+        url = "/api/videos/?cursor={}".format(_cursor(next_link))
+        page, next_link, previous_link = _paginate(paginator, url, Video.search(ordering=["published"]))
+        seen.extend(video.pk for video in page)
+
+    # the published videos come oldest first, followed by every draft
+    assert seen[:15] == [video.pk for video in reversed(published)]
+    assert sorted(seen[15:]) == sorted(video.pk for video in drafts)
+
+    paginator = SearchableCursorPagination()
+    url = "/api/videos/?cursor={}".format(_cursor(previous_link))
+    page, _, _ = _paginate(paginator, url, Video.search(ordering=["published"]))
+    assert [video.pk for video in page] == seen[:20]
+
+
+def test_cursor_seek_is_a_post_filter():
+    paginator = SearchableCursorPagination()
+    cursor = _encode_search_cursor(SearchCursor(position=["The Onion", "example_app_channel#1"], reverse=False))
+    request = Request(factory.get("/api/channels/?cursor={}".format(cursor)))
+    executed = []
+
+    class Executed(Exception):
+        pass
+
+    class View(object):
+        model = Channel
+
+        def execute_search(self, qs):
+            executed.append(qs.to_dict())
+            raise Executed()
+
+    with pytest.raises(Executed):
+        paginator.paginate_queryset(Channel.search(ordering=["name.raw"]), request, View())
+    assert "post_filter" in executed[0]
+    assert "filter" not in json.dumps(executed[0].get("query", {}))
+
+
+def _record_searches(monkeypatch):
+    es = connections.get_connection("default")
+    calls = []
+    search = es.search
+
+    def record(*args, **kwargs):
+        calls.append(kwargs)
+        return search(*args, **kwargs)
+
+    def count(*args, **kwargs):
+        raise AssertionError("the paginator should not make count requests")
+
+    monkeypatch.setattr(es, "search", record)
+    monkeypatch.setattr(es, "count", count)
+    return calls
+
+
+@pytest.mark.django_db
+def test_page_number_pagination_makes_one_request(client, monkeypatch):
+    management.call_command("sync_es")
+    _ = mommy.make(Channel, _quantity=25)
+    Channel.search_objects.refresh()
+
+    calls = _record_searches(monkeypatch)
+    response = client.get("/api/channels/?page=2")
+    assert response.status_code == 200
+    assert response.data["count"] == 25
+    assert len(response.data["results"]) == 5
+    assert response.data["previous"] is not None
+    assert response.data["next"] is None
+    assert "count_exact" not in response.data
+    assert len(calls) == 1
+
+
+@pytest.mark.django_db
+def test_page_number_pagination_last_and_invalid_pages(client, monkeypatch):
+    management.call_command("sync_es")
+    _ = mommy.make(Channel, _quantity=25)
+    Channel.search_objects.refresh()
+
+    calls = _record_searches(monkeypatch)
+    response = client.get("/api/channels/?page=last")
+    assert response.status_code == 200
+    assert len(response.data["results"]) == 5
+    assert len(calls) == 2
+
+    assert client.get("/api/channels/?page=3").status_code == 404
+    assert client.get("/api/channels/?page=0").status_code == 404
+    assert client.get("/api/channels/?page=barf").status_code == 404
+
+
+@pytest.mark.django_db
+def test_page_number_pagination_terminate_after(client, settings):
+    management.call_command("sync_es")
+    _ = mommy.make(Channel, _quantity=25)
+    Channel.search_objects.refresh()
+
+    settings.DJESRF_TERMINATE_AFTER = 1
+    response = client.get("/api/channels/")
+    assert response.status_code == 200
+    assert response.data["count_exact"] is False
+    assert response.data["count"] < 25
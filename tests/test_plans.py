@@ -0,0 +1,211 @@
+from datetime import timedelta
+
+from django.core import management
+from django.http import QueryDict
+from django.utils import timezone
+from model_mommy import mommy
+import pytest
+
+from djesrf.exceptions import InvalidSearch
+from djesrf.plans import SearchPlan, is_truthy
+from example.app.models import Channel, Video
+
+
+def test_search_plan_is_compiled_once_per_model():
+    assert Video.get_search_plan() is Video.get_search_plan()
+    assert Channel.get_search_plan() is not Video.get_search_plan()
+
+
+def test_search_plan_fields():
+    plan = Video.get_search_plan()
+    assert plan.fields["name"] == ()
+    assert plan.fields["name.raw"] == ()
+    assert plan.fields["channel.name.raw"] == ("channel", )
+    assert "channel" not in plan.fields
+    assert "channel" in plan.source_fields
+    assert "name.raw" not in plan.source_fields
+    assert [(agg.name, agg.nested, agg.field) for agg in plan.aggregates] == [
+        ("channel", ("channel", ), "channel.name.raw")]
+
+
+def test_multi_field_filter_is_not_nested():
+    f = Video._build_filters({"name__raw": "test"}).to_dict()
+    assert f == {"term": {"name.raw": "test"}}
+
+
+def test_nested_filter():
+    f = Video._build_filters({"channel__name__raw": "The Onion"}).to_dict()
+    assert f == {"nested": {"path": "channel", "filter": {"term": {"channel.name.raw": "The Onion"}}}}
+
+
+def test_unknown_filter_is_rejected():
+    with pytest.raises(InvalidSearch):
+        Video.search(filters={"barf": "test"})
+
+
+def test_ordering():
+    assert Video._build_ordering(["-channel__name__raw", "_score"]) == ["-channel.name.raw", "_score"]
+    with pytest.raises(InvalidSearch):
+        Video.search(ordering=["-barf"])
+
+
+@pytest.mark.django_db
+def test_unknown_filter_returns_400(client):
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    videos = mommy.make(Video, channel=onion, _quantity=2)
+    Video.search_objects.refresh()
+
+    response = client.get("/api/videos/?barf=test")
+    assert response.status_code == 400
+
+    response = client.get("/api/videos/aggregates/?barf=test")
+    assert response.status_code == 400
+
+    response = client.get("/api/videos/?format=json&name__raw={}".format(videos[0].name))
+    assert response.status_code == 200
+    assert response.data["count"] == 1
+
+
+def test_repeated_filter_values():
+    f = Video._build_filters(QueryDict("channel__name__raw=The+Onion&channel__name__raw=AV+Club")).to_dict()
+    assert f == {"nested": {"path": "channel", "filter": {"terms": {"channel.name.raw": ["The Onion", "AV Club"]}}}}
+
+
+def test_in_filter():
+    f = Video._build_filters({"name__raw__in": "a, b,c"}).to_dict()
+    assert f == {"terms": {"name.raw": ["a", "b", "c"]}}
+
+
+def test_range_filters():
+    f = Video._build_filters({"published__gte": "2015-01-01"}).to_dict()
+    assert f == {"range": {"published": {"gte": "2015-01-01"}}}
+    f = Video._build_filters({"channel__id__lt": 10}).to_dict()
+    assert f == {"nested": {"path": "channel", "filter": {"range": {"channel.id": {"lt": 10}}}}}
+
+
+def test_exists_filters():
+    f = Video._build_filters({"published__exists": "true"}).to_dict()
+    assert f == {"exists": {"field": "published"}}
+    f = Video._build_filters({"channel__name__exists": "false"}).to_dict()
+    nested = {"nested": {"path": "channel", "filter": {"exists": {"field": "channel.name"}}}}
+    assert f == {"bool": {"must_not": [nested]}}
+
+
+def test_unknown_lookup_is_rejected():
+    with pytest.raises(InvalidSearch):
+        Video.search(filters={"name__startswith": "a"})
+
+
+@pytest.mark.django_db
+def test_multi_value_filters_in_one_request(client):
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    avc = mommy.make(Channel, name="AV Club")
+    clickhole = mommy.make(Channel, name="ClickHole")
+    for channel in (onion, avc, clickhole):
+        mommy.make(Video, channel=channel, _quantity=2)
+    Video.search_objects.refresh()
+
+    response = client.get("/api/videos/?channel__name__raw=The+Onion&channel__name__raw=AV+Club")
+    assert response.data["count"] == 4
+
+    response = client.get("/api/videos/?channel__name__raw__in=The+Onion,ClickHole")
+    assert response.data["count"] == 4
+
+    response = client.get("/api/videos/?channel__id__gt={}".format(onion.pk))
+    assert response.data["count"] == 4
+
+
+class RichAggregates(object):
+    channel = {
+        "path": "channel",
+        "field": "channel.name.raw",
+        "size": 50,
+        "aggs": {
+            "published": {"type": "date_histogram", "field": "published", "interval": "day"},
+        },
+    }
+    slug = {"field": "slug", "size": 5, "shard_size": 20, "min_doc_count": 2}
+    published = {"type": "date_range", "field": "published", "ranges": [{"to": "now"}, {"from": "now"}]}
+    channels = {"type": "cardinality", "field": "channel.id"}
+
+
+def test_aggregate_declarations(monkeypatch):
+    monkeypatch.setattr(Video, "Aggregates", RichAggregates)
+    aggs = dict((agg.name, agg.build().to_dict()) for agg in SearchPlan(Video).aggregates)
+    assert aggs["slug"] == {"terms": {"field": "slug", "size": 5, "shard_size": 20, "min_doc_count": 2}}
+    assert aggs["channels"] == {
+        "nested": {"path": "channel"},
+        "aggs": {"channels": {"cardinality": {"field": "channel.id"}}},
+    }
+    assert aggs["channel"] == {
+        "nested": {"path": "channel"},
+        "aggs": {"channel": {
+            "terms": {"field": "channel.name.raw", "size": 50},
+            "aggs": {"published": {
+                "reverse_nested": {},
+                "aggs": {"published": {"date_histogram": {"field": "published", "interval": "day"}}},
+            }},
+        }},
+    }
+
+
+def test_misconfigured_aggregate_declarations(monkeypatch):
+    class BadType(object):
+        channel = {"type": "stats", "field": "channel.id"}
+
+    class Duplicate(object):
+        first = {"field": "slug"}
+        second = {"field": "slug", "size": 100}
+
+    for declarations in (BadType, Duplicate):
+        monkeypatch.setattr(Video, "Aggregates", declarations)
+        with pytest.raises(Exception):
+            SearchPlan(Video)
+
+
+@pytest.mark.django_db
+def test_rich_aggregates_in_one_request(client, monkeypatch):
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    avc = mommy.make(Channel, name="AV Club")
+    mommy.make(Video, channel=onion, published=timezone.now() - timedelta(days=2), _quantity=3)
+    mommy.make(Video, channel=avc, published=timezone.now() + timedelta(days=2), _quantity=2)
+    Video.search_objects.refresh()
+
+    monkeypatch.setattr(Video, "Aggregates", RichAggregates)
+    monkeypatch.setattr(Video, "_search_plan", SearchPlan(Video))
+    results = Video.get_aggregates()
+
+    assert results["channel__id"] == 2
+    assert list(results["published"].values()) == [3, 2]
+    assert results["slug"] == {}
+    channels = results["channel__name__raw"]
+    assert list(channels) == ["The Onion", "AV Club"]
+    assert channels["The Onion"]["count"] == 3
+    assert sum(channels["The Onion"]["aggregates"]["published"].values()) == 3
+
+    response = client.get("/api/videos/aggregates/")
+    groups = dict((group["path"], group) for group in response.data["results"])
+    assert groups["channel__id"]["value"] == 2
+    onion_bucket = groups["channel__name__raw"]["aggregates"][0]
+    assert onion_bucket["value"] == "The Onion"
+    assert onion_bucket["aggregates"][0]["path"] == "published"
+
+
+def test_plan_database_paths():
+    plan = Video.get_search_plan()
+    assert plan.get_database_path("channel.name.raw") == "channel__name"
+    assert plan.get_database_path("published") == "published"
+    assert plan.get_database_path("name") is None
+    assert plan.get_database_path("name", exact=False) == "name"
+    assert plan.get_database_path("name.autocomplete") is None
+
+
+def test_is_truthy():
+    assert is_truthy("1")
+    assert is_truthy("True")
+    assert not is_truthy(None)
+    assert not is_truthy("0")
+    assert not is_truthy(u"\xe9")
@@ -0,0 +1,118 @@
+import json
+
+from django.core import management
+from model_mommy import mommy
+import pytest
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from djesrf.profiling import SearchProfiler, get_active_profiler, summarize_search, summarize_shard_profile
+from example.app.models import Channel, Video
+from example.app.views import VideoViewSet
+
+
+SHARD = {
+    "id": "[node][djesrf-example][0]",
+    "searches": [{
+        "query": [{
+            "type": "BooleanQuery",
+            "description": "+channel.name.raw:The Onion",
+            "time_in_nanos": 3000000,
+            "children": [{"type": "TermQuery", "description": "channel.name.raw:The Onion", "time_in_nanos": 2000000}],
+        }],
+        "rewrite_time": 500000,
+        "collector": [{"name": "SimpleTopScoreDocCollector", "reason": "search_top_hits", "time": "1.5ms"}],
+    }],
+    "aggregations": [{"type": "TermsAggregator", "description": "channel__name__raw", "time_in_nanos": 4000000}],
+}
+
+
+def test_summarize_shard_profile():
+    summary = summarize_shard_profile(SHARD)
+    assert summary["id"] == "[node][djesrf-example][0]"
+    assert summary["query_ms"] == 3.0
+    assert summary["rewrite_ms"] == 0.5
+    assert summary["collector_ms"] == 1.5
+    assert summary["aggregations_ms"] == 4.0
+    assert [(node["type"], node["depth"]) for node in summary["queries"]] == [("BooleanQuery", 0), ("TermQuery", 1)]
+    assert summary["collectors"][0]["type"] == "SimpleTopScoreDocCollector"
+    assert summary["aggregations"][0]["time_ms"] == 4.0
+
+
+def test_summarize_search():
+    raw = {
+        "took": 12,
+        "timed_out": False,
+        "_shards": {"total": 5, "successful": 5, "failed": 0},
+        "hits": {"total": 3, "hits": []},
+    }
+    summary = summarize_search({"query": {"match_all": {}}}, raw, 0.02)
+    assert summary["body"] == {"query": {"match_all": {}}}
+    assert summary["took_ms"] == 12
+    assert summary["round_trip_ms"] == 20.0
+    assert summary["hits"] == 3
+    assert summary["shards"] == {"total": 5, "successful": 5, "failed": 0}
+    assert "profile" not in summary
+
+    summary = summarize_search({}, dict(raw, profile={"shards": [SHARD]}), 0.02)
+    assert summary["profile"][0]["query_ms"] == 3.0
+
+
+def test_active_profiler():
+    assert get_active_profiler() is None
+    with SearchProfiler() as profiler:
+        assert get_active_profiler() is profiler
+    assert get_active_profiler() is None
+
+
+@pytest.mark.django_db
+def test_profile_requires_staff(client):
+    management.call_command("sync_es")
+    response = client.get("/api/videos/?profile=1")
+    assert response.status_code in (401, 403)
+
+
+class StaffUser(object):
+    """stands in for a staff user, as the example project has no auth app
+    """
+
+    is_staff = True
+
+    def is_authenticated(self):
+        return True
+
+
+def get_as_staff(actions, path):
+    request = APIRequestFactory().get(path)
+    force_authenticate(request, user=StaffUser())
+    response = VideoViewSet.as_view(actions)(request)
+    response.render()
+    return response
+
+
+@pytest.mark.django_db
+def test_profile():
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    mommy.make(Video, channel=onion, _quantity=3)
+    Video.search_objects.refresh()
+
+    response = get_as_staff({"get": "list"}, "/api/videos/?profile=1&channel__name__raw=The+Onion")
+    assert response.status_code == 200
+    assert response["Cache-Control"] == "no-store"
+    parsed = json.loads(response.content.decode("utf8"))
+    assert parsed["count"] == 3
+
+    profile = parsed["profile"]
+    assert "search" in profile["timings"]
+    search = profile["searches"][0]
+    assert "channel.name.raw" in json.dumps(search["body"])
+    assert search["hits"] == 3
+    assert search["shards"]["failed"] == 0
+
+    response = get_as_staff({"get": "aggregates"}, "/api/videos/aggregates/?profile=1")
+    assert response.status_code == 200
+    assert "aggs" in json.loads(response.content.decode("utf8"))["profile"]["searches"][0]["body"]
+
+    # without the flag nothing is profiled
+    response = get_as_staff({"get": "list"}, "/api/videos/")
+    assert "profile" not in json.loads(response.content.decode("utf8"))
@@ -0,0 +1,32 @@
+from djesrf.serializers import SourceSerializer
+
+
+HITS = [
+    {
+        "_id": "1",
+        "_type": "app_video",
+        "_source": {"name": "Some Video", "slug": "some-video", "channel": {"id": 1, "name": "The Onion"}},
+    },
+    {
+        "_id": "2",
+        "_type": "app_video",
+        "_source": {"id": 2, "name": "Another Video", "slug": "another-video"},
+    },
+]
+
+
+def test_source_serializer():
+    data = SourceSerializer(HITS, many=True).data
+    assert data[0]["id"] == 1
+    assert data[0]["channel"] == {"id": 1, "name": "The Onion"}
+    assert data[1]["id"] == 2
+    assert data[1]["name"] == "Another Video"
+
+
+def test_source_serializer_meta_fields():
+    class NameSerializer(SourceSerializer):
+        class Meta(object):
+            fields = ("id", "name")
+
+    data = NameSerializer(HITS, many=True).data
+    assert [list(item.keys()) for item in data] == [["id", "name"], ["id", "name"]]
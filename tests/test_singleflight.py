@@ -0,0 +1,99 @@
+import threading
+import time
+
+from django.core import management
+from model_mommy import mommy
+import pytest
+
+from djesrf.conf import settings
+from djesrf.singleflight import SingleFlight, get_single_flight
+
+from example.app.models import Channel, Video
+
+
+def call_together(flight, func, count, key="search"):
+    """calls a function through the same key from several threads at once
+    """
+    outcomes = [None] * count
+
+    def call(index):
+        try:
+            outcomes[index] = flight.do(key, func)
+        except Exception as exc:
+            outcomes[index] = exc
+
+    threads = [threading.Thread(target=call, args=(index, )) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def test_identical_calls_are_coalesced():
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"took": 1}
+
+    outcomes = call_together(flight, slow, 10)
+    assert len(calls) == 1
+    assert sorted(leader for leader, _ in outcomes) == [False] * 9 + [True]
+    assert all(value == {"took": 1} for _, value in outcomes)
+    assert flight.get_metrics() == {"executed": 1, "coalesced": 9}
+
+
+def test_errors_are_shared():
+    flight = SingleFlight()
+
+    def failing():
+        time.sleep(0.2)
+        raise ValueError("down")
+
+    outcomes = call_together(flight, failing, 5)
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+    assert flight.get_metrics()["executed"] == 1
+
+
+def test_finished_calls_run_again():
+    flight = SingleFlight()
+    assert flight.do("search", lambda: 1) == (True, 1)
+    assert flight.do("search", lambda: 2) == (True, 2)
+    assert flight.get_metrics() == {"executed": 2, "coalesced": 0}
+
+
+def test_different_keys_are_not_coalesced():
+    flight = SingleFlight()
+    assert flight.do("first", lambda: 1) == (True, 1)
+    assert flight.do("second", lambda: 2) == (True, 2)
+
+
+@pytest.mark.django_db
+def test_coalesced_searches(monkeypatch):
+    monkeypatch.setattr(settings, "DJESRF_SINGLE_FLIGHT", True)
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    mommy.make(Video, channel=onion, _quantity=3)
+    Video.search_objects.refresh()
+
+    flight = get_single_flight()
+    executed = flight.get_metrics()["executed"]
+    results = []
+
+    def search():
+        response = Video.execute_search(Video.search())
+        results.append(sorted(video.id for video in response))
+
+    threads = [threading.Thread(target=search) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # every caller hydrates its own hits, whether or not it waited on another one
+    assert len(results) == 5
+    assert all(len(ids) == 3 and ids == results[0] for ids in results)
+    assert 1 <= flight.get_metrics()["executed"] - executed <= 5
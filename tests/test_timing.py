@@ -0,0 +1,73 @@
+import json
+
+from django.core import management
+from model_mommy import mommy
+import pytest
+
+from djesrf.signals import search_timed
+from djesrf.timing import StageTimer, get_active_timer, stage
+from example.app.models import Channel, Video
+
+
+def test_stage_timer_adds_up_stages():
+    with StageTimer() as timer:
+        assert get_active_timer() is timer
+        with stage("compile"):
+            pass
+        with stage("compile"):
+            pass
+        timer.record_search(0.010, 4)
+    assert get_active_timer() is None
+
+    timings = timer.to_dict()
+    assert list(timings) == ["compile", "search", "es", "network", "total"]
+    assert timings["search"] == 10.0
+    assert timings["es"] == 4.0
+    assert timings["network"] == 6.0
+    assert timer.get_header().startswith("compile;dur=")
+
+
+def test_stage_without_timer_is_a_no_op():
+    assert get_active_timer() is None
+    with stage("compile"):
+        pass
+
+
+@pytest.mark.django_db
+def test_list_without_timings(client, settings):
+    settings.DJESRF_TIMINGS = False
+    management.call_command("sync_es")
+    response = client.get("/api/videos/")
+    assert response.status_code == 200
+    assert "Server-Timing" not in response
+
+
+@pytest.mark.django_db
+def test_list_timings(client, settings):
+    settings.DJESRF_TIMINGS = True
+    settings.DJESRF_TIMINGS_DEBUG = True
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    _ = mommy.make(Video, channel=onion, _quantity=5)
+    Video.search_objects.refresh()
+
+    received = []
+
+    def receiver(sender, timings, **kwargs):
+        received.append((sender, timings))
+
+    search_timed.connect(receiver)
+    try:
+        response = client.get("/api/videos/?include_aggregates=1")
+    finally:
+        search_timed.disconnect(receiver)
+
+    assert response.status_code == 200
+    stages = [timing.split(";")[0] for timing in response["Server-Timing"].split(", ")]
+    for name in ("compile", "search", "es", "network", "hydrate", "serialize", "aggregates", "total"):
+        assert name in stages
+
+    assert len(received) == 1
+    sender, timings = received[0]
+    assert sender is Video
+    assert json.loads(response.content.decode("utf8"))["timings"] == timings
@@ -1,11 +1,19 @@
+from datetime import timedelta
 import json
 
 from django.core import management
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from elasticsearch_dsl.connections import connections
 from model_mommy import mommy
 import pytest
+from rest_framework.test import APIRequestFactory
 from six import string_types
 
+from djesrf.serializers import SourceSerializer
 from example.app.models import Channel, Video
+from example.app.views import VideoViewSet
 
 
 class Response(object):
@@ -95,3 +103,206 @@ def test_aggregateable_simple_aggregates(client):
     assert "name" in agg_group
     assert "path" in agg_group
     assert "aggregates" in agg_group
+
+
+@pytest.mark.django_db
+def test_aggregateable_list_include_aggregates(client):
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    avc = mommy.make(Channel, name="The A.V. Club")
+    _ = mommy.make(Video, channel=onion, _quantity=20)
+    _ = mommy.make(Video, channel=avc, _quantity=10)
+    Video.search_objects.refresh()
+    response = client.get("/api/videos/?include_aggregates=1")
+    parsed = json.loads(response.content.decode("utf8"))
+    assert response.status_code == 200
+    assert parsed["count"] == 30
+    assert len(parsed["results"]) == 20
+    assert len(parsed["aggregates"]) == 1
+    agg_group = parsed["aggregates"][0]
+    assert agg_group["path"] == "channel__name__raw"
+    counts = dict((agg["value"], agg["count"]) for agg in agg_group["aggregates"])
+    assert counts == {"The Onion": 20, "The A.V. Club": 10}
+
+
+@pytest.mark.django_db
+def test_aggregateable_list_without_include_aggregates(client):
+    management.call_command("sync_es")
+    channel = mommy.make(Channel)
+    _ = mommy.make(Video, channel=channel, _quantity=5)
+    response = client.get("/api/videos/?include_aggregates=0")
+    parsed = json.loads(response.content.decode("utf8"))
+    assert response.status_code == 200
+    assert "aggregates" not in parsed
+
+
+@pytest.mark.django_db
+def test_searchable_list_from_source():
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    _ = mommy.make(Video, channel=onion, _quantity=5)
+    Video.search_objects.refresh()
+
+    view = VideoViewSet.as_view({"get": "list"}, hit_serializer_class=SourceSerializer)
+    request = APIRequestFactory().get("/api/videos/")
+    with CaptureQueriesContext(connection) as queries:
+        response = view(request)
+        response.render()
+    assert len(queries) == 0
+
+    response = Response(response)
+    assert response.count == 5
+    for result in response.results:
+        assert isinstance(result["id"], int)
+        assert result["channel"]["name"] == onion.name
+
+
+@pytest.mark.django_db
+def test_searchable_list_fields(client):
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    _ = mommy.make(Video, channel=onion, _quantity=5)
+    Video.search_objects.refresh()
+    response = client.get("/api/videos/?fields=id,name&fields=channel__name")
+    response = Response(response)
+    assert response.status == 200
+    assert response.count == 5
+    for result in response.results:
+        assert sorted(result.keys()) == ["channel", "id", "name"]
+        assert result["channel"] == {"name": onion.name}
+
+
+@pytest.mark.django_db
+def test_searchable_list_unknown_fields(client):
+    management.call_command("sync_es")
+    response = client.get("/api/videos/?fields=id,barf")
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_aggregateable_list_multi_select_facets(client):
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    avc = mommy.make(Channel, name="The A.V. Club")
+    _ = mommy.make(Video, channel=onion, _quantity=20)
+    _ = mommy.make(Video, channel=avc, _quantity=10)
+    Video.search_objects.refresh()
+    response = client.get("/api/videos/?include_aggregates=1&channel__name__raw=The+A.V.+Club")
+    parsed = json.loads(response.content.decode("utf8"))
+    assert response.status_code == 200
+    assert parsed["count"] == 10
+    assert len(parsed["results"]) == 10
+    counts = dict((agg["value"], agg["count"]) for agg in parsed["aggregates"][0]["aggregates"])
+    assert counts == {"The Onion": 20, "The A.V. Club": 10}
+
+
+@pytest.mark.django_db
+def test_searchable_export_ndjson(client):
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    avc = mommy.make(Channel, name="The A.V. Club")
+    _ = mommy.make(Video, channel=onion, _quantity=12)
+    _ = mommy.make(Video, channel=avc, _quantity=3)
+    Video.search_objects.refresh()
+    response = client.get("/api/videos/export/?channel__name__raw=The+Onion&fields=id,channel__name")
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in b"".join(response.streaming_content).decode("utf8").splitlines()]
+    assert len(rows) == 12
+    for row in rows:
+        assert row["channel"] == {"name": onion.name}
+
+
+@pytest.mark.django_db
+def test_searchable_export_csv_in_order(client, settings):
+    settings.DJESRF_EXPORT_BATCH_SIZE = 5
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    videos = mommy.make(Video, channel=onion, _quantity=12)
+    Video.search_objects.refresh()
+    response = client.get("/api/videos/export/?export_format=csv&ordering=-id&fields=id,name")
+    assert response.status_code == 200
+    chunks = list(response.streaming_content)
+    assert len(chunks) == 3
+    lines = b"".join(chunks).decode("utf8").splitlines()
+    assert lines[0] == "id,name"
+    assert [int(line.split(",")[0]) for line in lines[1:]] == sorted((video.id for video in videos), reverse=True)
+
+
+@pytest.mark.django_db
+def test_searchable_export_unknown_format(client):
+    management.call_command("sync_es")
+    response = client.get("/api/videos/export/?export_format=xml")
+    assert response.status_code == 400
+
+
+@pytest.mark.django_db
+def test_searchable_suggest(client):
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    _ = mommy.make(Video, channel=onion, name="Onion Talks", published=timezone.now() - timedelta(days=1))
+    _ = mommy.make(Video, channel=onion, name="Onion Sports Network", published=None)
+    Video.search_objects.refresh()
+    response = client.get("/api/videos/suggest/?search=onion+ta")
+    assert response.status_code == 200
+    results = json.loads(response.content.decode("utf8"))["results"]
+    assert [result["label"] for result in results] == ["Onion Talks"]
+
+    response = client.get("/api/videos/suggest/?search=oni&status=published")
+    results = json.loads(response.content.decode("utf8"))["results"]
+    assert [result["label"] for result in results] == ["Onion Talks"]
+
+
+@pytest.mark.django_db
+def test_etags(client, settings, monkeypatch):
+    settings.DJESRF_ETAGS = True
+    management.call_command("sync_es")
+    onion = mommy.make(Channel, name="The Onion")
+    videos = mommy.make(Video, channel=onion, _quantity=3)
+    Video.search_objects.refresh()
+
+    for url in ("/api/videos/?channel__name__raw=The+Onion", "/api/videos/aggregates/"):
+        response = client.get(url)
+        assert response.status_code == 200
+        etag = response["ETag"]
+
+        # a matching etag is answered without searching
+        es = connections.get_connection("default")
+        monkeypatch.setattr(es, "search", None)
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        assert response["ETag"] == etag
+        assert not response.content
+        monkeypatch.undo()
+
+        # other params get another etag
+        assert client.get(url + "&page_size=1" if "?" in url else url + "?search=onion")["ETag"] != etag
+
+        # and so does indexing
+        videos[0].save(refresh=True)
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+
+
+@pytest.mark.django_db
+def test_etags_without_status_rounding(client, settings):
+    settings.DJESRF_ETAGS = True
+    settings.DJESRF_STATUS_ROUNDING = None
+    management.call_command("sync_es")
+    assert "ETag" in client.get("/api/videos/")
+    assert "ETag" not in client.get("/api/videos/?status=published")
+
+
+@pytest.mark.django_db
+def test_etags_with_date_math(client, settings):
+    settings.DJESRF_ETAGS = True
+    management.call_command("sync_es")
+
+    # a range on the current time changes all the time, unless it's rounded
+    assert "ETag" not in client.get("/api/videos/?published__lte=now")
+    assert "ETag" not in client.get("/api/videos/?published__gte=now-1d")
+    assert "ETag" not in client.get("/api/videos/?published.lte=now")
+    assert "ETag" not in client.get("/api/videos/?published__LTE=now")
+    assert "ETag" in client.get("/api/videos/?published__gte=now-1d/d")
+    assert "ETag" in client.get("/api/videos/?published__gte=2015-01-01")